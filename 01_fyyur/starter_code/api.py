@@ -0,0 +1,211 @@
+from datetime import datetime
+
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    jsonify,
+    request,
+    stream_with_context
+)
+
+from models import Venue, Artist
+from queries import (
+    VENUE_FIELDS,
+    ARTIST_FIELDS,
+    venues_page_query,
+    artists_page_query,
+    shows_page_query,
+    keyset_page,
+    venue_detail,
+    artist_detail,
+    page_args,
+    InvalidCursor
+)
+from search import search_page
+from export import EXPORTS, FORMATS, export
+from bookings import (
+    BookingError,
+    create_shows,
+    show_end,
+    conflict_args,
+    conflicts_query
+)
+from cache import invalidate_pages
+
+#----------------------------------------------------------------------------#
+# JSON API.
+#----------------------------------------------------------------------------#
+
+# Versioned JSON API for the mobile client and partner integrations. It runs
+# the same queries as the HTML views but selects plain columns, so rows come
+# back as tuples and go straight into dicts without building ORM objects.
+# Listings take ?fields=id,name to select only some columns in SQL and are
+# keyset paginated like the HTML listings (?after=&limit=).
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+SHOW_FIELDS = ("id", "start_time", "artist_id", "artist_name",
+               "artist_image_link", "venue_id", "venue_name")
+
+
+def _field_names(allowed):
+    fields = request.args.get('fields')
+    if not fields:
+        return list(allowed)
+    names = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        abort(400, 'Unknown fields: ' + ', '.join(unknown))
+    return names
+
+
+def _jsonable(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        return [_jsonable(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _jsonable(item) for key, item in value.items()}
+    return value
+
+
+def _row_dict(row, names):
+    mapping = row._mapping
+    return {name: _jsonable(mapping[name]) for name in names}
+
+
+def _page(rows, next_after, names, **extra):
+    return jsonify(data=[_row_dict(row, names) for row in rows],
+                   next_after=next_after, **extra)
+
+
+def _entity_page(model, allowed, page_query):
+    names = _field_names(allowed)
+    after, limit = page_args()
+    rows, next_after = keyset_page(
+        *page_query([getattr(model, name) for name in names]), after, limit)
+    return _page(rows, next_after, names)
+
+
+def _search(model, allowed):
+    names = _field_names(allowed)
+    after, limit = page_args()
+    rows, next_after, count = search_page(
+        model, request.args.get('search_term', ''), after, limit,
+        [getattr(model, name) for name in names])
+    return _page(rows, next_after, names, count=count)
+
+
+def _detail(data):
+    if data is None:
+        abort(404)
+    names = _field_names(data.keys())
+    return jsonify({name: _jsonable(data[name]) for name in names})
+
+
+@api.route('/v1/venues')
+def venues():
+    return _entity_page(Venue, VENUE_FIELDS, venues_page_query)
+
+
+@api.route('/v1/venues/search')
+def search_venues():
+    return _search(Venue, VENUE_FIELDS)
+
+
+@api.route('/v1/venues/<int:venue_id>')
+def show_venue(venue_id):
+    return _detail(venue_detail(venue_id))
+
+
+@api.route('/v1/venues/<int:venue_id>/shows', methods=['POST'])
+def create_venue_shows(venue_id):
+    # [{"artist_id": 1, "start_time": "2035-05-21T21:30:00",
+    #   "minutes": 90}, ...], minutes optional
+    # all shows are created in one INSERT and one transaction, or none
+    shows = request.get_json(silent=True)
+    if not isinstance(shows, list):
+        abort(400, 'Expected a JSON array of shows')
+    try:
+        shows = [(int(show['artist_id']),
+                  datetime.fromisoformat(show['start_time']),
+                  show.get('minutes'))
+                 for show in shows]
+    except (AttributeError, KeyError, TypeError, ValueError):
+        abort(400, 'Every show needs an artist_id and an ISO start_time')
+    try:
+        shows = [(artist_id, start_time,
+                  show_end(start_time,
+                           None if minutes is None else int(minutes)))
+                 for artist_id, start_time, minutes in shows]
+        count = create_shows(venue_id, shows)
+    except (TypeError, ValueError):
+        abort(400, 'minutes must be a number')
+    except BookingError as e:
+        abort(400, str(e))
+    invalidate_pages('venues', f'venue:{venue_id}',
+                     *[f'artist:{artist_id}' for artist_id, *_ in shows])
+    return jsonify(created=count), 201
+
+
+@api.route('/v1/artists')
+def artists():
+    return _entity_page(Artist, ARTIST_FIELDS, artists_page_query)
+
+
+@api.route('/v1/artists/search')
+def search_artists():
+    return _search(Artist, ARTIST_FIELDS)
+
+
+@api.route('/v1/artists/<int:artist_id>')
+def show_artist(artist_id):
+    return _detail(artist_detail(artist_id))
+
+
+@api.route('/v1/shows')
+def shows():
+    names = _field_names(SHOW_FIELDS)
+    after, limit = page_args()
+    rows, next_after = keyset_page(*shows_page_query(), after, limit)
+    return _page(rows, next_after, names)
+
+
+@api.route('/v1/shows/conflicts')
+def show_conflicts():
+    # ?venue_id=&artist_id=&start_time=&end_time= (or &minutes=): whether
+    # the venue and the artist are free then, and the shows in the way
+    try:
+        venue_id, artist_id, start_time, end_time = conflict_args(request.args)
+    except BookingError as e:
+        abort(400, str(e))
+    rows = conflicts_query(start_time, end_time, venue_id=venue_id,
+                           artist_id=artist_id).all()
+    names = ("show_id", "venue_id", "artist_id", "start_time", "end_time")
+    return jsonify(available=not rows,
+                   conflicts=[_row_dict(row, names) for row in rows])
+
+
+@api.route('/export/<entity>')
+def export_entity(entity):
+    # whole table dump, streamed from a server side cursor
+    format = request.args.get('format', 'csv')
+    if entity not in EXPORTS or format not in FORMATS:
+        abort(404)
+    response = Response(stream_with_context(export(entity, format)),
+                        mimetype=FORMATS[format])
+    response.headers['Content-Disposition'] = \
+        f'attachment; filename={entity}.{format}'
+    return response
+
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+def api_error(error):
+    return jsonify(error=error.description), error.code
+
+
+@api.errorhandler(InvalidCursor)
+def invalid_cursor_error(error):
+    return jsonify(error='Invalid page cursor'), 400
@@ -0,0 +1,170 @@
+from flask import (
+    Blueprint,
+    current_app,
+    render_template,
+    request,
+    flash,
+    redirect,
+    url_for,
+    abort
+)
+
+from forms import ArtistForm
+from models import db, Artist
+from queries import (
+    artist_detail,
+    artists_page,
+    genre_arg,
+    page_args,
+    venue_ids_of_artist,
+    artists_validators,
+    artist_validators
+)
+from search import search_artists as search_artists_query
+from cache import page_cache
+from conditional import conditional
+from routing import read_only
+
+#----------------------------------------------------------------------------#
+# Artist pages.
+#----------------------------------------------------------------------------#
+
+artists_bp = Blueprint('artists', __name__)
+
+
+#  Artists
+#  ----------------------------------------------------------------
+
+
+@artists_bp.route('/artists')
+@conditional(artists_validators)
+@page_cache.cached('artists')
+def artists():
+    # one keyset page of artists ordered by id
+    after, limit = page_args()
+    genre = genre_arg()
+    data, next_after, facets = artists_page(after, limit, genre)
+    return render_template('pages/artists.html', artists=data,
+                           next_after=next_after, limit=limit, genre=genre,
+                           facets=facets)
+
+
+@artists_bp.route('/artists/search', methods=['POST'])
+@read_only
+def search_artists():
+  # TODO: implement search on artists with partial string search.
+  #  Ensure it is case-insensitive.
+  # seach for "A" should return
+  # "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
+  # search for "band" should return "The Wild Sax Band".
+  search_term = request.form.get("search_term", "")
+  after, limit = page_args()
+  genre = genre_arg()
+  response = {}
+  # matches name, city, state and genres, ranked by the database
+  response['data'], response['next_after'], response['count'], \
+      response['facets'] = search_artists_query(search_term, after, limit,
+                                                genre)
+  return render_template('pages/search_artists.html',
+                          results=response, 
+                          search_term=request.form.get('search_term',''),
+                          limit=limit,
+                          genre=genre
+                        )
+
+
+@artists_bp.route('/artists/<int:artist_id>')
+@conditional(artist_validators)
+@page_cache.cached(lambda artist_id: f'artist:{artist_id}')
+def show_artist(artist_id):
+# shows the artist page with the given artist_id
+# past and upcoming shows come already split and limited from the database
+  data = artist_detail(artist_id,
+                       past_limit=current_app.config['PAST_SHOWS_LIMIT'],
+                       upcoming_limit=current_app.config['UPCOMING_SHOWS_LIMIT'],
+                       matches_limit=current_app.config['MATCHES_TOP_K'])
+  if data is None:
+      abort(404)
+  return render_template('pages/show_artist.html', artist=data)
+
+
+#  Update
+#  ----------------------------------------------------------------
+@artists_bp.route('/artists/Edite_by_ID/<int:artist_id>', methods=['GET'])
+def edit_artist(artist_id):
+  try:
+      artist = db.session.query(Artist).filter(
+          Artist.id == artist_id).first()
+      form = ArtistForm(obj=artist)
+      artist = {
+          'id': artist_id,
+          'name': artist.name
+      }
+  except:
+      db.session.rollback()
+      flash("Something went wrong. Please try again.")
+      return redirect(url_for("index"))
+  finally:
+      db.session.close()
+  # TODO: populate form with fields from artist with ID <artist_id>
+  return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+
+@artists_bp.route('/artists/Edite_by_ID/<int:artist_id>', methods=['POST'])
+def edit_artist_submission(artist_id):
+  # TODO: take values from the form submitted, and update existing
+  # artist record with ID <artist_id> using the new attributes
+  try:
+      artist = db.session.query(Artist).filter(
+          Artist.id == artist_id).first()
+      form = ArtistForm(request.form, meta={'csrf': False})
+      form.populate_obj(artist)
+      db.session.add(artist)
+      db.session.commit()
+      page_cache.invalidate('artists', f'artist:{artist_id}',
+                            *[f'venue:{id}' for id in venue_ids_of_artist(artist_id)])
+      flash("The artist has been edited successfully")
+  except:
+      db.session.rollback()
+      flash("Something went wrong. Please try again.")
+      return redirect(url_for("index"))
+  finally:
+      db.session.close()
+  return redirect(url_for('.show_artist', artist_id=artist_id))
+
+
+#  Create Artist
+#  ----------------------------------------------------------------
+
+
+@artists_bp.route('/artists/create', methods=['GET'])
+def create_artist_form():
+    form = ArtistForm()
+    return render_template('forms/new_artist.html', form=form)
+
+
+@artists_bp.route('/artists/create', methods=['POST'])
+def create_artist_submission():
+    # called upon submitting the new artist listing form
+    # TODO: insert form data as a new artist record in the db, instead
+    # TODO: modify data to be the data object returned from db insertion
+
+    form = ArtistForm(request.form, meta={'csrf': False})
+    try:
+        artist = Artist()
+        form.populate_obj(artist)
+        db.session.add(artist)
+        db.session.commit()
+        page_cache.invalidate('artists')
+    # on successful db insert, flash success
+        flash('Artist ' + form.name.data + ' was successfully listed!')
+    except ValueError as e:
+        print(e)
+        db.session.rollback()
+        # TODO: on unsuccessful db insert, flash an error instead.
+        flash('An error occurred. Artist ' +
+              form.name.data + ' could not be listed.')
+    finally:
+        db.session.close()
+    
+    return render_template('pages/home.html')
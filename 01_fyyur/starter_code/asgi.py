@@ -0,0 +1,383 @@
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import abort, current_app, g, make_response, render_template, \
+    request, session
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import Map, Rule
+
+from app import create_app as create_wsgi_app
+from conditional import revalidate, set_validators
+from models import Venue, Artist, Show, connect_args
+from queries import (
+    artist_matches_query,
+    artist_query,
+    artist_validators_query,
+    artists_page_query,
+    detail_data,
+    detail_validators_result,
+    entity_list_validators_query,
+    entity_list_validators_result,
+    genre_arg,
+    genre_facets_result,
+    group_areas,
+    keyset_query,
+    keyset_rows,
+    page_args,
+    show_filters,
+    show_list_queries,
+    shows_page_query,
+    shows_validators_query,
+    shows_validators_result,
+    venue_areas_query,
+    venue_matches_query,
+    venue_query,
+    venue_validators_query,
+    with_genre_facets
+)
+from routing import READ_METHODS, reads_from_replica
+from search import search_query, search_terms
+from shows import shows_template_context
+
+#----------------------------------------------------------------------------#
+# ASGI entry point.
+#----------------------------------------------------------------------------#
+
+# An async deployment of the same app:
+#
+#     uvicorn --factory asgi:create_app --workers 4
+#
+# The read-only pages (listings, detail pages and the two searches) are
+# served by coroutines on SQLAlchemy's async engine (asyncpg, aiosqlite for
+# local SQLite databases), so a worker keeps serving other requests while
+# it waits on the database, and a page's independent queries run at the
+# same time on separate connections: a detail page costs one round trip
+# instead of five. Queries, templates, error handlers, sessions, the
+# request hooks (metrics, replica pinning) and the conditional request
+# validators are the WSGI app's. The page cache is not consulted: its
+# shared backend is blocking.
+#
+# Every other route runs the WSGI app in a thread pool.
+
+ROUTES = Map([
+    Rule('/venues', endpoint='venues', methods=['GET']),
+    Rule('/venues/search', endpoint='search_venues', methods=['POST']),
+    Rule('/venues/<int:venue_id>', endpoint='show_venue', methods=['GET']),
+    Rule('/artists', endpoint='artists', methods=['GET']),
+    Rule('/artists/search', endpoint='search_artists', methods=['POST']),
+    Rule('/artists/<int:artist_id>', endpoint='show_artist', methods=['GET']),
+    Rule('/shows', endpoint='shows', methods=['GET']),
+])
+
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg',
+                 'sqlite': 'sqlite+aiosqlite'}
+
+
+def async_url(url):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+
+def create_engines(config):
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = {}
+    if url.get_backend_name() == 'postgresql':
+        options = dict(config['SQLALCHEMY_ENGINE_OPTIONS'])
+    engines = {'primary': _create_engine(config, async_url(url), options)}
+    if config.get('DATABASE_REPLICA_URL'):
+        engines['replica'] = _create_engine(
+            config, async_url(config['DATABASE_REPLICA_URL']), options)
+    return engines
+
+
+def _create_engine(config, url, options):
+    # asyncpg takes its timeouts differently from psycopg2
+    args = connect_args(config, url)
+    if args:
+        options = dict(options, connect_args=args)
+    return create_async_engine(url, **options)
+
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+# Every query runs on a connection of its own, so the queries of a page can
+# be awaited together with asyncio.gather().
+
+
+def _engine():
+    # the replica unless the client just wrote, as RoutingSession does
+    engines = current_app.extensions['async_engines']
+    if reads_from_replica() and 'replica' in engines:
+        return engines['replica']
+    return engines['primary']
+
+
+async def _execute(statement):
+    async with _engine().connect() as connection:
+        return (await connection.execute(statement)).all()
+
+
+async def fetch(query):
+    return await _execute(query.statement)
+
+
+async def fetch_first(query):
+    rows = await _execute(query.limit(1).statement)
+    return rows[0] if rows else None
+
+
+async def fetch_count(query):
+    # as Query.count()
+    rows = await _execute(select(func.count()).select_from(
+        query.order_by(None).statement.subquery()))
+    return rows[0][0]
+
+
+def _render(validators, template, **context):
+    # `validators` is (values, last_modified) as the conditional() views get
+    if (validators is None or request.method not in READ_METHODS
+            or session.get('_flashes')):
+        return make_response(render_template(template, **context))
+    etag, last_modified, modified = revalidate(*validators)
+    response = make_response(
+        render_template(template, **context) if modified else ('', 304))
+    return set_validators(response, etag, last_modified)
+
+
+#----------------------------------------------------------------------------#
+# Pages.
+#----------------------------------------------------------------------------#
+
+
+async def venues():
+    genre = genre_arg()
+    query = with_genre_facets(venue_areas_query(genre), Venue.genres,
+                              narrowed=genre is not None)
+    validators, rows = await asyncio.gather(
+        fetch_first(entity_list_validators_query(Venue)), fetch(query))
+    return _render(entity_list_validators_result(validators),
+                   'pages/venues.html', areas=group_areas(rows), genre=genre,
+                   facets=genre_facets_result(rows))
+
+
+async def artists():
+    after, limit = page_args()
+    genre = genre_arg()
+    query, keys = artists_page_query(genre=genre)
+    page = keyset_query(with_genre_facets(query, Artist.genres,
+                                          narrowed=genre is not None),
+                        keys, after, limit)
+    validators, rows = await asyncio.gather(
+        fetch_first(entity_list_validators_query(Artist)), fetch(page))
+    data, next_after = keyset_rows(rows, len(keys), limit)
+    return _render(entity_list_validators_result(validators),
+                   'pages/artists.html', artists=data,
+                   next_after=next_after, limit=limit, genre=genre,
+                   facets=genre_facets_result(data))
+
+
+async def shows():
+    after, limit = page_args()
+    now = datetime.now()
+    query, keys = shows_page_query(show_filters(request.args), now)
+    page = keyset_query(query, keys, after, limit)
+    validators, rows = await asyncio.gather(
+        fetch_first(shows_validators_query(now)), fetch(page))
+    data, next_after = keyset_rows(rows, len(keys), limit)
+    return _render(shows_validators_result(validators), 'pages/shows.html',
+                   **shows_template_context(data, next_after, limit))
+
+
+async def _search(model, template):
+    g.read_only = True
+    search_term = request.form.get('search_term', '')
+    after, limit = page_args()
+    genre = genre_arg()
+    query, keys = search_query(model, search_term, genre=genre)
+    narrowed = bool(search_terms(search_term)) or genre is not None
+    page = keyset_query(with_genre_facets(query, model.genres, narrowed),
+                        keys, after, limit)
+    rows, count = await asyncio.gather(fetch(page), fetch_count(query))
+    data, next_after = keyset_rows(rows, len(keys), limit)
+    results = {'data': data, 'next_after': next_after, 'count': count,
+               'facets': genre_facets_result(data)}
+    return _render(None, template, results=results, search_term=search_term,
+                   limit=limit, genre=genre)
+
+
+async def search_venues():
+    return await _search(Venue, 'pages/search_venues.html')
+
+
+async def search_artists():
+    return await _search(Artist, 'pages/search_artists.html')
+
+
+async def _detail(entity_query, validators_query, matches_query, show_fk,
+                  other, prefix, entity_id):
+    # the entity, its shows, its matches and the validators at once
+    now = datetime.now()
+    upcoming, past = show_list_queries(
+        show_fk, entity_id, other, prefix, now,
+        current_app.config['PAST_SHOWS_LIMIT'],
+        current_app.config['UPCOMING_SHOWS_LIMIT'])
+    validators, row, upcoming, past, matches = await asyncio.gather(
+        fetch_first(validators_query(entity_id, now)),
+        fetch_first(entity_query(entity_id)), fetch(upcoming), fetch(past),
+        fetch(matches_query(entity_id, current_app.config['MATCHES_TOP_K'])))
+    if row is None:
+        abort(404)
+    return detail_validators_result(validators), \
+        detail_data(row, upcoming, past, matches)
+
+
+async def show_venue(venue_id):
+    validators, data = await _detail(venue_query, venue_validators_query,
+                                     venue_matches_query, Show.venue_id,
+                                     Artist, 'artist', venue_id)
+    return _render(validators, 'pages/show_venue.html', venue=data)
+
+
+async def show_artist(artist_id):
+    validators, data = await _detail(artist_query, artist_validators_query,
+                                     artist_matches_query, Show.artist_id,
+                                     Venue, 'venue', artist_id)
+    return _render(validators, 'pages/show_artist.html', artist=data)
+
+
+PAGES = {page.__name__: page for page in (
+    venues, artists, shows, search_venues, search_artists, show_venue,
+    show_artist)}
+
+
+#----------------------------------------------------------------------------#
+# ASGI application.
+#----------------------------------------------------------------------------#
+
+
+async def _read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return bytes(body)
+
+
+def wsgi_environ(scope, body):
+    # the WSGI environ of an ASGI http request (PEP 3333)
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        if name in environ and name.startswith('HTTP_'):
+            value = environ[name] + ',' + value
+        environ[name] = value
+    return environ
+
+
+class AsyncApp:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.executor = ThreadPoolExecutor(
+            flask_app.config['ASYNC_WSGI_THREADS'])
+        flask_app.extensions['async_engines'] = create_engines(
+            flask_app.config)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+        environ = wsgi_environ(scope, await _read_body(receive))
+        try:
+            page, args = ROUTES.bind_to_environ(environ).match()
+        except HTTPException:
+            page = None
+        if page is None:
+            status, headers, body = await asyncio.get_running_loop(
+            ).run_in_executor(self.executor, self.call_wsgi, environ)
+        else:
+            response = await self.dispatch(environ, PAGES[page], args)
+            status = response.status_code
+            headers = response.headers.to_wsgi_list()
+            body = response.get_data() if scope['method'] != 'HEAD' else b''
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(name.lower().encode('latin-1'),
+                                 value.encode('latin-1'))
+                                for name, value in headers]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def dispatch(self, environ, page, args):
+        # Flask.full_dispatch_request() with an awaited view
+        app = self.flask_app
+        with app.request_context(environ):
+            try:
+                try:
+                    response = app.preprocess_request()
+                    if response is None:
+                        response = await page(**args)
+                except Exception as e:
+                    response = app.handle_user_exception(e)
+                return app.process_response(app.make_response(response))
+            except Exception as e:
+                return app.make_response(app.handle_exception(e))
+
+    def call_wsgi(self, environ):
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [int(status.split(' ', 1)[0]), headers]
+
+        result = self.flask_app.wsgi_app(environ, start_response)
+        try:
+            body = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return started[0], started[1], body
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for engine in self.flask_app.extensions[
+                        'async_engines'].values():
+                    await engine.dispose()
+                self.executor.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_app(config_name=None):
+    return AsyncApp(create_wsgi_app(config_name))
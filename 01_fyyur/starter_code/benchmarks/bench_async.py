@@ -0,0 +1,106 @@
+"""Throughput of the ASGI read path against the WSGI app.
+
+Starts the app twice on the same database, as `app.run()` (the threaded
+WSGI server of `python app.py`) and as `uvicorn --factory asgi:create_app`,
+loads both with the request mix of bench_load.py at high concurrency and
+prints the ASGI figures next to the WSGI ones. The page cache is off in
+both servers unless --cache is given, the ASGI read path does not use it.
+
+    flask seed --venues 5000 --artists 20000 --shows 200000
+    python benchmarks/bench_async.py --clients 64 --duration 30 \\
+        --output async.json
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import time
+
+from bench_load import HTTPClient, print_report, run
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+WSGI = ('from app import create_app; '
+        "create_app('production').run(host='127.0.0.1', port={port}, "
+        'threaded=True)')
+
+
+def start_server(command, port, cache):
+    env = dict(os.environ, FYYUR_CONFIG='production',
+               CACHE_ENABLED=str(cache), METRICS_ENABLED='false')
+    env.pop('FLASK_RUN_FROM_CLI', None)
+    server = subprocess.Popen(command, cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port,
+                                                    timeout=1)
+            connection.request('GET', '/')
+            connection.getresponse().read()
+            return server
+        except OSError:
+            if server.poll() is not None:
+                break
+            time.sleep(0.2)
+    server.kill()
+    raise SystemExit(f'server on port {port} did not start: '
+                     + ' '.join(command))
+
+
+def bench(name, command, port, args):
+    server = start_server(command, port, args.cache)
+    try:
+        url = f'http://127.0.0.1:{port}'
+        report = run(lambda: HTTPClient(url), args.clients, args.duration,
+                     args.warmup, args.seed)
+    finally:
+        server.terminate()
+        server.wait()
+    print(f'\n{name}')
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=64,
+                        help='concurrent clients (threads)')
+    parser.add_argument('--duration', type=float, default=20,
+                        help='seconds of measurement per server')
+    parser.add_argument('--warmup', type=int, default=5,
+                        help='requests per route before measuring')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='random seed of the request mix')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='uvicorn worker processes')
+    parser.add_argument('--port', type=int, default=5081,
+                        help='port of the first server, the second uses '
+                             'the next one')
+    parser.add_argument('--cache', action='store_true',
+                        help='keep the page cache of the WSGI app on')
+    parser.add_argument('--output', help='write both results to a JSON file')
+    args = parser.parse_args()
+
+    wsgi = bench('WSGI (app.run, threaded)',
+                 [sys.executable, '-c', WSGI.format(port=args.port)],
+                 args.port, args)
+    print_report(wsgi)
+    asgi = bench(f'ASGI (uvicorn, {args.workers} workers)',
+                 [sys.executable, '-m', 'uvicorn', '--factory',
+                  'asgi:create_app', '--host', '127.0.0.1',
+                  '--port', str(args.port + 1),
+                  '--workers', str(args.workers), '--log-level', 'warning'],
+                 args.port + 1, args)
+    print_report(asgi, baseline=wsgi)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'clients': args.clients, 'wsgi': wsgi, 'asgi': asgi},
+                      f, indent=2)
+    return 1 if wsgi['total']['errors'] or asgi['total']['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""Micro-benchmark of the `datetime` Jinja filter.
+
+Compares the old filter (str() of the datetime, dateutil parsing and a
+full babel.dates.format_datetime call) with filters.format_datetime, fed
+with strings and with the datetime objects the views now pass.
+
+    python benchmarks/bench_format_datetime.py
+"""
+import os
+import sys
+import timeit
+from datetime import datetime
+
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from filters import format_datetime  # noqa: E402
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def bench(name, func, value, number=20000):
+    seconds = min(timeit.repeat(lambda: func(value, 'full'),
+                                number=number, repeat=5))
+    print(f"{name:<32} {seconds / number * 1e6:8.2f} us/call")
+    return seconds
+
+
+def main():
+    start_time = datetime(2035, 4, 1, 20, 30)
+    assert (legacy_format_datetime(str(start_time), 'full')
+            == format_datetime(start_time, 'full'))
+    before = bench('before (str + dateutil + babel)', legacy_format_datetime,
+                   str(start_time))
+    bench('after, str value', format_datetime, str(start_time))
+    after = bench('after, datetime value', format_datetime, start_time)
+    print(f"speedup: {before / after:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""Load benchmark of the read paths.
+
+Runs concurrent clients for a fixed time against the listings (/venues,
+/artists, /shows), the search POSTs and the venue and artist pages, and
+reports per-route latency percentiles (p50, p95, p99) and throughput. The
+client is plain Python: one keep-alive http.client connection per thread
+against --url, or, without --url, Flask test clients calling create_app()
+in this process (no network, no server; useful to profile the views).
+
+Fill the database with `flask seed` first. Results can be saved with
+--output and compared with an earlier run with --compare:
+
+    flask seed --venues 5000 --artists 20000 --shows 200000
+    python benchmarks/bench_load.py --url http://localhost:5000 \\
+        --clients 8 --duration 30 --output after.json --compare before.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+SEARCH_TERMS = ('hop', 'band', 'music', 'jazz', 'san', 'the', 'rock', 'ca')
+
+FORM_HEADERS = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+
+# (route, weight, request(rng, ids) -> (method, path, form or None))
+SCENARIO = (
+    ('GET /venues', 3, lambda rng, ids: ('GET', '/venues', None)),
+    ('GET /artists', 3, lambda rng, ids: ('GET', '/artists', None)),
+    ('GET /shows', 3, lambda rng, ids: ('GET', '/shows', None)),
+    ('POST /venues/search', 2, lambda rng, ids: (
+        'POST', '/venues/search', {'search_term': rng.choice(SEARCH_TERMS)})),
+    ('POST /artists/search', 2, lambda rng, ids: (
+        'POST', '/artists/search', {'search_term': rng.choice(SEARCH_TERMS)})),
+    ('GET /venues/<id>', 4, lambda rng, ids: (
+        'GET', f"/venues/{rng.choice(ids['venues'])}", None)),
+    ('GET /artists/<id>', 4, lambda rng, ids: (
+        'GET', f"/artists/{rng.choice(ids['artists'])}", None)),
+)
+
+
+class HTTPClient:
+    def __init__(self, url):
+        parts = urlsplit(url)
+        connection = (http.client.HTTPSConnection if parts.scheme == 'https'
+                      else http.client.HTTPConnection)
+        self.connection = connection(parts.netloc, timeout=30)
+        self.prefix = parts.path.rstrip('/')
+
+    def request(self, method, path, form=None):
+        body = urlencode(form) if form is not None else None
+        self.connection.request(method, self.prefix + path, body,
+                                FORM_HEADERS if form is not None else {})
+        response = self.connection.getresponse()
+        data = response.read()
+        return response.status, data
+
+
+class AppClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, form=None):
+        response = self.client.open(path, method=method, data=form)
+        return response.status_code, response.data
+
+
+def sample_ids(client, entity, limit=200):
+    # ids of the first page of the API listing
+    status, data = client.request('GET',
+                                  f'/api/v1/{entity}?fields=id&limit={limit}')
+    if status != 200:
+        raise SystemExit(f'GET /api/v1/{entity}: HTTP {status}')
+    ids = [row['id'] for row in json.loads(data)['data']]
+    if not ids:
+        raise SystemExit(f'no {entity} in the database, run `flask seed`')
+    return ids
+
+
+def percentile(ordered, p):
+    # nearest rank
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def worker(client, ids, rng, deadline, results, lock):
+    names = [name for name, _, _ in SCENARIO]
+    weights = [weight for _, weight, _ in SCENARIO]
+    requests = {name: make for name, _, make in SCENARIO}
+    latencies = {name: [] for name in names}
+    errors = dict.fromkeys(names, 0)
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        method, path, form = requests[name](rng, ids)
+        start = time.perf_counter()
+        try:
+            status, _ = client.request(method, path, form)
+        except (OSError, http.client.HTTPException):
+            status = None
+        elapsed = time.perf_counter() - start
+        if status != 200:
+            errors[name] += 1
+        else:
+            latencies[name].append(elapsed)
+    with lock:
+        for name in names:
+            results[name]['latencies'].extend(latencies[name])
+            results[name]['errors'] += errors[name]
+
+
+def summary(latencies, errors, duration):
+    ordered = sorted(latencies)
+    ms = lambda value: None if value is None else round(value * 1000, 3)
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'throughput': round(len(ordered) / duration, 2),
+        'mean_ms': ms(sum(ordered) / len(ordered)) if ordered else None,
+        'p50_ms': ms(percentile(ordered, 50)),
+        'p95_ms': ms(percentile(ordered, 95)),
+        'p99_ms': ms(percentile(ordered, 99)),
+    }
+
+
+def run(make_client, clients, duration, warmup, random_seed):
+    ids_client = make_client()
+    ids = {'venues': sample_ids(ids_client, 'venues'),
+           'artists': sample_ids(ids_client, 'artists')}
+    rng = random.Random(random_seed)
+    for name, _, make in SCENARIO:
+        # warm up caches, connection pools and lazy imports
+        for _ in range(warmup):
+            ids_client.request(*make(rng, ids))
+
+    results = {name: {'latencies': [], 'errors': 0} for name, _, _ in SCENARIO}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=worker, args=(
+        make_client(), ids, random.Random(rng.random()), deadline, results,
+        lock)) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    routes = {name: summary(result['latencies'], result['errors'], elapsed)
+              for name, result in results.items()}
+    total = summary([latency for result in results.values()
+                     for latency in result['latencies']],
+                    sum(result['errors'] for result in results.values()),
+                    elapsed)
+    return {'routes': routes, 'total': total, 'duration': round(elapsed, 3)}
+
+
+def print_report(report, baseline=None):
+    columns = ('requests', 'errors', 'throughput', 'p50_ms', 'p95_ms',
+               'p99_ms')
+    print(f"{'route':<22}" + ''.join(f'{column:>12}' for column in columns))
+    rows = list(report['routes'].items()) + [('total', report['total'])]
+    for name, stats in rows:
+        print(f'{name:<22}' + ''.join(
+            f"{'-' if stats[column] is None else stats[column]:>12}"
+            for column in columns))
+        old = baseline and (baseline['total'] if name == 'total'
+                            else baseline['routes'].get(name))
+        if old:
+            print(f"{'  vs baseline':<22}" + ''.join(
+                f'{_change(old.get(column), stats[column]):>12}'
+                for column in columns))
+
+
+def _change(old, new):
+    if not old or new is None:
+        return ''
+    return f'{(new - old) / old * 100:+.1f}%'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url',
+                        help='server to load, e.g. http://localhost:5000; '
+                             'without it the app runs in this process')
+    parser.add_argument('--clients', type=int, default=4,
+                        help='concurrent clients (threads)')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='seconds of measurement')
+    parser.add_argument('--warmup', type=int, default=5,
+                        help='requests per route before measuring')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='random seed of the request mix')
+    parser.add_argument('--output', help='write the results to a JSON file')
+    parser.add_argument('--compare',
+                        help='JSON file of an earlier run to compare with')
+    args = parser.parse_args()
+
+    if args.url:
+        make_client = lambda: HTTPClient(args.url)
+    else:
+        sys.path.insert(0, ROOT)
+        from app import create_app
+        app = create_app()
+        make_client = lambda: AppClient(app)
+
+    report = run(make_client, args.clients, args.duration, args.warmup,
+                 args.seed)
+    report = dict(
+        target=args.url or 'in-process', clients=args.clients,
+        started=datetime.now().isoformat(timespec='seconds'), **report)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 1 if report['total']['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Startup benchmark of a web worker.
+
+Starts fresh interpreters that import app.py and build an app with
+create_app(), as a gunicorn worker does, and reports the `python -X
+importtime` total of `import app`, the time create_app() takes and the
+slowest imports. Exits with status 1 when the import time is over budget
+or when a module that only the CLI or old callers need (alembic, dateutil,
+...) is imported at startup.
+
+    python benchmarks/bench_startup.py [--budget 750] [--runs 5]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# imported lazily, a worker must not load them at startup
+LAZY_MODULES = ('flask_migrate', 'alembic', 'dateutil.parser', 'flask_moment',
+                'redis', 'numpy')
+
+WORKER = f'''
+import sys, time
+import app
+start = time.perf_counter()
+app.create_app('production')
+print('create_app', (time.perf_counter() - start) * 1e6, file=sys.stderr)
+print('loaded', *[name for name in {LAZY_MODULES!r} if name in sys.modules],
+      file=sys.stderr)
+'''
+
+
+def run_worker():
+    # returns ({module: cumulative us}, create_app us, lazy modules loaded)
+    env = dict(os.environ, FYYUR_CONFIG='production')
+    env.pop('FLASK_RUN_FROM_CLI', None)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', WORKER],
+                            cwd=ROOT, env=env, capture_output=True, text=True,
+                            check=True)
+    imports, create_app, loaded = {}, None, []
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and line[-1] != ']' \
+                and not line.endswith('imported package'):
+            _, cumulative, name = line.split('|')
+            depth = (len(name) - len(name.lstrip()) - 1) // 2
+            # app itself and the modules app.py imports directly; modules
+            # are listed after the ones they import, create_app()'s last
+            name = name.strip()
+            if 'app' not in imports and (depth == 1 or name == 'app'):
+                imports[name] = int(cumulative)
+        elif line.startswith('create_app'):
+            create_app = float(line.split()[1])
+        elif line.startswith('loaded'):
+            loaded = line.split()[1:]
+    return imports, create_app, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget', type=float, default=750,
+                        help='milliseconds allowed for `import app`')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [run_worker() for _ in range(args.runs)]
+    # the fastest run is the one least disturbed by the rest of the machine
+    imports, create_app, loaded = min(runs, key=lambda run: run[0]['app'])
+    total = imports.pop('app') / 1000
+    print(f"import app         {total:8.1f} ms  (budget {args.budget:.0f} ms)")
+    print(f"create_app()       {create_app / 1000:8.1f} ms")
+    print('slowest imports of app.py:')
+    for name, us in sorted(imports.items(), key=lambda item: -item[1])[:8]:
+        print(f"  {name:<16} {us / 1000:8.1f} ms")
+
+    failed = False
+    if loaded:
+        print('imported at startup but should be lazy: ' + ', '.join(loaded))
+        failed = True
+    if total > args.budget:
+        print(f"over budget by {total - args.budget:.1f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,198 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, insert, or_
+from sqlalchemy.exc import IntegrityError
+
+from models import (
+    db,
+    Venue,
+    Artist,
+    Show,
+    Booking,
+    SHOW_DURATION,
+    count_shows,
+    update_show_counters
+)
+
+#----------------------------------------------------------------------------#
+# Show bookings.
+#----------------------------------------------------------------------------#
+
+# Shows are inserted straight away and the foreign keys of the Show table
+# check that the artist and the venue exist, in the same round trip and
+# without the race of a separate existence check. Only when the insert
+# fails do we look at which reference was wrong.
+#
+# Double bookings are refused the same way: the exclusion constraints of
+# Booking (see models.py) reject a show overlapping another one of its venue
+# or artist, atomically, whoever inserts it. A booking UI asks beforehand
+# with conflicts_query(), one lookup in the gist index of the constraints.
+
+# the most conflicts listed by one availability check
+CONFLICTS_LIMIT = 50
+# the longest show, in minutes
+MAX_DURATION_MINUTES = 24 * 60
+
+
+class BookingError(Exception):
+    pass
+
+
+def _missing_ids(model, ids):
+    found = {row[0] for row in db.session.query(model.id).filter(
+        model.id.in_(ids))}
+    return sorted(set(ids) - found)
+
+
+def conflict_error(error):
+    # the message of a violated exclusion constraint (named by SQLite too),
+    # None for any other error
+    message = str(error.orig)
+    if 'Booking_venue_excl' in message:
+        return 'The venue is already booked at that time'
+    if 'Booking_artist_excl' in message:
+        return 'The artist is already booked at that time'
+    return None
+
+
+def reference_error(error, artist_ids, venue_id):
+    # Postgres names the violated constraint (Show_artist_id_fkey or
+    # Show_venue_id_fkey); SQLite does not, so fall back to a lookup. The
+    # references come first: a show of a missing venue or artist may also
+    # overlap a booking, and then the constraint reported is not the cause.
+    message = str(error.orig)
+    if 'Show_artist_id_fkey' in message:
+        return 'Artist ID not valid'
+    if 'Show_venue_id_fkey' in message:
+        return 'Venue ID not valid'
+    conflict = conflict_error(error)
+    if db.session.get(Venue, venue_id) is None:
+        return 'Venue ID not valid'
+    missing = _missing_ids(Artist, artist_ids)
+    if len(missing) > 1:
+        return 'Artist IDs not valid: ' + ', '.join(map(str, missing))
+    if missing:
+        return 'Artist ID not valid'
+    return conflict or 'An error occurred. Show could not be listed.'
+
+
+def show_end(start_time, minutes=None):
+    # start_time plus `minutes`, SHOW_DURATION when not given
+    if minutes is None:
+        return start_time + SHOW_DURATION
+    if not 0 < minutes <= MAX_DURATION_MINUTES:
+        raise BookingError(
+            f'A show lasts 1 to {MAX_DURATION_MINUTES} minutes')
+    return start_time + timedelta(minutes=minutes)
+
+
+def create_show(artist_id, venue_id, start_time, minutes=None):
+    try:
+        db.session.add(Show(artist_id=artist_id, venue_id=venue_id,
+                            start_time=start_time,
+                            end_time=show_end(start_time, minutes)))
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        raise BookingError(reference_error(e, [artist_id], venue_id))
+
+
+def parse_show_lines(text):
+    # "artist_id, start_time[, minutes]" per line, start_time as
+    # YYYY-MM-DD HH:MM[:SS]; returns (artist_id, start_time, end_time)
+    shows = []
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            artist_id, start_time, *minutes = line.split(',')
+            if len(minutes) > 1:
+                raise ValueError(line)
+            start_time = datetime.fromisoformat(start_time.strip())
+            artist_id = int(artist_id)
+            minutes = int(minutes[0]) if minutes else None
+        except ValueError:
+            raise BookingError(
+                f'Line {number} is not "artist_id, start_time[, minutes]"')
+        shows.append((artist_id, start_time, show_end(start_time, minutes)))
+    return shows
+
+
+def create_shows(venue_id, shows):
+    # Books a list of (artist_id, start_time, end_time) at one venue with a
+    # single multi-row INSERT in one transaction: all shows are listed or
+    # none. The show counters are updated in that transaction too.
+    rows = [{'venue_id': venue_id, 'artist_id': artist_id,
+             'start_time': start_time, 'end_time': end_time}
+            for artist_id, start_time, end_time in shows]
+    if not rows:
+        return 0
+    try:
+        db.session.execute(insert(Show), rows)
+        now = datetime.now()
+        update_show_counters(count_shows(
+            {}, [(venue_id, row['artist_id'], row['start_time'])
+                 for row in rows], now), now)
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        raise BookingError(reference_error(
+            e, [row['artist_id'] for row in rows], venue_id))
+    return len(rows)
+
+
+def conflicts_query(start_time, end_time, venue_id=None, artist_id=None):
+    # The bookings of the venue or of the artist overlapping [start_time,
+    # end_time), earliest first. On Postgres an overlap (&&) of the ranges
+    # the exclusion constraints index, so both sides are a gist index scan.
+    if db.session.get_bind().dialect.name == 'sqlite':
+        overlap = and_(Booking.end_time > start_time,
+                       Booking.start_time < end_time)
+    else:
+        overlap = func.tsrange(Booking.start_time, Booking.end_time).op(
+            '&&', is_comparison=True)(func.tsrange(start_time, end_time))
+    booked = []
+    if venue_id is not None:
+        booked.append(Booking.venue_id == venue_id)
+    if artist_id is not None:
+        booked.append(Booking.artist_id == artist_id)
+    return db.session.query(
+        Booking.show_id,
+        Booking.venue_id,
+        Booking.artist_id,
+        Booking.start_time,
+        Booking.end_time
+    ).filter(or_(*booked), overlap
+    ).order_by(Booking.start_time, Booking.show_id
+    ).limit(CONFLICTS_LIMIT)
+
+
+def _id_arg(args, name):
+    value = (args.get(name) or '').strip()
+    if not value:
+        return None
+    if not value.isdigit():
+        raise BookingError(f'Invalid {name}: {value}')
+    return int(value)
+
+
+def conflict_args(args):
+    # (venue_id, artist_id, start_time, end_time) of an availability check:
+    # ?venue_id= and/or ?artist_id=, ?start_time= and either ?end_time= or
+    # ?minutes= (SHOW_DURATION by default); raises BookingError
+    venue_id, artist_id = _id_arg(args, 'venue_id'), _id_arg(args, 'artist_id')
+    if venue_id is None and artist_id is None:
+        raise BookingError('Give a venue_id, an artist_id or both')
+    try:
+        start_time = datetime.fromisoformat(args.get('start_time', ''))
+        if args.get('end_time'):
+            end = datetime.fromisoformat(args['end_time'])
+        else:
+            minutes = args.get('minutes')
+            end = show_end(start_time, int(minutes) if minutes else None)
+    except ValueError:
+        raise BookingError('start_time and end_time must be ISO date times, '
+                           'minutes a number')
+    if end <= start_time:
+        raise BookingError('end_time must be after start_time')
+    return venue_id, artist_id, start_time, end
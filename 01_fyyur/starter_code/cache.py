@@ -0,0 +1,216 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g, request, session
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+# Rendered pages are cached per namespace ("venues", "artists",
+# "venue:<id>", "artist:<id>") and URL. Every namespace has a generation
+# counter that is part of the cache key, so invalidating a namespace is a
+# single counter bump that drops all of its pages (e.g. every ?after= page
+# of /artists) at once.
+#
+# Lookups go to the in-process LRU first and then to the optional shared
+# backend. The generations live in the shared backend when there is one,
+# so an invalidation made by one worker is seen by all of them.
+#
+# With a read replica, the first request after an invalidation may come
+# from a client that is not pinned to the primary (routing.py) and would
+# render the page from a replica that has not caught up with the write;
+# cached, that page would hide the write for CACHE_TTL. So the time of the
+# last invalidation of every namespace is kept too, and for
+# DATABASE_REPLICA_LAG seconds after it the pages of the namespace are
+# rendered from the primary.
+
+
+class LRUCache:
+    # in-process cache with a maximum size and a time to live per entry
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        # counters and stamps are kept apart so they are never evicted
+        self._counters = {}
+        self._stamps = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def counter(self, key):
+        return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def stamp(self, key, ttl):
+        # records the current time under `key`, for `ttl` seconds
+        self._stamps[key] = time.time()
+
+    def stamped(self, key):
+        return self._stamps.get(key, 0.0)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Stand-in for a shared cache server: one store for the whole process,
+# whatever the number of PageCache instances. Useful in development and
+# tests, where there is no cache server to talk to.
+_local_shared_store = None
+
+
+def local_shared_store(max_entries=1024, ttl=300):
+    global _local_shared_store
+    if _local_shared_store is None:
+        _local_shared_store = LRUCache(max_entries, ttl)
+    return _local_shared_store
+
+
+class RedisCache:
+    # shared backend on a Redis server, needs the `redis` package
+    def __init__(self, url, ttl=300):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key):
+        value = self.client.get(key)
+        return None if value is None else value.decode()
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=self.ttl if ttl is None else ttl)
+
+    def counter(self, key):
+        return int(self.client.get(key) or 0)
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+    def stamp(self, key, ttl):
+        self.client.set(key, time.time(), ex=max(1, int(ttl) + 1))
+
+    def stamped(self, key):
+        return float(self.client.get(key) or 0)
+
+    def clear(self):
+        self.client.flushdb()
+
+
+class PageCache:
+    def __init__(self, app=None):
+        self.local = None
+        self.shared = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('CACHE_ENABLED', True)
+        ttl = app.config.get('CACHE_TTL', 300)
+        self.local = LRUCache(app.config.get('CACHE_MAX_ENTRIES', 1024), ttl)
+        shared_url = app.config.get('CACHE_SHARED_URL')
+        if shared_url == 'local':
+            self.shared = local_shared_store(
+                app.config.get('CACHE_MAX_ENTRIES', 1024), ttl)
+        elif shared_url:
+            self.shared = RedisCache(shared_url, ttl)
+        # seconds a replica may lag behind the primary, 0 without one
+        self.replica_lag = (app.config.get('DATABASE_REPLICA_LAG', 0)
+                            if app.config.get('DATABASE_REPLICA_URL') else 0)
+        app.extensions['page_cache'] = self
+
+    def _generation(self, namespace):
+        store = self.shared or self.local
+        return store.counter('gen:' + namespace)
+
+    def key(self, namespace, path):
+        return f"page:{namespace}:{self._generation(namespace)}:{path}"
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value)
+
+    def invalidate(self, *namespaces):
+        # old pages are never read again and age out of the caches
+        store = self.shared or self.local
+        for namespace in set(namespaces):
+            store.incr('gen:' + namespace)
+            if self.replica_lag:
+                store.stamp('invalidated:' + namespace, self.replica_lag)
+
+    def recently_invalidated(self, namespace):
+        # whether a replica may not show the write behind the last
+        # invalidation of the namespace yet
+        if not self.replica_lag:
+            return False
+        store = self.shared or self.local
+        return (time.time() - store.stamped('invalidated:' + namespace)
+                < self.replica_lag)
+
+    def cached(self, namespace):
+        # Caches the page rendered by a GET view. `namespace` is a string or
+        # a function of the view arguments, e.g. lambda venue_id: ...
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                # pages carrying flashed messages are user specific
+                if (not self.enabled or request.method != 'GET'
+                        or session.get('_flashes')):
+                    return view(*args, **kwargs)
+                name = namespace(**kwargs) if callable(namespace) else namespace
+                key = self.key(name, request.full_path)
+                page = self.get(key)
+                if page is None:
+                    if self.recently_invalidated(name):
+                        g.read_primary = True
+                    page = view(*args, **kwargs)
+                    if isinstance(page, str):
+                        self.set(key, page)
+                return page
+            return wrapper
+        return decorator
+
+
+# bound to an app by create_app() in app.py
+page_cache = PageCache()
+
+
+def invalidate_pages(*namespaces):
+    # for code that has no direct handle on the app's PageCache
+    page_cache = current_app.extensions.get('page_cache')
+    if page_cache is not None:
+        page_cache.invalidate(*namespaces)
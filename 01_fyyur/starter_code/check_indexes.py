@@ -0,0 +1,133 @@
+"""Checks that the hot queries of app.py are served by indexes.
+
+Runs EXPLAIN on every query behind the listing, detail, search and delete
+paths with sequential scans disabled. Postgres only falls back to a
+sequential scan then if no index can serve the query, so any "Seq Scan"
+left in a plan is reported as a missing index.
+
+Run it against a migrated Postgres database (`flask db upgrade`):
+
+    python check_indexes.py
+"""
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from app import create_app
+from models import db, Venue, Artist, Show
+from queries import (
+    venue_areas_query,
+    show_list_queries,
+    artists_page_query,
+    shows_page_query,
+    keyset_query,
+    encode_cursor,
+    with_genre_facets,
+    nearby_venues_query,
+    venue_matches_query,
+    artist_matches_query,
+    artist_ids_of_venue_query,
+    venue_ids_of_artist_query,
+    venue_validators_query,
+    entity_list_validators_query,
+    shows_validators_query
+)
+from search import search_query
+from bookings import conflicts_query
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain)
+def _compile_explain(element, compiler, **kw):
+    return 'EXPLAIN ' + compiler.process(element.statement, **kw)
+
+
+def hot_queries(now):
+    # (name, query) for every query the pages of app.py run per request
+    queries = [('venues', venue_areas_query())]
+    for name, fk, other, prefix in (
+            ('show_venue', Show.venue_id, Artist, 'artist'),
+            ('show_artist', Show.artist_id, Venue, 'venue')):
+        upcoming, past = show_list_queries(
+            fk, 1, other, prefix, now, 20, 20)
+        queries += [(name + ' upcoming', upcoming),
+                    (name + ' past', past)]
+    queries += [
+        ('artists', keyset_query(*artists_page_query(), None, 50)),
+        ('artists next page',
+         keyset_query(*artists_page_query(), encode_cursor([1]), 50)),
+        ('shows', keyset_query(*shows_page_query({}, now), None, 50)),
+        ('shows next page', keyset_query(*shows_page_query({}, now),
+                                         encode_cursor([now, 1]), 50)),
+    ]
+    for name, filters in (
+            ('from/to', {'from': now, 'to': now}),
+            ('venue_id', {'venue_id': 1}),
+            ('artist_id', {'artist_id': 1}),
+            ('city/state', {'city': 'San Francisco', 'state': 'CA'}),
+            ('genre', {'genre': 'Jazz'})):
+        queries.append((f'shows by {name}', keyset_query(
+            *shows_page_query(filters, now), None, 50)))
+    queries += [
+        ('search_venues', keyset_query(*search_query(Venue, 'hop'), None, 50)),
+        ('search_artists',
+         keyset_query(*search_query(Artist, 'band'), None, 50)),
+        ('delete_venue cascade',
+         db.session.query(Show.id).filter(Show.venue_id == 1)),
+        ('edit_venue artist pages', artist_ids_of_venue_query(1)),
+        ('edit_artist venue pages', venue_ids_of_artist_query(1)),
+        ('rollover', db.session.query(Venue.id).filter(
+            Venue.next_show_at <= now)),
+        ('venues by genre', venue_areas_query('Jazz')),
+        ('venue genre facets', with_genre_facets(
+            venue_areas_query(), Venue.genres, narrowed=False)),
+        ('venues by genre with facets', with_genre_facets(
+            venue_areas_query('Jazz'), Venue.genres)),
+        ('artist search genre facets', with_genre_facets(
+            search_query(Artist, 'band')[0], Artist.genres)),
+        ('nearby venues', nearby_venues_query(37.7749, -122.4194, 25)),
+        ('nearby venues across the antimeridian',
+         nearby_venues_query(51.88, 179.9, 100)),
+        ('show_venue matches', venue_matches_query(1, 6)),
+        ('show_artist matches', artist_matches_query(1, 6)),
+        ('show_venue validators', venue_validators_query(1, now)),
+        ('venues validators', entity_list_validators_query(Venue)),
+        ('shows validators', shows_validators_query(now)),
+        ('show conflicts', conflicts_query(
+            now, now + timedelta(hours=2), venue_id=1, artist_id=1)),
+    ]
+    return queries
+
+
+def main():
+    with create_app().app_context():
+        if db.engine.dialect.name != 'postgresql':
+            print('check_indexes.py needs a Postgres database')
+            return 1
+        failures = 0
+        try:
+            db.session.execute(text('SET LOCAL enable_seqscan = off'))
+            for name, query in hot_queries(datetime.now()):
+                plan = [row[0] for row in
+                        db.session.execute(Explain(query.statement))]
+                ok = not any('Seq Scan' in line for line in plan)
+                print(('ok      ' if ok else 'NO INDEX') + '  ' + name)
+                if not ok:
+                    failures += 1
+                    print('\n'.join('          ' + line for line in plan))
+        finally:
+            db.session.rollback()
+        return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
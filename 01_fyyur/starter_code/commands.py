@@ -0,0 +1,212 @@
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from cache import invalidate_pages
+from models import (
+    db,
+    genre_count_drift,
+    refresh_genre_counts,
+    refresh_show_counters,
+    roll_over_show_counters,
+    show_counter_drift
+)
+from partitions import PartitionError, archive_partitions, create_partitions
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+# app.py registers these commands in every web worker: the modules only
+# they need (matches.py loads numpy) are imported when they run, so the
+# choices below are spelled out, as importer.ENTITIES, export.EXPORTS and
+# export.FORMATS list them.
+
+ENTITIES = ('artists', 'shows', 'venues')
+FORMATS = ('csv', 'ndjson')
+
+
+@click.command('import')
+@click.argument('entity', type=click.Choice(ENTITIES))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=1000, show_default=True,
+              help='Records inserted per round trip and commit.')
+@with_appcontext
+def import_command(entity, path, batch_size):
+    """Bulk load venues, artists or shows from a CSV, JSON or NDJSON file."""
+    from importer import import_file
+
+    def on_batch(batch, report):
+        if entity == 'shows':
+            invalidate_pages('venues', *{f"venue:{v['venue_id']}" for _, v in batch},
+                        *{f"artist:{v['artist_id']}" for _, v in batch})
+        else:
+            invalidate_pages(entity)
+        click.echo(f'{report.inserted} records inserted')
+
+    try:
+        report = import_file(entity, path, batch_size, on_batch)
+    except ValueError as e:
+        # not a file of records at all; bad records are in the report
+        raise click.ClickException(f'{path}: {e}')
+    for number, message in sorted(report.errors):
+        click.echo(f'{path}:{number}: {message}', err=True)
+    click.echo(f'{report.inserted} {entity} imported, '
+               f'{len(report.errors)} records rejected')
+
+
+@click.command('export')
+@click.argument('entity', type=click.Choice(ENTITIES))
+@click.option('--format', 'format', type=click.Choice(FORMATS),
+              default='csv', show_default=True)
+@click.option('--output', '-o', type=click.File('w'), default='-',
+              help='File to write to, standard output by default.')
+@click.option('--batch-size', default=1000, show_default=True,
+              help='Rows fetched from the server side cursor at a time.')
+@with_appcontext
+def export_command(entity, format, output, batch_size):
+    """Stream a whole table out as CSV or NDJSON."""
+    from export import export
+
+    for chunk in export(entity, format, batch_size):
+        output.write(chunk)
+
+
+def _invalidate_counted(venue_ids, artist_ids):
+    if venue_ids:
+        invalidate_pages('venues', *[f'venue:{id}' for id in venue_ids])
+    if artist_ids:
+        invalidate_pages(*[f'artist:{id}' for id in artist_ids])
+
+
+@click.command('rollover')
+@with_appcontext
+def rollover_command():
+    """Move shows that have started from the upcoming to the past counters.
+
+    Run it every minute or so from cron; the show counters of a venue or
+    artist are stale from its next_show_at until the next run.
+    """
+    venue_ids, artist_ids = roll_over_show_counters()
+    db.session.commit()
+    _invalidate_counted(venue_ids, artist_ids)
+    click.echo(f'{len(venue_ids)} venues and {len(artist_ids)} artists '
+               'rolled over')
+
+
+@click.command('recount')
+@click.option('--dry-run', is_flag=True,
+              help='Only report the drift, do not repair it.')
+@with_appcontext
+def recount_command(dry_run):
+    """Check the show counters and the genre counts against the tables."""
+    venue_ids, artist_ids = show_counter_drift()
+    for entity, ids in (('venue', venue_ids), ('artist', artist_ids)):
+        for id in ids:
+            click.echo(f'{entity} {id}: show counters out of date', err=True)
+    genres = genre_count_drift()
+    for table, genre in genres:
+        click.echo(f'{table} {genre}: genre count out of date', err=True)
+    if not dry_run:
+        refresh_show_counters(venue_ids, artist_ids)
+        if genres:
+            refresh_genre_counts()
+        db.session.commit()
+        _invalidate_counted(venue_ids, artist_ids)
+        if genres:
+            invalidate_pages('venues', 'artists')
+    click.echo(f'{len(venue_ids)} venues, {len(artist_ids)} artists and '
+               f'{len(genres)} genre counts '
+               + ('drifted' if dry_run else 'repaired'))
+
+
+@click.command('seed')
+@click.option('--venues', default=0, show_default=True)
+@click.option('--artists', default=0, show_default=True)
+@click.option('--shows', default=0, show_default=True,
+              help='Shows between random venues and artists, a year either '
+                   'side of now; fewer when they have no free time left.')
+@click.option('--seed', 'random_seed', type=int,
+              help='Random seed, to generate the same data again.')
+@click.option('--batch-size', default=5000, show_default=True,
+              help='Records inserted per round trip and commit.')
+@with_appcontext
+def seed_command(venues, artists, shows, random_seed, batch_size):
+    """Fill the database with synthetic venues, artists and shows."""
+    from seed import seed
+
+    def on_batch(model, count):
+        click.echo(f'{count} {model.__tablename__.lower()}s inserted')
+
+    try:
+        shows = seed(venues, artists, shows, batch_size, random_seed,
+                     on_batch)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    # detail pages of venues and artists that existed before expire with
+    # CACHE_TTL, seeding is not meant for a live site
+    invalidate_pages('venues', 'artists')
+    click.echo(f'{venues} venues, {artists} artists and {shows} shows seeded')
+
+
+@click.command('partitions')
+@click.option('--ahead', default=3, show_default=True,
+              help='Months after the current one to create partitions for.')
+@click.option('--retain', type=click.IntRange(min=0),
+              help='Months before the current one to keep in Show; older '
+                   'partitions are detached. Nothing is detached without it.')
+@click.option('--drop', is_flag=True,
+              help='Drop detached partitions instead of moving them to the '
+                   '"archive" schema.')
+@with_appcontext
+def partitions_command(ahead, retain, drop):
+    """Maintain the monthly partitions of Show (Postgres).
+
+    Run it daily from cron: it creates the partitions of the coming months
+    and, with --retain, archives the shows of past months.
+    """
+    try:
+        created = create_partitions(ahead)
+        archived, venue_ids, artist_ids = (
+            archive_partitions(retain, drop) if retain is not None
+            else ([], [], []))
+    except PartitionError as e:
+        raise click.ClickException(str(e))
+    db.session.commit()
+    _invalidate_counted(venue_ids, artist_ids)
+    for name in created:
+        click.echo(f'created {name}')
+    for name in archived:
+        click.echo(('dropped ' if drop else 'archived ') + name)
+    click.echo(f'{len(created)} partitions created, {len(archived)} '
+               + ('dropped' if drop else 'archived'))
+
+
+@click.command('matches')
+@click.option('--all', 'rebuild', is_flag=True,
+              help='Compute every list again instead of the queued ones.')
+@with_appcontext
+def matches_command(rebuild):
+    """Refresh the artist and venue matches of the detail pages.
+
+    Run it every few minutes from cron: edits queue the venues and artists
+    they touch and their matches are stale until the next run. Bulk loads
+    (`flask import`, `flask seed`) queue a full rebuild.
+    """
+    from matches import VENUES, ARTISTS, rebuild_matches, refresh_matches
+
+    k = current_app.config['MATCHES_TOP_K']
+    if rebuild:
+        rebuild_matches(k)
+        written = None
+    else:
+        written = refresh_matches(k)
+    db.session.commit()
+    if written is None:
+        # as after `flask seed`, cached pages expire with CACHE_TTL
+        click.echo('all matches rebuilt')
+        return
+    invalidate_pages(*[f'venue:{id}' for id in written[VENUES]],
+                     *[f'artist:{id}' for id in written[ARTISTS]])
+    click.echo(f'{len(written[VENUES])} venues and {len(written[ARTISTS])} '
+               'artists matched')
@@ -0,0 +1,67 @@
+import hashlib
+from datetime import timezone
+from functools import wraps
+
+from flask import make_response, request, session
+from werkzeug.http import is_resource_modified
+
+#----------------------------------------------------------------------------#
+# Conditional requests.
+#----------------------------------------------------------------------------#
+
+# Pages get a strong ETag and a Last-Modified header computed from a few
+# indexed aggregates (see the validators in queries.py). A client sending
+# back a matching If-None-Match/If-Modified-Since gets a 304 before the view
+# runs, so neither the page rows are loaded nor the template is rendered.
+
+
+def _http_date(value):
+    # The timestamps are naive and in the local time of the app server:
+    # updated_at is written by datetime.now() and show times are entered in
+    # local time. They are made aware in that zone, with the UTC offset in
+    # force on their date, before the conversion to UTC.
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.astimezone()
+    return value.astimezone(timezone.utc)
+
+
+def revalidate(values, last_modified):
+    # Returns (etag, last_modified, whether the client's copy is stale) for
+    # the current request and the values of its validators.
+    etag = hashlib.sha1(
+        repr((request.full_path, values)).encode()).hexdigest()
+    last_modified = _http_date(last_modified)
+    return etag, last_modified, is_resource_modified(
+        request.environ, etag=etag, last_modified=last_modified)
+
+
+def set_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # browsers have to revalidate instead of guessing a lifetime
+    response.cache_control.no_cache = True
+    return response
+
+
+def conditional(validators):
+    # `validators` is called with the view arguments and returns
+    # (values, last_modified) or None when the page does not exist.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # pages carrying flashed messages must not be revalidated
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(*args, **kwargs)
+            result = validators(**kwargs)
+            if result is None:
+                return view(*args, **kwargs)
+            etag, last_modified, modified = revalidate(*result)
+            if not modified:
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+            return set_validators(response, etag, last_modified)
+        return wrapper
+    return decorator
@@ -0,0 +1,79 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Bulk export.
+#----------------------------------------------------------------------------#
+
+# Dumps a whole table as CSV or NDJSON. Rows are read through a server side
+# cursor (stream_results) in chunks of `batch_size` and written out chunk by
+# chunk, so memory use does not depend on the size of the table. The CSV
+# files can be loaded back with `flask import` (genres are comma separated).
+
+EXPORTS = {
+    'venues': (Venue, ('id', 'name', 'city', 'state', 'address', 'phone',
+                       'genres', 'image_link', 'facebook_link', 'website',
+                       'seeking_talent', 'seeking_description',
+                       'updated_at')),
+    'artists': (Artist, ('id', 'name', 'city', 'state', 'phone', 'genres',
+                         'image_link', 'facebook_link', 'website',
+                         'seeking_venue', 'seeking_description',
+                         'updated_at')),
+    'shows': (Show, ('id', 'artist_id', 'venue_id', 'start_time',
+                     'end_time', 'updated_at')),
+}
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def _rows(entity, batch_size):
+    model, fields = EXPORTS[entity]
+    result = db.session.execute(
+        db.select(*[getattr(model, field) for field in fields])
+        .order_by(model.id)
+        .execution_options(stream_results=True, yield_per=batch_size))
+    for partition in result.partitions():
+        yield fields, partition
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return ','.join(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def export_csv(entity, batch_size=1000):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORTS[entity][1])
+    for fields, rows in _rows(entity, batch_size):
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_ndjson(entity, batch_size=1000):
+    for fields, rows in _rows(entity, batch_size):
+        yield ''.join(
+            json.dumps({field: _json_value(value)
+                        for field, value in zip(fields, row)}) + '\n'
+            for row in rows)
+
+
+def export(entity, format='csv', batch_size=1000):
+    # generator of text chunks
+    if format == 'ndjson':
+        return export_ndjson(entity, batch_size)
+    return export_csv(entity, batch_size)
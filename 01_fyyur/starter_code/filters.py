@@ -0,0 +1,33 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import babel.dates
+
+#----------------------------------------------------------------------------#
+# Filters.
+#----------------------------------------------------------------------------#
+
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=64)
+def _compiled_pattern(format, locale):
+    # parsing the pattern and the locale is the expensive part of
+    # babel.dates.format_datetime, do it once per (format, locale)
+    return (babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)),
+            babel.Locale.parse(locale))
+
+
+def format_datetime(value, format='medium', locale=babel.dates.LC_TIME):
+    # accepts datetime objects, strings are still parsed for old callers
+    if not isinstance(value, datetime):
+        import dateutil.parser  # only old callers pay for importing it
+        value = dateutil.parser.parse(value)
+    if value.tzinfo is None:
+        # same as babel.dates.format_datetime for naive datetimes
+        value = value.replace(tzinfo=timezone.utc)
+    pattern, locale = _compiled_pattern(format, locale)
+    return pattern.apply(value, locale)
@@ -4,8 +4,10 @@ from wtforms import (StringField,
                      SelectField,
                      SelectMultipleField, 
                      DateTimeField,
+                     IntegerField,
                      BooleanField)
-from wtforms.validators import DataRequired, AnyOf, URL ,Length
+from wtforms.validators import (DataRequired, AnyOf, URL ,Length,
+                                NumberRange, Optional, ValidationError)
 from enum import Enum, auto
 from wtforms.widgets import TextArea
 
@@ -16,7 +18,7 @@ def anyof_multiple_field(values_list):
   def _validate(form, field):
     error = False
     for value in field.data:
-      if value not in values:
+      if value not in values_list:
         error = True
 
     if error:
@@ -55,8 +57,21 @@ class ShowForm(FlaskForm):
     start_time = DateTimeField(
         'start_time',
         validators=[DataRequired()],
+        format=['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M'],
         default= datetime.today()
     )
+    # minutes the show books the venue and the artist for
+    duration = IntegerField(
+        'duration',
+        validators=[Optional(), NumberRange(min=1, max=24 * 60)],
+        default=120
+    )
+
+class ShowBatchForm(FlaskForm):
+    # one "artist_id, start_time[, minutes]" per line, all at the same venue
+    shows = StringField(
+        'shows', validators=[DataRequired()], widget=TextArea()
+    )
 
 class VenueForm(FlaskForm):
     
@@ -119,7 +134,8 @@ class VenueForm(FlaskForm):
            'city',validators=[DataRequired(),Length(min=5, max=120)])
     
     state = SelectField(
-        'state', validators=[DataRequired(), AnyOf(state_choices)],
+        'state', validators=[DataRequired(),
+                             AnyOf([state for state, _ in state_choices])],
          choices=[(state) for state in state_choices],
     )
     address = StringField(
@@ -214,7 +230,8 @@ class ArtistForm(FlaskForm):
     )
    
     state = SelectField(
-        'state', validators=[DataRequired(), AnyOf(state_choices)],
+        'state', validators=[DataRequired(),
+                             AnyOf([state for state, _ in state_choices])],
          choices=[(state) for state in state_choices],
     )
     phone = StringField(
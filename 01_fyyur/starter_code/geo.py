@@ -0,0 +1,139 @@
+import csv
+import math
+import os
+from functools import lru_cache
+
+#----------------------------------------------------------------------------#
+# Geocoding.
+#----------------------------------------------------------------------------#
+
+# Venues are placed at the centroid of their city, looked up offline in
+# data/us_centroids.csv: US cities and, for the towns it does not list, the
+# states (rows without a city). City names match whatever their case and
+# spacing, "St." and "Saint" alike.
+#
+# /venues/nearby finds the venues within a radius in two steps: the
+# bounding box of the circle, as a few ranges of Venue.cell (below) scanned
+# in ix_Venue_cell, then the great circle (haversine) distance of every
+# venue in the box, which drops the corners of the box and orders the
+# venues by distance.
+#
+# Venue.cell is the Z-order (Morton) code of the venue's coordinates: the
+# bits of its row and column in a 2**CELL_BITS by 2**CELL_BITS grid of the
+# world, interleaved. The cells of every coarser grid are then ranges of
+# codes, so a box is covered by a few ranges of the index, narrowed on
+# latitude and longitude at once.
+
+CENTROIDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'data', 'us_centroids.csv')
+EARTH_RADIUS_KM = 6371.0088
+# bits of the row and of the column of a cell, about 30 cm on a side at the
+# equator; and the most cells covering a box
+CELL_BITS = 26
+MAX_BOX_CELLS = 16
+
+
+def _normalize(city):
+    words = city.lower().replace('.', ' ').split()
+    if words and words[0] == 'st':
+        words[0] = 'saint'
+    return ' '.join(words)
+
+
+@lru_cache(maxsize=None)
+def centroids():
+    # {(city, state): (latitude, longitude)}, city '' for the state
+    table = {}
+    with open(CENTROIDS_PATH, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            table[_normalize(row['city']), row['state']] = (
+                float(row['latitude']), float(row['longitude']))
+    return table
+
+
+def locate(city, state):
+    # (latitude, longitude) of the city, else of the state, else (None, None)
+    table = centroids()
+    state = (state or '').strip().upper()
+    return (table.get((_normalize(city or ''), state))
+            or table.get(('', state)) or (None, None))
+
+
+def haversine_km(latitude1, longitude1, latitude2, longitude2):
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    half_dphi = (phi2 - phi1) / 2
+    half_dlambda = math.radians(longitude2 - longitude1) / 2
+    a = (math.sin(half_dphi) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(half_dlambda) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    # (south, north, [(west, east)]) holding the circle; two longitude
+    # ranges when it crosses the antimeridian, all of them around a pole
+    angle = radius_km / EARTH_RADIUS_KM
+    south = max(latitude - math.degrees(angle), -90.0)
+    north = min(latitude + math.degrees(angle), 90.0)
+    ratio = math.sin(angle) / max(math.cos(math.radians(latitude)), 1e-12)
+    if north >= 90.0 or south <= -90.0 or ratio >= 1.0:
+        return south, north, [(-180.0, 180.0)]
+    spread = math.degrees(math.asin(ratio))
+    west, east = longitude - spread, longitude + spread
+    if west < -180.0:
+        return south, north, [(west + 360.0, 180.0), (-180.0, east)]
+    if east > 180.0:
+        return south, north, [(west, 180.0), (-180.0, east - 360.0)]
+    return south, north, [(west, east)]
+
+
+def _grid(latitude, longitude, bits):
+    # (row, column) of the point in the 2**bits by 2**bits grid
+    size = 1 << bits
+    row = int((latitude + 90.0) / 180.0 * size)
+    column = int((longitude + 180.0) / 360.0 * size)
+    return min(max(row, 0), size - 1), min(max(column, 0), size - 1)
+
+
+def _interleave(row, column, bits):
+    code = 0
+    for bit in range(bits - 1, -1, -1):
+        code = (code << 2) | ((column >> bit) & 1) << 1 | ((row >> bit) & 1)
+    return code
+
+
+def cell_id(latitude, longitude):
+    # the code of the cell of the point, None without coordinates
+    if latitude is None or longitude is None:
+        return None
+    return _interleave(*_grid(latitude, longitude, CELL_BITS), CELL_BITS)
+
+
+def cell_ranges(south, north, longitudes, max_cells=MAX_BOX_CELLS):
+    # [(first, last)] codes covering a box as bounding_box() returns it: the
+    # cells of the finest grid that needs at most max_cells of them,
+    # adjacent ones merged
+    def spans(bits):
+        bottom, top = _grid(south, 0.0, bits)[0], _grid(north, 0.0, bits)[0]
+        return [(bottom, top, _grid(0.0, west, bits)[1],
+                 _grid(0.0, east, bits)[1]) for west, east in longitudes]
+
+    def count(bits):
+        return sum((top - bottom + 1) * (right - left + 1)
+                   for bottom, top, left, right in spans(bits))
+
+    bits = 0
+    while bits < CELL_BITS and count(bits + 1) <= max_cells:
+        bits += 1
+    shift = 2 * (CELL_BITS - bits)
+    codes = sorted({_interleave(row, column, bits)
+                    for bottom, top, left, right in spans(bits)
+                    for row in range(bottom, top + 1)
+                    for column in range(left, right + 1)})
+    ranges = []
+    for code in codes:
+        first, last = code << shift, ((code + 1) << shift) - 1
+        if ranges and ranges[-1][1] + 1 == first:
+            ranges[-1] = (ranges[-1][0], last)
+        else:
+            ranges.append((first, last))
+    return ranges
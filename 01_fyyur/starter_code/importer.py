@@ -0,0 +1,397 @@
+import csv
+import json
+import os
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError
+from werkzeug.datastructures import MultiDict
+
+from bookings import conflict_error, show_end
+from forms import VenueForm, ArtistForm, ShowForm
+from geo import cell_id, locate
+from models import (
+    db,
+    Venue,
+    Artist,
+    Show,
+    build_search_text,
+    queue_match_rebuild,
+    count_genres,
+    count_shows,
+    update_genre_counts,
+    update_show_counters
+)
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+# Streams venues, artists or shows from CSV, JSON (an array of objects) or
+# NDJSON files. Every record is validated with the same form as the web
+# pages, then valid records are inserted in batches with one executemany
+# per batch and one commit per batch. Invalid records are reported with
+# their line (CSV) or record number (JSON) and skipped; they never abort
+# the batch. In CSV files genres are a comma separated list. Shows last
+# `duration` minutes, or until `end_time` as `flask export` writes them.
+
+BOOLEAN_TRUE = ('1', 'true', 't', 'yes', 'y', 'on')
+
+
+def read_csv(f):
+    reader = csv.DictReader(f)
+    for record in reader:
+        yield reader.line_num, record
+
+
+class BadRecord:
+    # what a reader yields for a record that is not valid JSON
+    def __init__(self, message):
+        self.message = message
+
+
+def read_ndjson(f):
+    # a broken line is reported like any other invalid record
+    for number, line in enumerate(f, 1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError as e:
+                yield number, BadRecord(f'invalid JSON: {e}')
+
+
+# the characters that delimit the records of a JSON array, and the rest of
+# a string after its opening quote (the closing one is missing when the
+# buffer ends inside the string)
+JSON_DELIMITER = re.compile(r'["\[\]{},]')
+JSON_STRING_REST = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*(")?')
+JSON_SPACE = re.compile(r'[ \t\n\r]*')
+CLOSING = {'}': '{', ']': '['}
+
+
+class _JSONArray:
+    # the buffered text of a JSON array file; `offset` is the number of
+    # characters of the file before the buffer
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.offset = 0
+        self.eof = False
+
+    def more(self, keep_from):
+        # reads a chunk, dropping the buffer before `keep_from`; returns how
+        # far the buffer moved, None at the end of the file
+        if self.eof:
+            return None
+        chunk = self.f.read(self.chunk_size)
+        self.eof = not chunk
+        self.buffer = self.buffer[keep_from:] + chunk
+        self.offset += keep_from
+        return keep_from
+
+    def skip_space(self, pos):
+        # the position of the next character that is not blank, reading
+        # more as needed; len(buffer) at the end of the file
+        while True:
+            pos = JSON_SPACE.match(self.buffer, pos).end()
+            if pos < len(self.buffer) or self.more(pos) is None:
+                return pos
+            pos = 0
+
+    def record_end(self, start):
+        # Scans the strings and brackets of the record at `start`, every
+        # character once, up to the comma or bracket closing the array that
+        # ends it. Returns (start, end) (the buffer may have moved), end is
+        # None at the end of the file; unbalanced brackets of a malformed
+        # record are dropped so it still ends at the next comma.
+        pos, opened, in_string = start, [], False
+        while True:
+            delimiter = None
+            if in_string:
+                rest = JSON_STRING_REST.match(self.buffer, pos)
+                pos, in_string = rest.end(), rest[1] is None
+            if not in_string:
+                delimiter = JSON_DELIMITER.search(self.buffer, pos)
+            if delimiter is None:
+                moved = self.more(start)
+                if moved is None:
+                    return start, None
+                start, pos = 0, pos - moved
+                continue
+            pos = delimiter.end()
+            char = delimiter[0]
+            if char == '"':
+                in_string = True
+            elif char in '[{':
+                opened.append(char)
+            elif opened:
+                if char in ']}' and opened.pop() != CLOSING[char]:
+                    opened = []
+            elif char in ',]':
+                return start, delimiter.start()
+
+
+def read_json(f, chunk_size=65536):
+    # Yields the objects of a top-level JSON array without loading it whole.
+    # Records are decoded where they start in the buffer. One that does not
+    # decode there (cut off by the end of the buffer, or malformed) is
+    # delimited by a scan up to the comma that ends it and decoded on its
+    # own: a malformed record is yielded as a BadRecord with its position
+    # and reading goes on with the next one. Raises ValueError when the
+    # file is not a JSON array.
+    decoder = json.JSONDecoder()
+    array = _JSONArray(f, chunk_size)
+    pos = array.skip_space(0)
+    if array.buffer[pos:pos + 1] != '[':
+        raise ValueError('expected a JSON array')
+    pos = array.skip_space(pos + 1)
+    if array.buffer[pos:pos + 1] == ']':
+        return
+    number = 0
+    while True:
+        number += 1
+        try:
+            record, end = decoder.raw_decode(array.buffer, pos)
+        except ValueError:
+            end = None
+        if end is not None:
+            # complete when a comma or the closing bracket follows it in
+            # the buffer
+            end = JSON_SPACE.match(array.buffer, end).end()
+            if array.buffer[end:end + 1] not in (',', ']'):
+                end = None
+        if end is None:
+            pos, end = array.record_end(pos)
+            text = array.buffer[pos:end]
+            try:
+                if end is None:
+                    raise ValueError('unterminated JSON array')
+                record = json.loads(text)
+            except ValueError as e:
+                yield number, BadRecord(
+                    f'invalid JSON at character '
+                    f'{array.offset + pos + getattr(e, "pos", 0)}: '
+                    f'{getattr(e, "msg", e)}')
+                if end is None:
+                    return
+            else:
+                yield number, record
+        else:
+            yield number, record
+        if array.buffer[end] == ']':
+            return
+        pos = array.skip_space(end + 1)
+
+
+READERS = {'.csv': read_csv, '.json': read_json,
+           '.ndjson': read_ndjson, '.jsonl': read_ndjson}
+
+
+def _form_data(record, list_fields, boolean_fields):
+    data = MultiDict()
+    for key, value in record.items():
+        if value is None:
+            continue
+        if key in list_fields:
+            if isinstance(value, str):
+                value = [item.strip() for item in value.split(',')
+                         if item.strip()]
+            data.setlist(key, value)
+        elif key in boolean_fields:
+            if str(value).strip().lower() in BOOLEAN_TRUE:
+                data[key] = 'y'
+        elif key == 'start_time' and isinstance(value, str):
+            # accept ISO 8601 as well as the form's own format
+            try:
+                value = datetime.fromisoformat(value.strip()).strftime(
+                    '%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                pass
+            data[key] = value
+        else:
+            data[key] = str(value)
+    return data
+
+
+def _validate(form_class, record, list_fields=(), boolean_fields=()):
+    # returns (values, None) or (None, error message)
+    form = form_class(_form_data(record, list_fields, boolean_fields),
+                      meta={'csrf': False})
+    if not form.validate():
+        return None, '; '.join(f"{name}: {' '.join(errors)}"
+                               for name, errors in form.errors.items())
+    return form.data, None
+
+
+def venue_values(record):
+    data, error = _validate(VenueForm, record, ('genres',), ('seeking_talent',))
+    if error:
+        return None, error
+    columns = ('name', 'city', 'state', 'address', 'phone', 'genres',
+               'image_link', 'facebook_link', 'website', 'seeking_talent',
+               'seeking_description')
+    values = {column: data[column] for column in columns}
+    values['search_text'] = build_search_text(
+        values['name'], values['city'], values['state'], values['genres'])
+    values['latitude'], values['longitude'] = locate(values['city'],
+                                                     values['state'])
+    values['cell'] = cell_id(values['latitude'], values['longitude'])
+    return values, None
+
+
+def artist_values(record):
+    data, error = _validate(ArtistForm, record, ('genres',), ('seeking_venue',))
+    if error:
+        return None, error
+    columns = ('name', 'city', 'state', 'phone', 'genres', 'image_link',
+               'facebook_link', 'website', 'seeking_venue',
+               'seeking_description')
+    values = {column: data[column] for column in columns}
+    values['search_text'] = build_search_text(
+        values['name'], values['city'], values['state'], values['genres'])
+    return values, None
+
+
+def _end_time_minutes(record):
+    # `flask export` writes the end_time of shows, the form takes minutes;
+    # a start_time that does not parse is left to the form to report
+    try:
+        start_time = datetime.fromisoformat(str(record['start_time']).strip())
+    except ValueError:
+        return record, None
+    try:
+        end_time = datetime.fromisoformat(str(record['end_time']).strip())
+    except ValueError:
+        return None, 'end_time: Not a valid datetime value.'
+    minutes, rest = divmod(end_time - start_time, timedelta(minutes=1))
+    if rest:
+        return None, 'end_time: Not a whole number of minutes after start_time.'
+    return dict(record, duration=minutes), None
+
+
+def show_values(record):
+    if record.get('end_time') not in (None, '') and \
+            record.get('start_time') not in (None, ''):
+        record, error = _end_time_minutes(record)
+        if error:
+            return None, error
+    data, error = _validate(ShowForm, record)
+    if error:
+        return None, error
+    try:
+        return {'artist_id': int(data['artist_id']),
+                'venue_id': int(data['venue_id']),
+                'start_time': data['start_time'],
+                'end_time': show_end(data['start_time'],
+                                     data['duration'])}, None
+    except ValueError:
+        return None, 'artist_id and venue_id must be numbers'
+
+
+ENTITIES = {
+    'venues': (Venue, venue_values),
+    'artists': (Artist, artist_values),
+    'shows': (Show, show_values),
+}
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.errors = []
+
+    def error(self, number, message):
+        self.errors.append((number, message))
+
+
+def _existing_ids(model, ids):
+    return {row[0] for row in db.session.query(model.id).filter(
+        model.id.in_(ids))}
+
+
+def _check_show_references(batch, report):
+    # one query per side for the whole batch instead of one per row
+    artist_ids = _existing_ids(Artist, {v['artist_id'] for _, v in batch})
+    venue_ids = _existing_ids(Venue, {v['venue_id'] for _, v in batch})
+    valid = []
+    for number, values in batch:
+        if values['artist_id'] not in artist_ids:
+            report.error(number, 'Artist ID not valid')
+        elif values['venue_id'] not in venue_ids:
+            report.error(number, 'Venue ID not valid')
+        else:
+            valid.append((number, values))
+    return valid
+
+
+def _insert_batch(model, batch, report):
+    if model is Show:
+        batch = _check_show_references(batch, report)
+    if not batch:
+        return batch
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(model), [values for _, values in batch])
+    except DBAPIError:
+        # find the offending rows, the rest of the batch still goes in
+        inserted = []
+        for number, values in batch:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(model), [values])
+                inserted.append((number, values))
+            except DBAPIError as e:
+                report.error(number, conflict_error(e) or str(e.orig).strip())
+        batch = inserted
+    if model is Show:
+        # executemany bypasses the ORM events that keep the counters
+        now = datetime.now()
+        update_show_counters(count_shows(
+            {}, [(v['venue_id'], v['artist_id'], v['start_time'])
+                 for _, v in batch], now), now)
+    else:
+        # and the ones that queue the matches and count the genres
+        queue_match_rebuild()
+        counts = {}
+        for _, values in batch:
+            count_genres(counts, model, values['genres'])
+        update_genre_counts(counts)
+    db.session.commit()
+    report.inserted += len(batch)
+    return batch
+
+
+def import_file(entity, path, batch_size=1000, on_batch=None):
+    # on_batch(batch, report) is called with the (number, values) pairs of
+    # every batch that was committed
+    model, to_values = ENTITIES[entity]
+    read = READERS.get(os.path.splitext(path)[1].lower())
+    if read is None:
+        raise ValueError('unsupported file type: ' + path)
+    report = ImportReport()
+    batch = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for number, record in read(f):
+            if isinstance(record, BadRecord):
+                report.error(number, record.message)
+                continue
+            if not isinstance(record, dict):
+                report.error(number, 'not a JSON object')
+                continue
+            values, error = to_values(record)
+            if error:
+                report.error(number, error)
+                continue
+            batch.append((number, values))
+            if len(batch) >= batch_size:
+                inserted = _insert_batch(model, batch, report)
+                if on_batch:
+                    on_batch(inserted, report)
+                batch = []
+        if batch:
+            inserted = _insert_batch(model, batch, report)
+            if on_batch:
+                on_batch(inserted, report)
+    return report
@@ -0,0 +1,281 @@
+from collections import namedtuple
+
+import numpy as np
+from sqlalchemy import delete, func, insert, select
+
+from forms import Genre
+from geo import EARTH_RADIUS_KM, locate
+from models import db, Venue, Artist, VenueMatch, ArtistMatch, MatchQueue
+
+#----------------------------------------------------------------------------#
+# Matchmaking.
+#----------------------------------------------------------------------------#
+
+# Scores every seeking venue (seeking_talent) against every seeking artist
+# (seeking_venue). A venue or artist is a row of two matrices: its genres
+# as a one-hot vector of unit length and its location as a unit vector of
+# 3D space (zero when unknown; artists are placed at the centroid of their
+# city, see geo.py). For two sets the scores are then matrix products:
+#
+#   score = GENRE_WEIGHT * cos(genres)
+#           + LOCATION_WEIGHT * exp(SHARPNESS * (cos(angle) - 1))
+#
+# the cosine similarity of the genres and a Gaussian of the distance of
+# width LOCATION_SCALE_KM (1 - cos(angle) is (distance / R)^2 / 2 at the
+# scale of a country). Both sides are scored in chunks of CHUNK_SIZE rows
+# against the whole other side, so 100k x 100k candidates run as BLAS
+# products and numpy reductions within bounded memory, never as a Python
+# loop over pairs; the best `k` of every row are picked by top_k().
+#
+# refresh_matches() works from MatchQueue (see models.py). The lists of the
+# queued entities are computed again, as are the lists that held one of
+# them. Any other list only changes if a queued entity now beats its k-th
+# match: the queued entities are scored against every other list owner and
+# inserted where they do, then the lists are cut back to `k`.
+
+GENRES = [genre.value for genre in Genre]
+GENRE_INDEX = {genre: i for i, genre in enumerate(GENRES)}
+GENRE_WEIGHT = 0.7
+LOCATION_WEIGHT = 0.3
+LOCATION_SCALE_KM = 250.0
+SHARPNESS = (EARTH_RADIUS_KM / LOCATION_SCALE_KM) ** 2
+# lower scores are no match at all
+MIN_SCORE = 0.01
+CHUNK_SIZE = 256
+# columns sampled by top_k()
+TOP_K_SAMPLE = 2048
+# ids per IN (...) list
+ID_BATCH = 1000
+
+# owner: the column of the entity a match row belongs to, other: its match
+Side = namedtuple('Side', 'name match owner other')
+VENUES = Side('venues', VenueMatch, VenueMatch.venue_id, VenueMatch.artist_id)
+ARTISTS = Side('artists', ArtistMatch, ArtistMatch.artist_id,
+               ArtistMatch.venue_id)
+OTHER = {VENUES: ARTISTS, ARTISTS: VENUES}
+
+Features = namedtuple('Features', 'ids genres points')
+
+
+def _locations(side):
+    # (id, genres, latitude, longitude) of the seeking entities
+    if side is VENUES:
+        return db.session.execute(
+            select(Venue.id, Venue.genres, Venue.latitude, Venue.longitude)
+            .where(Venue.seeking_talent).order_by(Venue.id)).all()
+    return [(id, genres, *locate(city, state))
+            for id, genres, city, state in db.session.execute(
+                select(Artist.id, Artist.genres, Artist.city, Artist.state)
+                .where(Artist.seeking_venue).order_by(Artist.id))]
+
+
+def features(rows):
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    genres = np.zeros((len(rows), len(GENRES)), dtype=np.float32)
+    cells = [(i, GENRE_INDEX[genre]) for i, row in enumerate(rows)
+             for genre in row[1] or () if genre in GENRE_INDEX]
+    if cells:
+        genres[tuple(np.array(cells).T)] = 1.0
+    norms = np.linalg.norm(genres, axis=1, keepdims=True)
+    np.divide(genres, norms, out=genres, where=norms > 0)
+
+    coordinates = np.array([(np.nan if row[2] is None else row[2],
+                             np.nan if row[3] is None else row[3])
+                            for row in rows], dtype=np.float64
+                           ).reshape(len(rows), 2)
+    phi, lam = np.radians(coordinates[:, 0]), np.radians(coordinates[:, 1])
+    points = np.stack([np.cos(phi) * np.cos(lam), np.cos(phi) * np.sin(lam),
+                       np.sin(phi)], axis=1)
+    return Features(ids, genres, np.nan_to_num(points).astype(np.float32))
+
+
+def load_features(side):
+    return features(_locations(side))
+
+
+def subset(features, ids, exclude=False):
+    # the rows of the ids, or of all other ids
+    mask = np.isin(features.ids, np.fromiter(ids, dtype=np.int64),
+                   invert=exclude)
+    return Features(features.ids[mask], features.genres[mask],
+                    features.points[mask])
+
+
+def _chunks(features, size):
+    # (offset, rows) of at most `size` rows
+    for start in range(0, len(features.ids), size):
+        yield start, Features(*[array[start:start + size]
+                                for array in features])
+
+
+def scores(owners, others):
+    # len(owners) x len(others) float32; unknown locations score 0 there.
+    # The weights are folded into the (small) owners side and the exponent:
+    # LOCATION_WEIGHT * exp(x) is exp(x + log(LOCATION_WEIGHT)).
+    result = (owners.points * SHARPNESS) @ others.points.T
+    result += np.float32(np.log(LOCATION_WEIGHT) - SHARPNESS)
+    np.exp(result, out=result)
+    result += (owners.genres * GENRE_WEIGHT) @ others.genres.T
+    return result
+
+
+def top_k(matrix, k):
+    # (columns, values) of the k largest values of every row, largest first,
+    # ties to the lowest column. The k-th largest of a sample of the columns
+    # is a floor under the k-th largest of the row, so only the values above
+    # it are sorted: a mask and a sort of a few candidates per row instead
+    # of a selection over every value.
+    rows, width = matrix.shape
+    k = min(k, width)
+    if width > 2 * TOP_K_SAMPLE:
+        sample = matrix[:, ::width // TOP_K_SAMPLE]
+        floor = np.partition(sample, -k, axis=1)[:, -k]
+        row_index, columns = np.nonzero(matrix >= floor[:, None])
+    else:
+        row_index, columns = np.indices((rows, width)).reshape(2, -1)
+    values = matrix[row_index, columns]
+    order = np.lexsort((columns, -values, row_index))
+    # every row has at least k candidates, its first k are taken
+    take = (np.searchsorted(row_index[order], np.arange(rows))[:, None]
+            + np.arange(k)).ravel()
+    return (columns[order][take].reshape(rows, k),
+            values[order][take].reshape(rows, k))
+
+
+def _match_rows(side, owner_ids, other_ids, values):
+    # match table rows out of parallel arrays, the scores under MIN_SCORE
+    # left out
+    keep = values > MIN_SCORE
+    return [{side.owner.key: int(owner), side.other.key: int(other),
+             'score': float(score)}
+            for owner, other, score in zip(owner_ids[keep], other_ids[keep],
+                                           values[keep])]
+
+
+def _insert(side, rows):
+    if rows:
+        db.session.execute(insert(side.match), rows)
+
+
+def compute_lists(side, owners, others, k, chunk_size=CHUNK_SIZE):
+    # stores the best `k` of `others` for every one of `owners`
+    for _, chunk in _chunks(owners, chunk_size):
+        columns, values = top_k(scores(chunk, others), k)
+        owner_ids = np.repeat(chunk.ids, columns.shape[1])
+        _insert(side, _match_rows(side, owner_ids,
+                                  others.ids[columns].ravel(),
+                                  values.ravel()))
+
+
+def _batches(ids):
+    ids = sorted(ids)
+    for start in range(0, len(ids), ID_BATCH):
+        yield ids[start:start + ID_BATCH]
+
+
+def _delete(side, column, ids):
+    # deletes the rows whose `column` is in ids; returns their owners
+    owners = set()
+    for batch in _batches(ids):
+        owners.update(db.session.scalars(
+            delete(side.match).where(column.in_(batch))
+            .returning(side.owner)
+            .execution_options(synchronize_session=False)))
+    return owners
+
+
+def _admit(side, owners, newcomers, k, chunk_size):
+    # Inserts the newcomers into the lists of `owners` in which they beat
+    # the k-th match, then cuts those lists back to `k`; returns the owners
+    # of those lists.
+    counts = np.zeros(len(owners.ids), dtype=np.int64)
+    lowest = np.full(len(owners.ids), -np.inf, dtype=np.float32)
+    lists = np.array(db.session.execute(
+        select(side.owner, func.count(), func.min(side.match.score))
+        .group_by(side.owner)).all(), dtype=np.float64).reshape(-1, 3)
+    # owners.ids are sorted
+    at = np.searchsorted(owners.ids, lists[:, 0])
+    known = at < len(owners.ids)
+    known[known] = owners.ids[at[known]] == lists[known, 0]
+    counts[at[known]] = lists[known, 1]
+    lowest[at[known]] = lists[known, 2]
+
+    admitted = []
+    for start, chunk in _chunks(owners, chunk_size):
+        matrix = scores(chunk, newcomers)
+        end = start + len(chunk.ids)
+        rows, columns = np.nonzero(
+            (matrix > MIN_SCORE)
+            & ((counts[start:end] < k)[:, None]
+               | (matrix > lowest[start:end, None])))
+        admitted += _match_rows(side, chunk.ids[rows],
+                                newcomers.ids[columns],
+                                matrix[rows, columns])
+    _insert(side, admitted)
+    grown = {row[side.owner.key] for row in admitted}
+    for batch in _batches(grown):
+        surplus = []
+        rank, previous = 0, None
+        for owner, other in db.session.execute(
+                select(side.owner, side.other).where(side.owner.in_(batch))
+                .order_by(side.owner, side.match.score.desc(), side.other)):
+            rank = rank + 1 if owner == previous else 1
+            previous = owner
+            if rank > k:
+                surplus.append({'owner': owner, 'other': other})
+        if surplus:
+            # an executemany, which the ORM does not take for deletes
+            db.session.connection().execute(
+                delete(side.match).where(
+                    side.owner == db.bindparam('owner'),
+                    side.other == db.bindparam('other')), surplus)
+    return grown
+
+
+def rebuild_matches(k, chunk_size=CHUNK_SIZE):
+    # every list from scratch; the queue is emptied before the entities are
+    # read, what is queued meanwhile waits for the next refresh
+    db.session.execute(delete(MatchQueue)
+                       .execution_options(synchronize_session=False))
+    loaded = {side: load_features(side) for side in (VENUES, ARTISTS)}
+    for side in (VENUES, ARTISTS):
+        db.session.execute(delete(side.match)
+                           .execution_options(synchronize_session=False))
+        compute_lists(side, loaded[side], loaded[OTHER[side]], k, chunk_size)
+
+
+def refresh_matches(k, chunk_size=CHUNK_SIZE):
+    # Refreshes the matches of the queued venues and artists. Returns the
+    # ids of the {side: owners} whose lists were written, None after a full
+    # rebuild.
+    queued = db.session.execute(select(
+        MatchQueue.id, MatchQueue.venue_id, MatchQueue.artist_id)).all()
+    if not queued:
+        return {VENUES: set(), ARTISTS: set()}
+    db.session.execute(delete(MatchQueue).where(
+        MatchQueue.id <= max(row.id for row in queued)))
+    if any(row.venue_id is None and row.artist_id is None for row in queued):
+        rebuild_matches(k, chunk_size)
+        return None
+
+    changed = {VENUES: {row.venue_id for row in queued if row.venue_id},
+               ARTISTS: {row.artist_id for row in queued if row.artist_id}}
+    # the lists of the changed entities and the lists that held one of
+    # them, computed again
+    stale = {side: set(ids) for side, ids in changed.items()}
+    for side in (VENUES, ARTISTS):
+        stale[side] |= _delete(side, side.other, changed[OTHER[side]])
+    loaded = {side: load_features(side) for side in (VENUES, ARTISTS)}
+    written = {}
+    for side in (VENUES, ARTISTS):
+        _delete(side, side.owner, stale[side])
+        compute_lists(side, subset(loaded[side], stale[side]),
+                      loaded[OTHER[side]], k, chunk_size)
+        written[side] = set(stale[side])
+    # the changed entities in the other lists
+    for side in (VENUES, ARTISTS):
+        newcomers = subset(loaded[OTHER[side]], changed[OTHER[side]])
+        if len(newcomers.ids):
+            owners = subset(loaded[side], stale[side], exclude=True)
+            written[side] |= _admit(side, owners, newcomers, k, chunk_size)
+    return written
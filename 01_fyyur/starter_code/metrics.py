@@ -0,0 +1,200 @@
+import threading
+import time
+from bisect import bisect_left
+
+from flask import (
+    Response,
+    current_app,
+    g,
+    has_app_context,
+    has_request_context,
+    request
+)
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Request metrics.
+#----------------------------------------------------------------------------#
+
+# Records per route (endpoint, method) the latency of every request, how many
+# queries it ran, how long they took and how long the template took to
+# render, and serves them in the Prometheus text format at /metrics. Queries
+# slower than SLOW_QUERY_MS are logged with the route that ran them. The
+# numbers are per process: scrape every worker, or run one worker per
+# container. A route whose query count grows with its data (an N+1) shows up
+# in the fyyur_request_db_queries histogram.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self, name, labels):
+        # cumulative buckets, as Prometheus expects them
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield f'{name}_bucket', dict(labels, le=str(bound)), total
+        yield f'{name}_sum', labels, self.sum
+        yield f'{name}_count', labels, total
+
+
+class RouteStats:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_seconds = 0
+        self.template_seconds = 0
+        self.slow_queries = 0
+        self.statuses = {}
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def _sample(name, labels, value):
+    labels = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+    return f'{name}{{{labels}}} {value}'
+
+
+class TimedTemplate(Template):
+    # times the page templates; included and extended templates are part
+    # of the render of the page
+    def render(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            if has_request_context():
+                g.metrics_template_time = g.get('metrics_template_time', 0) \
+                    + time.perf_counter() - start
+
+
+# The start of a statement is kept on its execution context, which goes
+# away with the statement, also when it fails.
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    context.metrics_query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    elapsed = time.perf_counter() - context.metrics_query_start
+    if has_request_context():
+        g.metrics_queries = g.get('metrics_queries', 0) + 1
+        g.metrics_db_time = g.get('metrics_db_time', 0) + elapsed
+    if not has_app_context():
+        return
+    metrics = current_app.extensions.get('metrics')
+    if (metrics is not None
+            and elapsed * 1000 >= current_app.config['SLOW_QUERY_MS']):
+        metrics.slow_query(elapsed, statement, parameters)
+
+
+class Metrics:
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        self.routes = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.routes = {}
+        app.config.setdefault('SLOW_QUERY_MS', 200)
+        app.extensions['metrics'] = self
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        if not event.contains(Engine, 'before_cursor_execute',
+                              _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute',
+                         _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute',
+                         _after_cursor_execute)
+        app.jinja_env.template_class = TimedTemplate
+        app.before_request(self.start_request)
+        app.after_request(self.end_request)
+        app.add_url_rule('/metrics', 'metrics', self.export)
+
+    def _route(self):
+        return request.endpoint or 'unknown', request.method
+
+    def start_request(self):
+        g.metrics_start = time.perf_counter()
+
+    def end_request(self, response):
+        if 'metrics_start' not in g or request.endpoint == 'metrics':
+            return response
+        elapsed = time.perf_counter() - g.metrics_start
+        with self.lock:
+            stats = self.routes.setdefault(self._route(), RouteStats())
+            stats.latency.observe(elapsed)
+            stats.queries.observe(g.get('metrics_queries', 0))
+            stats.db_seconds += g.get('metrics_db_time', 0)
+            stats.template_seconds += g.get('metrics_template_time', 0)
+            stats.statuses[response.status_code] = \
+                stats.statuses.get(response.status_code, 0) + 1
+        return response
+
+    def slow_query(self, elapsed, statement, parameters):
+        route = self._route() if has_request_context() else ('cli', '-')
+        current_app.logger.warning(
+            'slow query (%.1f ms) in %s %s: %.2000s %.200r', elapsed * 1000,
+            route[1], route[0], ' '.join(statement.split()), parameters)
+        if has_request_context():
+            with self.lock:
+                self.routes.setdefault(route, RouteStats()).slow_queries += 1
+
+    def samples(self):
+        with self.lock:
+            for (endpoint, method), stats in sorted(self.routes.items()):
+                labels = {'endpoint': endpoint, 'method': method}
+                for status, count in sorted(stats.statuses.items()):
+                    yield ('fyyur_requests_total',
+                           dict(labels, status=str(status)), count)
+                yield from stats.latency.samples(
+                    'fyyur_request_duration_seconds', labels)
+                yield from stats.queries.samples(
+                    'fyyur_request_db_queries', labels)
+                yield ('fyyur_request_db_seconds_total', labels,
+                       stats.db_seconds)
+                yield ('fyyur_request_template_seconds_total', labels,
+                       stats.template_seconds)
+                yield 'fyyur_slow_queries_total', labels, stats.slow_queries
+
+    def export(self):
+        types = {
+            'fyyur_requests_total': 'counter',
+            'fyyur_request_duration_seconds': 'histogram',
+            'fyyur_request_db_queries': 'histogram',
+            'fyyur_request_db_seconds_total': 'counter',
+            'fyyur_request_template_seconds_total': 'counter',
+            'fyyur_slow_queries_total': 'counter',
+        }
+        by_name = {name: [] for name in types}
+        for name, labels, value in self.samples():
+            family = name.rsplit('_', 1)[0] if name not in types else name
+            by_name[family].append(_sample(name, labels, value))
+        lines = []
+        for name, kind in types.items():
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(by_name[name])
+        return Response('\n'.join(lines) + '\n',
+                        mimetype='text/plain; version=0.0.4')
+
+
+# bound to an app by create_app() in app.py
+metrics = Metrics()
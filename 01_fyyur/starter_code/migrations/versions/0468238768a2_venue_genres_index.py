@@ -0,0 +1,25 @@
+"""add a GIN index on Venue.genres
+
+Revision ID: 0468238768a2
+Revises: b9e1d114467f
+Create Date: 2026-10-18 17:20:08.114973
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0468238768a2'
+down_revision = 'b9e1d114467f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Venue_genres', 'Venue', ['genres'],
+                    postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_Venue_genres', table_name='Venue')
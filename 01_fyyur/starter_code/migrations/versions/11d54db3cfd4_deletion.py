@@ -0,0 +1,33 @@
+"""add the Deletion table, when rows of Venue, Artist and Show were deleted
+
+Revision ID: 11d54db3cfd4
+Revises: dc908b6369f5
+Create Date: 2026-10-18 23:02:41.538120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '11d54db3cfd4'
+down_revision = 'dc908b6369f5'
+branch_labels = None
+depends_on = None
+
+# models.DELETION_TABLES
+TABLES = ('Venue', 'Artist', 'Show')
+
+
+def upgrade():
+    deletion = op.create_table(
+        'Deletion',
+        sa.Column('table_name', sa.String(length=64), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('table_name'))
+    # unknown until the next delete: the pages keep their validators
+    op.bulk_insert(deletion, [{'table_name': table} for table in TABLES])
+
+
+def downgrade():
+    op.drop_table('Deletion')
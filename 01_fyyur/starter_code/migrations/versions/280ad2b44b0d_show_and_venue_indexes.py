@@ -0,0 +1,32 @@
+"""add indexes on Show foreign keys, Show.start_time and Venue city/state
+
+Revision ID: 280ad2b44b0d
+Revises: b2177c0f243a
+Create Date: 2026-10-18 10:02:17.584301
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '280ad2b44b0d'
+down_revision = 'b2177c0f243a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Show_venue_id_start_time', 'Show',
+                    ['venue_id', 'start_time'])
+    op.create_index('ix_Show_artist_id_start_time', 'Show',
+                    ['artist_id', 'start_time'])
+    op.create_index('ix_Show_start_time_id', 'Show', ['start_time', 'id'])
+    op.create_index('ix_Venue_city_state', 'Venue', ['city', 'state'])
+
+
+def downgrade():
+    op.drop_index('ix_Venue_city_state', table_name='Venue')
+    op.drop_index('ix_Show_start_time_id', table_name='Show')
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
@@ -0,0 +1,30 @@
+"""add updated_at to Venue, Artist and Show
+
+Revision ID: 2f78802b625a
+Revises: 280ad2b44b0d
+Create Date: 2026-10-18 11:26:03.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f78802b625a'
+down_revision = '280ad2b44b0d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist', 'Show'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(),
+                                       nullable=False,
+                                       server_default=sa.func.now()))
+        op.create_index(f'ix_{table}_updated_at', table, ['updated_at'])
+
+
+def downgrade():
+    for table in ('Show', 'Artist', 'Venue'):
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,70 @@
+"""add the latitude and longitude of Venue
+
+Revision ID: 39b7ae2bc2d0
+Revises: 0468238768a2
+Create Date: 2026-10-18 18:41:27.530184
+
+"""
+import csv
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '39b7ae2bc2d0'
+down_revision = '0468238768a2'
+branch_labels = None
+depends_on = None
+
+# the centroids as data/us_centroids.csv held them for this revision, and
+# geo.locate() as it was then: the app's copies may change, this may not
+CENTROIDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              '39b7ae2bc2d0_us_centroids.csv')
+
+
+def _normalize(city):
+    words = city.lower().replace('.', ' ').split()
+    if words and words[0] == 'st':
+        words[0] = 'saint'
+    return ' '.join(words)
+
+
+def _centroids():
+    # {(city, state): (latitude, longitude)}, city '' for the state
+    table = {}
+    with open(CENTROIDS_PATH, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            table[_normalize(row['city']), row['state']] = (
+                float(row['latitude']), float(row['longitude']))
+    return table
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('longitude', sa.Float(), nullable=True))
+    # one UPDATE per city, as models.Venue places new venues
+    bind = op.get_bind()
+    table = _centroids()
+    for city, state in bind.execute(
+            sa.text('SELECT DISTINCT city, state FROM "Venue"')).all():
+        key = (state or '').strip().upper()
+        location = (table.get((_normalize(city or ''), key))
+                    or table.get(('', key)))
+        if location:
+            latitude, longitude = location
+            bind.execute(sa.text(
+                'UPDATE "Venue" SET latitude = :latitude, '
+                'longitude = :longitude '
+                'WHERE city = :city AND state = :state'),
+                {'latitude': latitude, 'longitude': longitude,
+                 'city': city, 'state': state})
+    op.create_index('ix_Venue_latitude_longitude', 'Venue',
+                    ['latitude', 'longitude', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_Venue_latitude_longitude', table_name='Venue')
+    op.drop_column('Venue', 'longitude')
+    op.drop_column('Venue', 'latitude')
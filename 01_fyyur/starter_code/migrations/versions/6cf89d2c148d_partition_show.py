@@ -0,0 +1,103 @@
+"""partition Show by month of start_time
+
+Revision ID: 6cf89d2c148d
+Revises: 876585437ce0
+Create Date: 2026-10-18 15:12:40.381920
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6cf89d2c148d'
+down_revision = '876585437ce0'
+branch_labels = None
+depends_on = None
+
+# same names and bounds as partitions.py; later months are created by
+# `flask partitions`
+MONTHS_AHEAD = 3
+
+INDEXES = (
+    ('ix_Show_venue_id_start_time', 'venue_id, start_time'),
+    ('ix_Show_artist_id_start_time', 'artist_id, start_time'),
+    ('ix_Show_start_time_id', 'start_time, id'),
+    ('ix_Show_updated_at', 'updated_at'),
+)
+
+
+def _months(first, last):
+    index = first.year * 12 + first.month - 1
+    while True:
+        month = datetime(index // 12, index % 12 + 1, 1)
+        if month > last:
+            return
+        yield month
+        index += 1
+
+
+def _next_month(month):
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _copy_show(partitioned):
+    # Show as a new table "Show_new", its rows copied, then swapped in. The
+    # id sequence is kept. A unique key of a partitioned table must contain
+    # the partition key, hence the (id, start_time) primary key; ids stay
+    # unique, they all come from the sequence.
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+    primary_key = 'id, start_time' if partitioned else 'id'
+    op.execute(
+        'CREATE TABLE "Show_new" ('
+        """id integer NOT NULL DEFAULT nextval('"Show_id_seq"'), """
+        'artist_id integer NOT NULL, venue_id integer NOT NULL, '
+        'start_time timestamp without time zone NOT NULL, '
+        'updated_at timestamp without time zone NOT NULL DEFAULT now(), '
+        f'CONSTRAINT "Show_new_pkey" PRIMARY KEY ({primary_key}))'
+        + (' PARTITION BY RANGE (start_time)' if partitioned else ''))
+    if partitioned:
+        op.execute('CREATE TABLE "Show_default" PARTITION OF "Show_new" '
+                   'DEFAULT')
+        bind = op.get_bind()
+        first = bind.scalar(sa.text('SELECT min(start_time) FROM "Show"'))
+        now = datetime.now()
+        last = datetime(now.year, now.month, 1)
+        for _ in range(MONTHS_AHEAD):
+            last = _next_month(last)
+        first = datetime(first.year, first.month, 1) if first else now
+        for month in _months(first, last):
+            op.execute(
+                f'CREATE TABLE "Show_p{month:%Y_%m}" PARTITION OF "Show_new" '
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') "
+                f"TO ('{_next_month(month):%Y-%m-%d}')")
+    op.execute('INSERT INTO "Show_new" '
+               '(id, artist_id, venue_id, start_time, updated_at) '
+               'SELECT id, artist_id, venue_id, start_time, updated_at '
+               'FROM "Show"')
+    op.execute('DROP TABLE "Show"')
+    op.execute('ALTER TABLE "Show_new" RENAME TO "Show"')
+    op.execute('ALTER TABLE "Show" RENAME CONSTRAINT "Show_new_pkey" '
+               'TO "Show_pkey"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    # constraint names as before, bookings.py relies on them
+    op.execute('ALTER TABLE "Show" ADD CONSTRAINT "Show_artist_id_fkey" '
+               'FOREIGN KEY (artist_id) REFERENCES "Artist" (id)')
+    op.execute('ALTER TABLE "Show" ADD CONSTRAINT "Show_venue_id_fkey" '
+               'FOREIGN KEY (venue_id) REFERENCES "Venue" (id) '
+               'ON DELETE CASCADE')
+    # on the partitioned table, created on every partition
+    for name, columns in INDEXES:
+        op.execute(f'CREATE INDEX "{name}" ON "Show" ({columns})')
+    op.execute('ANALYZE "Show"')
+
+
+def upgrade():
+    _copy_show(partitioned=True)
+
+
+def downgrade():
+    # archived partitions (schema "archive") are left alone
+    _copy_show(partitioned=False)
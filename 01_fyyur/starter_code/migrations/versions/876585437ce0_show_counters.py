@@ -0,0 +1,56 @@
+"""add upcoming/past show counters and next_show_at to Venue and Artist
+
+Revision ID: 876585437ce0
+Revises: 2f78802b625a
+Create Date: 2026-10-18 13:41:52.207315
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '876585437ce0'
+down_revision = '2f78802b625a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table, fk in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(),
+                                       nullable=False, server_default='0'))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(),
+                                       nullable=False, server_default='0'))
+        op.add_column(table, sa.Column('next_show_at', sa.DateTime(),
+                                       nullable=True))
+        op.create_index(f'ix_{table}_next_show_at', table, ['next_show_at'])
+
+        # fill the counters in from the existing shows
+        entity = sa.table(table, sa.column('id'),
+                          sa.column('upcoming_shows_count'),
+                          sa.column('past_shows_count'),
+                          sa.column('next_show_at'))
+        show = sa.table('Show', sa.column('id'), sa.column(fk),
+                        sa.column('start_time'))
+        now = datetime.now()
+
+        def shows(*columns):
+            return sa.select(*columns).where(show.c[fk] == entity.c.id)
+        op.execute(entity.update().values(
+            upcoming_shows_count=shows(sa.func.count(show.c.id)).where(
+                show.c.start_time > now).scalar_subquery(),
+            past_shows_count=shows(sa.func.count(show.c.id)).where(
+                show.c.start_time <= now).scalar_subquery(),
+            next_show_at=shows(sa.func.min(show.c.start_time)).where(
+                show.c.start_time > now).scalar_subquery()))
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_index(f'ix_{table}_next_show_at', table_name=table)
+        op.drop_column(table, 'next_show_at')
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
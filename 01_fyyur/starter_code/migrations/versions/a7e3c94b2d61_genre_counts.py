@@ -0,0 +1,34 @@
+"""add GenreCount, the number of venues and of artists with each genre
+
+Revision ID: a7e3c94b2d61
+Revises: 11d54db3cfd4
+Create Date: 2026-10-18 23:40:12.904117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7e3c94b2d61'
+down_revision = '11d54db3cfd4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'GenreCount',
+        sa.Column('table_name', sa.String(length=64), nullable=False),
+        sa.Column('genre', sa.String(length=120), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('table_name', 'genre'))
+    for table in ('Venue', 'Artist'):
+        op.execute(
+            'INSERT INTO "GenreCount" (table_name, genre, total) '
+            f"SELECT '{table}', genre, count(*) "
+            f'FROM "{table}", unnest(genres) AS genre GROUP BY genre')
+
+
+def downgrade():
+    op.drop_table('GenreCount')
@@ -0,0 +1,38 @@
+"""add trigram indexed search_text to Venue and Artist
+
+Revision ID: b2177c0f243a
+Revises: d34165f14401
+Create Date: 2026-10-18 09:12:40.113529
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2177c0f243a'
+down_revision = 'd34165f14401'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('search_text', sa.Text(),
+                                       nullable=False, server_default=''))
+        # same format as models.build_search_text
+        op.execute(
+            f'UPDATE "{table}" SET search_text = lower('
+            "coalesce(name, '') || ' ' || city || ' ' || state || ' ' || "
+            "array_to_string(genres, ' '))"
+        )
+        op.create_index(f'ix_{table}_search_text_trgm', table, ['search_text'],
+                        postgresql_using='gin',
+                        postgresql_ops={'search_text': 'gin_trgm_ops'})
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_index(f'ix_{table}_search_text_trgm', table_name=table)
+        op.drop_column(table, 'search_text')
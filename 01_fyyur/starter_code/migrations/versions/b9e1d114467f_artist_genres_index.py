@@ -0,0 +1,25 @@
+"""add a GIN index on Artist.genres
+
+Revision ID: b9e1d114467f
+Revises: 6cf89d2c148d
+Create Date: 2026-10-18 16:04:21.736512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9e1d114467f'
+down_revision = '6cf89d2c148d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Artist_genres', 'Artist', ['genres'],
+                    postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_Artist_genres', table_name='Artist')
@@ -0,0 +1,47 @@
+"""add the VenueMatch, ArtistMatch and MatchQueue tables
+
+Revision ID: c6152a5e48ab
+Revises: 39b7ae2bc2d0
+Create Date: 2026-10-18 20:03:51.266410
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6152a5e48ab'
+down_revision = '39b7ae2bc2d0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table, owner, other in (('VenueMatch', 'venue_id', 'artist_id'),
+                                ('ArtistMatch', 'artist_id', 'venue_id')):
+        op.create_table(
+            table,
+            sa.Column(owner, sa.Integer(), nullable=False),
+            sa.Column(other, sa.Integer(), nullable=False),
+            sa.Column('score', sa.Float(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False,
+                      server_default=sa.func.now()),
+            sa.PrimaryKeyConstraint(owner, other))
+        op.create_index(f'ix_{table}_{owner}_score', table, [owner, 'score'])
+    op.create_table(
+        'MatchQueue',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('venue_id', sa.Integer(), nullable=True),
+        sa.Column('artist_id', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('id'))
+    # the first `flask matches` computes every list
+    op.execute('INSERT INTO "MatchQueue" (venue_id, artist_id) '
+               'VALUES (NULL, NULL)')
+
+
+def downgrade():
+    op.drop_table('MatchQueue')
+    for table, owner in (('ArtistMatch', 'artist_id'),
+                         ('VenueMatch', 'venue_id')):
+        op.drop_index(f'ix_{table}_{owner}_score', table_name=table)
+        op.drop_table(table)
@@ -0,0 +1,84 @@
+"""add Show.end_time and the Booking table with its exclusion constraints
+
+Revision ID: dc908b6369f5
+Revises: c6152a5e48ab
+Create Date: 2026-10-18 21:17:08.604213
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'dc908b6369f5'
+down_revision = 'c6152a5e48ab'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+# models.SHOW_DURATION
+SHOW_DURATION = "interval '2 hours'"
+COLUMNS = 'show_id, venue_id, artist_id, start_time, end_time'
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    # on the partitioned table, added to every partition
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    op.execute(f'UPDATE "Show" SET end_time = start_time + {SHOW_DURATION}')
+    op.alter_column('Show', 'end_time', nullable=False)
+    op.create_check_constraint('Show_end_time_check', 'Show',
+                               'end_time > start_time')
+
+    op.execute(
+        'CREATE TABLE "Booking" ('
+        'show_id integer NOT NULL, venue_id integer NOT NULL, '
+        'artist_id integer NOT NULL, '
+        'start_time timestamp without time zone NOT NULL, '
+        'end_time timestamp without time zone NOT NULL, '
+        'CONSTRAINT "Booking_pkey" PRIMARY KEY (show_id), '
+        'CONSTRAINT "Booking_venue_excl" EXCLUDE USING gist '
+        '(venue_id WITH =, tsrange(start_time, end_time) WITH &&), '
+        'CONSTRAINT "Booking_artist_excl" EXCLUDE USING gist '
+        '(artist_id WITH =, tsrange(start_time, end_time) WITH &&))')
+    # Shows double-booked already keep their rows, the first one listed
+    # books the time: the others are left out of Booking and reported.
+    bind = op.get_bind()
+    booked = bind.execute(sa.text(
+        f'INSERT INTO "Booking" ({COLUMNS}) '
+        'SELECT id, venue_id, artist_id, start_time, end_time FROM "Show" '
+        'ORDER BY start_time, id ON CONFLICT DO NOTHING')).rowcount
+    shows = bind.scalar(sa.text('SELECT count(*) FROM "Show"'))
+    if booked < shows:
+        logger.warning('%d double-booked shows left out of "Booking": '
+                       'SELECT * FROM "Show" WHERE id NOT IN '
+                       '(SELECT show_id FROM "Booking")', shows - booked)
+
+    # same function and trigger as models.py; on the partitioned table,
+    # created on every partition
+    op.execute(f'''CREATE OR REPLACE FUNCTION "Show_booking"() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP <> 'INSERT' THEN
+    DELETE FROM "Booking" WHERE show_id = old.id;
+  END IF;
+  IF TG_OP <> 'DELETE' THEN
+    INSERT INTO "Booking" ({COLUMNS}) VALUES
+      (new.id, new.venue_id, new.artist_id, new.start_time, new.end_time);
+  END IF;
+  RETURN NULL;
+END $$ LANGUAGE plpgsql''')
+    op.execute('CREATE TRIGGER "Show_booking" AFTER INSERT OR DELETE '
+               'OR UPDATE OF venue_id, artist_id, start_time, end_time '
+               'ON "Show" FOR EACH ROW EXECUTE FUNCTION "Show_booking"()')
+    op.execute('ANALYZE "Booking"')
+
+
+def downgrade():
+    op.execute('DROP TRIGGER "Show_booking" ON "Show"')
+    op.execute('DROP FUNCTION "Show_booking"()')
+    op.drop_table('Booking')
+    op.drop_constraint('Show_end_time_check', 'Show', type_='check')
+    op.drop_column('Show', 'end_time')
@@ -0,0 +1,27 @@
+"""index VenueMatch and ArtistMatch by the matched entity
+
+Revision ID: e2b7c90d4f16
+Revises: f41c8d2b7a90
+Create Date: 2026-10-19 11:02:37.841529
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b7c90d4f16'
+down_revision = 'f41c8d2b7a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the pages listing an edited venue or artist among their matches
+    op.create_index('ix_VenueMatch_artist_id', 'VenueMatch', ['artist_id'])
+    op.create_index('ix_ArtistMatch_venue_id', 'ArtistMatch', ['venue_id'])
+
+
+def downgrade():
+    op.drop_index('ix_ArtistMatch_venue_id', table_name='ArtistMatch')
+    op.drop_index('ix_VenueMatch_artist_id', table_name='VenueMatch')
@@ -0,0 +1,61 @@
+"""add Venue.cell and index the venues by cell for /venues/nearby
+
+Revision ID: f41c8d2b7a90
+Revises: a7e3c94b2d61
+Create Date: 2026-10-19 10:12:45.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f41c8d2b7a90'
+down_revision = 'a7e3c94b2d61'
+branch_labels = None
+depends_on = None
+
+# geo.cell_id() as it was for this revision: the app's copy may change,
+# this may not
+CELL_BITS = 26
+BATCH_SIZE = 1000
+
+
+def _cell_id(latitude, longitude):
+    size = 1 << CELL_BITS
+    row = min(max(int((latitude + 90.0) / 180.0 * size), 0), size - 1)
+    column = min(max(int((longitude + 180.0) / 360.0 * size), 0), size - 1)
+    code = 0
+    for bit in range(CELL_BITS - 1, -1, -1):
+        code = (code << 2) | ((column >> bit) & 1) << 1 | ((row >> bit) & 1)
+    return code
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('cell', sa.BigInteger(), nullable=True))
+    # a batch of venues at a time, in id order
+    bind = op.get_bind()
+    last = 0
+    while True:
+        rows = bind.execute(sa.text(
+            'SELECT id, latitude, longitude FROM "Venue" '
+            'WHERE id > :last AND latitude IS NOT NULL '
+            'AND longitude IS NOT NULL ORDER BY id LIMIT :size'),
+            {'last': last, 'size': BATCH_SIZE}).all()
+        if not rows:
+            break
+        bind.execute(
+            sa.text('UPDATE "Venue" SET cell = :cell WHERE id = :id'),
+            [{'id': id, 'cell': _cell_id(latitude, longitude)}
+             for id, latitude, longitude in rows])
+        last = rows[-1][0]
+    op.drop_index('ix_Venue_latitude_longitude', table_name='Venue')
+    op.create_index('ix_Venue_cell', 'Venue',
+                    ['cell', 'latitude', 'longitude', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_Venue_cell', table_name='Venue')
+    op.create_index('ix_Venue_latitude_longitude', 'Venue',
+                    ['latitude', 'longitude', 'id'])
+    op.drop_column('Venue', 'cell')
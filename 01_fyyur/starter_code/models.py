@@ -1,15 +1,61 @@
-from flask import Flask
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 import datetime
 
-app = Flask(__name__)
-app.config.from_object('config')
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+import sqlite3
+
+from sqlalchemy import DDL, event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
+from sqlalchemy.engine import Engine, make_url
+
+from geo import cell_id, locate
+from routing import RoutingSession
+
+# bound to an app by create_app() in app.py
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+@event.listens_for(Engine, 'connect')
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+  # SQLite only enforces foreign keys (and ON DELETE CASCADE) when asked to
+  if isinstance(dbapi_connection, sqlite3.Connection):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+
+
+def connect_args(config, url):
+  # the timeouts, as the driver of the url takes them: a hung server or a
+  # runaway query must not hold a worker indefinitely
+  url = make_url(url)
+  if url.get_backend_name() != 'postgresql':
+    return {}
+  if url.get_driver_name() == 'asyncpg':
+    return {'timeout': config['DATABASE_CONNECT_TIMEOUT'],
+            'server_settings': {'statement_timeout':
+                                str(config['DATABASE_STATEMENT_TIMEOUT'])}}
+  return {'connect_timeout': config['DATABASE_CONNECT_TIMEOUT'],
+          'options':
+              f"-c statement_timeout={config['DATABASE_STATEMENT_TIMEOUT']}"}
+
+
+# genres are a Postgres ARRAY; SQLite (used for local tests) stores them as JSON
+Genres = db.ARRAY(db.String).with_variant(db.JSON, 'sqlite')
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_Venue_city_state', 'city', 'state'),
+        db.Index('ix_Venue_updated_at', 'updated_at'),
+        db.Index('ix_Venue_next_show_at', 'next_show_at'),
+        # genre filters and facets
+        db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'),
+        # bounding boxes of /venues/nearby as ranges of cells, covering
+        db.Index('ix_Venue_cell', 'cell', 'latitude', 'longitude', 'id'),
+        db.Index('ix_Venue_search_text_trgm', 'search_text',
+                 postgresql_using='gin',
+                 postgresql_ops={'search_text': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String)
@@ -17,12 +63,30 @@ class Venue(db.Model):
     state = db.Column(db.String(120),nullable=False)
     address = db.Column(db.String(120),nullable=False)
     phone = db.Column(db.String(120),nullable=False)
-    genres = db.Column(db.ARRAY(db.String),nullable=False)
+    genres = db.Column(Genres,nullable=False)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120),nullable=False)
     website = db.Column(db.String(120),nullable=False)
     seeking_talent = db.Column(db.Boolean,default=False,nullable=False)
     seeking_description = db.Column(db.String(200),nullable=True) 
+    # lowercased name/city/state/genres, trigram indexed for search
+    search_text = db.Column(db.Text,nullable=False,default='',server_default='')
+    # last write, the ETag/Last-Modified of the pages are derived from it
+    updated_at = db.Column(db.DateTime,nullable=False,
+                           default=datetime.datetime.now,
+                           onupdate=datetime.datetime.now,
+                           server_default=db.func.now())
+    # maintained from Show, see "Show counters" below
+    upcoming_shows_count = db.Column(db.Integer,nullable=False,default=0,
+                                     server_default='0')
+    past_shows_count = db.Column(db.Integer,nullable=False,default=0,
+                                 server_default='0')
+    next_show_at = db.Column(db.DateTime,nullable=True)
+    # centroid of the city, see "Venue locations" below
+    latitude = db.Column(db.Float,nullable=True)
+    longitude = db.Column(db.Float,nullable=True)
+    # geo.cell_id() of the coordinates
+    cell = db.Column(db.BigInteger,nullable=True)
     pass
 
     # TODO: implement any missing fields, 
@@ -30,18 +94,40 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_Artist_updated_at', 'updated_at'),
+        db.Index('ix_Artist_next_show_at', 'next_show_at'),
+        # genre filters and facets, /shows?genre=
+        db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_Artist_search_text_trgm', 'search_text',
+                 postgresql_using='gin',
+                 postgresql_ops={'search_text': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120),nullable=False)
     state = db.Column(db.String(120),nullable=False)
     phone = db.Column(db.String(120),nullable=False)
-    genres = db.Column(db.ARRAY(db.String),nullable=False)
+    genres = db.Column(Genres,nullable=False)
     image_link = db.Column(db.String(500),nullable=False)
     facebook_link = db.Column(db.String(120),nullable=False)
     website = db.Column(db.String(120),nullable=False)
     seeking_venue = db.Column(db.Boolean,default=False,nullable=False)
     seeking_description = db.Column(db.String(200),nullable=True) 
+    # lowercased name/city/state/genres, trigram indexed for search
+    search_text = db.Column(db.Text,nullable=False,default='',server_default='')
+    # last write, the ETag/Last-Modified of the pages are derived from it
+    updated_at = db.Column(db.DateTime,nullable=False,
+                           default=datetime.datetime.now,
+                           onupdate=datetime.datetime.now,
+                           server_default=db.func.now())
+    # maintained from Show, see "Show counters" below
+    upcoming_shows_count = db.Column(db.Integer,nullable=False,default=0,
+                                     server_default='0')
+    past_shows_count = db.Column(db.Integer,nullable=False,default=0,
+                                 server_default='0')
+    next_show_at = db.Column(db.DateTime,nullable=True)
     pass
     # TODO: implement any missing fields,
     #  as a database migration using Flask-Migrate
@@ -50,19 +136,683 @@ class Artist(db.Model):
 # complete all model relationships and properties,
 #  as a database migration.
 
+# how long a show books its venue and artist when no end time is given
+SHOW_DURATION = datetime.timedelta(hours=2)
+
+
+def _default_end_time(context):
+  return context.get_current_parameters()['start_time'] + SHOW_DURATION
+
+
 class Show(db.Model):
   __tablename__ = 'Show'
+  # detail pages filter by venue/artist and split on start_time,
+  # /shows pages through (start_time, id). On Postgres the table is
+  # partitioned by month of start_time with an (id, start_time) primary
+  # key, see partitions.py; create_all() makes a plain table.
+  __table_args__ = (
+      db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+      db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+      db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+      db.Index('ix_Show_updated_at', 'updated_at'),
+      db.CheckConstraint('end_time > start_time', name='Show_end_time_check'),
+  )
   id = db.Column(db.Integer, primary_key=True , autoincrement=True)
+  # constraint names as created by Postgres, bookings.py relies on them
   artist_id = db.Column(db.Integer,
-                        db.ForeignKey('Artist.id'),
+                        db.ForeignKey('Artist.id', name='Show_artist_id_fkey'),
                         nullable=False)
   venue_id= db.Column(db.Integer,
-                     db.ForeignKey("Venue.id", ondelete="CASCADE")
+                     db.ForeignKey("Venue.id", ondelete="CASCADE",
+                                   name='Show_venue_id_fkey')
                      ,nullable=False)
   start_time = db.Column(db.DateTime,
                          nullable=False,
                          default=datetime.datetime.today())
+  # SHOW_DURATION after start_time unless given
+  end_time = db.Column(db.DateTime,nullable=False,
+                       default=_default_end_time)
+  updated_at = db.Column(db.DateTime,nullable=False,
+                         default=datetime.datetime.now,
+                         onupdate=datetime.datetime.now,
+                         server_default=db.func.now())
   pass
 
 
+# the time every show books its venue and its artist, see "Bookings" below
+class Booking(db.Model):
+  __tablename__ = 'Booking'
+  __table_args__ = (
+      # constraint names as in the migration, bookings.py relies on them
+      ExcludeConstraint(
+          ('venue_id', '='),
+          (db.func.tsrange(db.column('start_time'), db.column('end_time')),
+           '&&'),
+          name='Booking_venue_excl', using='gist',
+      ).ddl_if(dialect='postgresql'),
+      ExcludeConstraint(
+          ('artist_id', '='),
+          (db.func.tsrange(db.column('start_time'), db.column('end_time')),
+           '&&'),
+          name='Booking_artist_excl', using='gist',
+      ).ddl_if(dialect='postgresql'),
+      # SQLite checks overlaps by triggers, through these
+      db.Index('ix_Booking_venue_id_end_time', 'venue_id', 'end_time'
+               ).ddl_if(dialect='sqlite'),
+      db.Index('ix_Booking_artist_id_end_time', 'artist_id', 'end_time'
+               ).ddl_if(dialect='sqlite'),
+  )
+  show_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+  venue_id = db.Column(db.Integer,nullable=False)
+  artist_id = db.Column(db.Integer,nullable=False)
+  start_time = db.Column(db.DateTime,nullable=False)
+  end_time = db.Column(db.DateTime,nullable=False)
+
+
+# the best matches of every seeking venue and artist, see "Matches" below
+class VenueMatch(db.Model):
+  __tablename__ = 'VenueMatch'
+  __table_args__ = (
+      db.Index('ix_VenueMatch_venue_id_score', 'venue_id', 'score'),
+      # the venue pages to expire when an artist changes
+      db.Index('ix_VenueMatch_artist_id', 'artist_id'),
+  )
+  venue_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+  artist_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+  score = db.Column(db.Float,nullable=False)
+  updated_at = db.Column(db.DateTime,nullable=False,
+                         default=datetime.datetime.now,
+                         server_default=db.func.now())
+
+
+class ArtistMatch(db.Model):
+  __tablename__ = 'ArtistMatch'
+  __table_args__ = (
+      db.Index('ix_ArtistMatch_artist_id_score', 'artist_id', 'score'),
+      # the artist pages to expire when a venue changes
+      db.Index('ix_ArtistMatch_venue_id', 'venue_id'),
+  )
+  artist_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+  venue_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+  score = db.Column(db.Float,nullable=False)
+  updated_at = db.Column(db.DateTime,nullable=False,
+                         default=datetime.datetime.now,
+                         server_default=db.func.now())
+
+
+class MatchQueue(db.Model):
+  __tablename__ = 'MatchQueue'
+  id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+  # one of them, or neither to ask for a full rebuild
+  venue_id = db.Column(db.Integer,nullable=True)
+  artist_id = db.Column(db.Integer,nullable=True)
+
+
+# when rows of a table were last deleted, see "Deletions" below
+class Deletion(db.Model):
+  __tablename__ = 'Deletion'
+  table_name = db.Column(db.String(64), primary_key=True)
+  deleted_at = db.Column(db.DateTime,nullable=True)
+
+
+# the number of venues and of artists with each genre, see "Genre counts"
+class GenreCount(db.Model):
+  __tablename__ = 'GenreCount'
+  table_name = db.Column(db.String(64), primary_key=True)
+  genre = db.Column(db.String(120), primary_key=True)
+  total = db.Column(db.Integer,nullable=False,default=0,server_default='0')
+
+
+#----------------------------------------------------------------------------#
+# Search support.
+#----------------------------------------------------------------------------#
+
+def build_search_text(name, city, state, genres):
+  parts = [name or '', city or '', state or '']
+  parts.extend(genres or [])
+  return ' '.join(parts).lower()
+
+
+def _update_search_text(mapper, connection, target):
+  target.search_text = build_search_text(
+      target.name, target.city, target.state, target.genres)
+
+
+def _install_search(model):
+  event.listen(model, 'before_insert', _update_search_text)
+  event.listen(model, 'before_update', _update_search_text)
+
+  # On SQLite the search goes through an FTS5 trigram index, kept in sync
+  # with the table by triggers. Postgres uses the pg_trgm GIN index
+  # created by the migrations instead.
+  table = model.__tablename__
+  fts = table.lower() + '_fts'
+  for statement in (
+      f'CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(search_text, '
+      f'content="{table}", content_rowid="id", tokenize="trigram")',
+      f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON "{table}" BEGIN '
+      f'INSERT INTO {fts}(rowid, search_text) VALUES (new.id, new.search_text); END',
+      f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON "{table}" BEGIN '
+      f"INSERT INTO {fts}({fts}, rowid, search_text) VALUES ('delete', old.id, old.search_text); END",
+      f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON "{table}" BEGIN '
+      f"INSERT INTO {fts}({fts}, rowid, search_text) VALUES ('delete', old.id, old.search_text); "
+      f'INSERT INTO {fts}(rowid, search_text) VALUES (new.id, new.search_text); END',
+  ):
+    event.listen(model.__table__, 'after_create',
+                 DDL(statement).execute_if(dialect='sqlite'))
+  event.listen(model.__table__, 'before_drop',
+               DDL(f'DROP TABLE IF EXISTS {fts}').execute_if(dialect='sqlite'))
+
+
+_install_search(Venue)
+_install_search(Artist)
+
+
+#----------------------------------------------------------------------------#
+# Venue locations.
+#----------------------------------------------------------------------------#
+
+# A venue is located at the centroid of its city (geo.py) when it is added
+# and whenever its city or state changes, unless the same flush sets its
+# coordinates; its cell follows its coordinates. Core inserts that bypass
+# the ORM call locate() and cell_id() themselves.
+
+@event.listens_for(Venue, 'before_insert')
+@event.listens_for(Venue, 'before_update')
+def _update_location(mapper, connection, target):
+  attrs = inspect(target).attrs
+  if not attrs.latitude.history.has_changes() and (
+      target.latitude is None or attrs.city.history.has_changes()
+      or attrs.state.history.has_changes()):
+    target.latitude, target.longitude = locate(target.city, target.state)
+  target.cell = cell_id(target.latitude, target.longitude)
+
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# Venue and Artist carry the number of their upcoming and past shows and the
+# start of their next show, so listings and page headers read them from the
+# entity row instead of counting Show. A flush adding, moving or deleting
+# shows adds its changes to the counters of their venues and artists, in the
+# same transaction and with one UPDATE per table (count_shows() and
+# update_show_counters()); only the start of the next show is looked up
+# again, through the (venue_id/artist_id, start_time) indexes, when an
+# upcoming show goes. Core inserts that bypass the ORM count their shows
+# themselves.
+#
+# A show turning from upcoming into past changes no row, so the counters are
+# only right up to next_show_at: roll_over_show_counters() (`flask rollover`,
+# run it from cron) recomputes every row whose next show has started, and
+# so does update_show_counters() for the rows it updates. `flask recount`
+# recomputes the counters from Show and repairs any drift.
+
+COUNTED = ((Venue, Show.venue_id), (Artist, Show.artist_id))
+# the next show of an entity lost an upcoming show, look it up again
+NEXT_SHOW_GONE = object()
+
+
+def _next_show(model, show_fk, now):
+  return db.select(db.func.min(Show.start_time)).where(
+      show_fk == model.id, Show.start_time > now).scalar_subquery()
+
+
+def _counter_values(model, show_fk, now):
+  # correlated subqueries, evaluated for every updated row
+  def count(*criteria):
+    return db.select(db.func.count(Show.id)).where(
+        show_fk == model.id, *criteria).scalar_subquery()
+  return {
+      'upcoming_shows_count': count(Show.start_time > now),
+      'past_shows_count': count(Show.start_time <= now),
+      'next_show_at': _next_show(model, show_fk, now),
+  }
+
+
+def _recount(connection, model, show_fk, criterion, now):
+  # returns the ids of the updated rows
+  return [row[0] for row in connection.execute(
+      db.update(model).where(criterion)
+      .values(**_counter_values(model, show_fk, now))
+      .returning(model.id))]
+
+
+def refresh_show_counters(venue_ids=(), artist_ids=(), now=None,
+                          connection=None):
+  # recomputes the counters of these venues and artists from Show
+  connection = connection or db.session.connection()
+  now = now or datetime.datetime.now()
+  for (model, show_fk), ids in zip(COUNTED, (venue_ids, artist_ids)):
+    ids = {id for id in ids if id is not None}
+    if ids:
+      _recount(connection, model, show_fk, model.id.in_(ids), now)
+
+
+def _count(counts, model, id, upcoming, number, start_time=None):
+  # `number` upcoming or past shows added to an entity (taken off when
+  # negative); start_time is the earliest of the added upcoming shows
+  delta = counts.setdefault((model, id), [0, 0, None])
+  delta[0 if upcoming else 1] += number
+  if upcoming and delta[2] is not NEXT_SHOW_GONE:
+    if number < 0:
+      delta[2] = NEXT_SHOW_GONE
+    elif delta[2] is None or start_time < delta[2]:
+      delta[2] = start_time
+
+
+def count_shows(counts, shows, now, sign=1):
+  # adds (venue_id, artist_id, start_time) shows to `counts`, or takes them
+  # off with sign=-1; returns counts, for update_show_counters()
+  for venue_id, artist_id, start_time in shows:
+    upcoming = start_time > now
+    for model, id in ((Venue, venue_id), (Artist, artist_id)):
+      if id is not None:
+        _count(counts, model, id, upcoming, sign, start_time)
+  return counts
+
+
+def update_show_counters(counts, now, connection=None):
+  # Adds `counts` to the counters, one executemany UPDATE per table. Rows
+  # whose next show has started since they were counted are recounted
+  # instead: their upcoming counter includes shows that are past by now.
+  # Every row is updated, even for no change in numbers, so its updated_at
+  # tells the page validators that one of its shows changed.
+  connection = connection or db.session.connection()
+  for model, show_fk in COUNTED:
+    rows = [{'b_id': id, 'b_upcoming': upcoming, 'b_past': past,
+             'b_next': None if next is NEXT_SHOW_GONE else next,
+             'b_next_gone': next is NEXT_SHOW_GONE}
+            for (counted, id), (upcoming, past, next) in counts.items()
+            if counted is model]
+    if not rows:
+      continue
+    stale = model.next_show_at <= now
+    recount = _counter_values(model, show_fk, now)
+    added_next = db.bindparam('b_next', type_=db.DateTime)
+    values = {
+        'upcoming_shows_count': db.case(
+            (stale, recount['upcoming_shows_count']),
+            else_=model.upcoming_shows_count + db.bindparam('b_upcoming')),
+        'past_shows_count': db.case(
+            (stale, recount['past_shows_count']),
+            else_=model.past_shows_count + db.bindparam('b_past')),
+        'next_show_at': db.case(
+            (db.or_(stale, db.bindparam('b_next_gone', type_=db.Boolean)),
+             recount['next_show_at']),
+            (db.and_(added_next.is_not(None), db.or_(
+                model.next_show_at.is_(None),
+                model.next_show_at > added_next)), added_next),
+            else_=model.next_show_at),
+    }
+    connection.execute(db.update(model)
+                       .where(model.id == db.bindparam('b_id'))
+                       .values(**values), rows)
+
+
+def refresh_all_show_counters(now=None):
+  # after bulk loads: one UPDATE per table
+  now = now or datetime.datetime.now()
+  connection = db.session.connection()
+  for model, show_fk in COUNTED:
+    connection.execute(db.update(model)
+                       .values(**_counter_values(model, show_fk, now)))
+
+
+def roll_over_show_counters(now=None):
+  # returns the ids of the (venues, artists) that had a show start
+  now = now or datetime.datetime.now()
+  connection = db.session.connection()
+  return tuple(_recount(connection, model, show_fk,
+                        model.next_show_at <= now, now)
+               for model, show_fk in COUNTED)
+
+
+def show_counter_drift(now=None):
+  # returns the ids of the (venues, artists) whose counters are wrong
+  now = now or datetime.datetime.now()
+  drift = []
+  for model, show_fk in COUNTED:
+    expected = _counter_values(model, show_fk, now)
+    drift.append([row[0] for row in db.session.execute(
+        db.select(model.id).where(db.or_(*[
+            getattr(model, name).is_distinct_from(value)
+            for name, value in expected.items()
+        ])).order_by(model.id))])
+  return tuple(drift)
+
+
+def _committed(state, name):
+  # the value of an attribute as the database has it
+  history = state.attrs[name].history
+  return history.deleted[0] if history.deleted else getattr(state.obj(), name)
+
+
+@event.listens_for(db.session, 'before_flush')
+def _collect_counted_shows(session, flush_context, instances):
+  now = session.info.setdefault('show_counters_now', datetime.datetime.now())
+  counts = session.info.setdefault('show_counters', {})
+  columns = ('venue_id', 'artist_id', 'start_time')
+  for obj in session.new | session.dirty | session.deleted:
+    if isinstance(obj, Show):
+      state = inspect(obj)
+      if obj in session.new or obj in session.deleted or \
+          session.is_modified(obj):
+        if obj not in session.new:
+          # as it was counted: a changed show is taken off its old venue,
+          # artist and time, and counted again
+          count_shows(counts, [[_committed(state, name) for name in columns]],
+                      now, -1)
+        if obj not in session.deleted:
+          count_shows(counts, [(obj.venue_id, obj.artist_id,
+                                obj.start_time)], now)
+    elif isinstance(obj, Venue) and obj in session.deleted:
+      # its shows go with it through ON DELETE CASCADE
+      upcoming = Show.start_time > now
+      for artist_id, is_upcoming, number in session.execute(
+          db.select(Show.artist_id, upcoming, db.func.count(Show.id))
+          .where(Show.venue_id == obj.id)
+          .group_by(Show.artist_id, upcoming)):
+        _count(counts, Artist, artist_id, bool(is_upcoming), -number)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _update_counted_shows(session, flush_context):
+  now = session.info.pop('show_counters_now', None)
+  counts = session.info.pop('show_counters', {})
+  if counts:
+    update_show_counters(counts, now, connection=session.connection())
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _forget_counted_shows(session, previous_transaction):
+  # the shows of a failed flush were not written
+  session.info.pop('show_counters_now', None)
+  session.info.pop('show_counters', None)
+
+
+#----------------------------------------------------------------------------#
+# Matches.
+#----------------------------------------------------------------------------#
+
+# VenueMatch holds the best artists of every seeking venue and ArtistMatch
+# the best venues of every seeking artist, computed by matches.py. Neither
+# has foreign keys: the pages join them with the entities, and the rows of
+# a deleted entity go with the next refresh.
+#
+# Every flush adding or deleting venues or artists, or changing what they
+# are matched on (MATCHED), queues them in MatchQueue, in the same
+# transaction; `flask matches` (run it from cron) refreshes the matches of
+# the queued entities. Core inserts that bypass the ORM call
+# queue_match_rebuild().
+
+# the attributes the scores and the seeking filters of matches.py read; a
+# venue is located from its city and state (see "Venue locations")
+MATCHED = {
+    Venue: ('genres', 'city', 'state', 'latitude', 'longitude',
+            'seeking_talent'),
+    Artist: ('genres', 'city', 'state', 'seeking_venue'),
+}
+
+
+def queue_match_rebuild(connection=None):
+  connection = connection or db.session.connection()
+  connection.execute(db.insert(MatchQueue).values(venue_id=None,
+                                                  artist_id=None))
+
+
+@event.listens_for(db.session, 'before_flush')
+def _collect_matched(session, flush_context, instances):
+  # ids of new objects are only known after the flush
+  matched = session.info.setdefault('matched', [])
+  for obj in session.new | session.deleted:
+    if isinstance(obj, (Venue, Artist)):
+      matched.append(obj)
+  for obj in session.dirty:
+    if isinstance(obj, (Venue, Artist)):
+      attrs = inspect(obj).attrs
+      if any(attrs[name].history.has_changes() for name in MATCHED[type(obj)]):
+        matched.append(obj)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _queue_matched(session, flush_context):
+  matched = session.info.pop('matched', [])
+  rows = dict.fromkeys(
+      (obj.id, None) if isinstance(obj, Venue) else (None, obj.id)
+      for obj in matched)
+  if rows:
+    session.connection().execute(db.insert(MatchQueue), [
+        {'venue_id': venue_id, 'artist_id': artist_id}
+        for venue_id, artist_id in rows])
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _forget_matched(session, previous_transaction):
+  # the rows of a failed flush were not written
+  session.info.pop('matched', None)
+
+
+#----------------------------------------------------------------------------#
+# Deletions.
+#----------------------------------------------------------------------------#
+
+# A deleted row leaves no updated_at behind, so the validators of the
+# listings (queries.py) read when rows of their tables were last deleted
+# from Deletion, one row per table. Every flush deleting venues, artists or
+# shows stamps their tables, in the same transaction; Core deletes call
+# stamp_deletions() themselves.
+
+DELETION_TABLES = ('Venue', 'Artist', 'Show')
+
+event.listen(Deletion.__table__, 'after_create', DDL(
+    'INSERT INTO "Deletion" (table_name) VALUES '
+    + ', '.join(f"('{table}')" for table in DELETION_TABLES)))
+
+
+def stamp_deletions(tables, connection=None):
+  connection = connection or db.session.connection()
+  connection.execute(db.update(Deletion)
+                     .where(Deletion.table_name.in_(tables))
+                     .values(deleted_at=datetime.datetime.now()))
+
+
+@event.listens_for(db.session, 'before_flush')
+def _collect_deleted(session, flush_context, instances):
+  deleted = session.info.setdefault('deleted_tables', set())
+  for obj in session.deleted:
+    if isinstance(obj, (Venue, Artist, Show)):
+      deleted.add(obj.__tablename__)
+    if isinstance(obj, Venue):
+      # its shows go with it through ON DELETE CASCADE
+      deleted.add(Show.__tablename__)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _stamp_deleted(session, flush_context):
+  deleted = session.info.pop('deleted_tables', set())
+  if deleted:
+    stamp_deletions(sorted(deleted), connection=session.connection())
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _forget_deleted(session, previous_transaction):
+  # the rows of a failed flush were not deleted
+  session.info.pop('deleted_tables', None)
+
+
+#----------------------------------------------------------------------------#
+# Genre counts.
+#----------------------------------------------------------------------------#
+
+# The genre facets of the unfiltered listings (queries.py) read how many
+# venues and artists have each genre from GenreCount instead of counting
+# them. Every flush adding or deleting venues or artists, or changing their
+# genres, adds its changes to the counts in the same transaction, with one
+# upsert (count_genres() and update_genre_counts()). Core inserts that
+# bypass the ORM count their rows themselves; `flask recount` recounts
+# them from the tables.
+
+GENRE_COUNTED = (Venue, Artist)
+
+
+def count_genres(counts, model, genres, sign=1):
+  # adds an entity with these genres to `counts`, or takes it off with
+  # sign=-1; returns counts, for update_genre_counts()
+  for genre in genres or ():
+    key = (model.__tablename__, genre)
+    counts[key] = counts.get(key, 0) + sign
+  return counts
+
+
+def _genre_count_upsert(connection):
+  dialect = postgresql if connection.dialect.name == 'postgresql' else sqlite
+  upsert = dialect.insert(GenreCount)
+  return upsert.on_conflict_do_update(
+      index_elements=[GenreCount.table_name, GenreCount.genre],
+      set_={'total': GenreCount.total + upsert.excluded.total})
+
+
+def update_genre_counts(counts, connection=None):
+  connection = connection or db.session.connection()
+  rows = [{'table_name': table_name, 'genre': genre, 'total': total}
+          for (table_name, genre), total in sorted(counts.items()) if total]
+  if rows:
+    connection.execute(_genre_count_upsert(connection), rows)
+
+
+def _genre_totals_query(model):
+  # (genre, number of rows with it) of a table; the elements of the genres
+  # array on Postgres, of the JSON array on SQLite
+  if db.session.get_bind().dialect.name == 'sqlite':
+    values = db.func.json_each(model.genres).table_valued('value')
+  else:
+    values = db.func.unnest(model.genres).table_valued(
+        'value').render_derived()
+  return db.select(values.c.value, db.func.count()).select_from(
+      model).join(values, db.true()).group_by(values.c.value)
+
+
+def genre_count_drift():
+  # returns the (table, genre) whose count is wrong
+  drift = []
+  for model in GENRE_COUNTED:
+    stored = dict(db.session.execute(
+        db.select(GenreCount.genre, GenreCount.total)
+        .where(GenreCount.table_name == model.__tablename__)).all())
+    totals = dict(db.session.execute(_genre_totals_query(model)).all())
+    drift += [(model.__tablename__, genre)
+              for genre in sorted(set(stored) | set(totals))
+              if stored.get(genre, 0) != totals.get(genre, 0)]
+  return drift
+
+
+def refresh_genre_counts():
+  # after bulk loads and for `flask recount`
+  connection = db.session.connection()
+  connection.execute(db.delete(GenreCount))
+  for model in GENRE_COUNTED:
+    connection.execute(db.insert(GenreCount).from_select(
+        ['table_name', 'genre', 'total'],
+        db.select(db.literal(model.__tablename__),
+                  *_genre_totals_query(model).subquery().c)))
+
+
+@event.listens_for(db.session, 'before_flush')
+def _collect_counted_genres(session, flush_context, instances):
+  counts = session.info.setdefault('genre_counts', {})
+  for obj in session.new | session.dirty | session.deleted:
+    if not isinstance(obj, GENRE_COUNTED):
+      continue
+    history = inspect(obj).attrs.genres.history
+    if obj in session.new:
+      count_genres(counts, type(obj), obj.genres)
+    elif obj in session.deleted:
+      count_genres(counts, type(obj), history.deleted[0] if history.deleted
+                   else obj.genres, -1)
+    elif history.has_changes():
+      count_genres(counts, type(obj),
+                   history.deleted[0] if history.deleted else (), -1)
+      count_genres(counts, type(obj), obj.genres)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _update_counted_genres(session, flush_context):
+  counts = session.info.pop('genre_counts', {})
+  if counts:
+    update_genre_counts(counts, connection=session.connection())
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _forget_counted_genres(session, previous_transaction):
+  # the rows of a failed flush were not written
+  session.info.pop('genre_counts', None)
+
+
+#----------------------------------------------------------------------------#
+# Bookings.
+#----------------------------------------------------------------------------#
+
+# Every show books its venue and its artist from start_time to end_time,
+# and no two bookings of the same venue or of the same artist may overlap.
+# The database enforces it, for every writer and against concurrent ones:
+# Booking holds a row per show, written by triggers on Show, and on
+# Postgres two exclusion constraints (btree_gist) reject the overlapping
+# rows of a venue and of an artist. The constraints are not on Show
+# itself: Show is partitioned by month of start_time and a constraint of a
+# partitioned table must compare the partition key for equality, so it
+# would miss the overlaps across partitions. The gist indexes of the
+# constraints also answer the availability checks (bookings.py).
+#
+# SQLite has no exclusion constraints: triggers on Booking raise the same
+# error, through the (venue_id/artist_id, end_time) indexes.
+
+_BOOKING_COLUMNS = 'show_id, venue_id, artist_id, start_time, end_time'
+_BOOKING_VALUES = ('new.id, new.venue_id, new.artist_id, new.start_time, '
+                   'new.end_time')
+_BOOKED_COLUMNS = 'venue_id, artist_id, start_time, end_time'
+
+for statement in (
+    # same function and trigger as the migration
+    f'''CREATE OR REPLACE FUNCTION "Show_booking"() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP <> 'INSERT' THEN
+    DELETE FROM "Booking" WHERE show_id = old.id;
+  END IF;
+  IF TG_OP <> 'DELETE' THEN
+    INSERT INTO "Booking" ({_BOOKING_COLUMNS}) VALUES ({_BOOKING_VALUES});
+  END IF;
+  RETURN NULL;
+END $$ LANGUAGE plpgsql''',
+    f'CREATE TRIGGER "Show_booking" AFTER INSERT OR DELETE '
+    f'OR UPDATE OF {_BOOKED_COLUMNS} ON "Show" '
+    f'FOR EACH ROW EXECUTE FUNCTION "Show_booking"()',
+):
+  event.listen(Show.__table__, 'after_create',
+               DDL(statement).execute_if(dialect='postgresql'))
+
+for statement in (
+    f'CREATE TRIGGER IF NOT EXISTS show_booking_ai AFTER INSERT ON "Show" '
+    f'BEGIN INSERT INTO "Booking" ({_BOOKING_COLUMNS}) '
+    f'VALUES ({_BOOKING_VALUES}); END',
+    'CREATE TRIGGER IF NOT EXISTS show_booking_ad AFTER DELETE ON "Show" '
+    'BEGIN DELETE FROM "Booking" WHERE show_id = old.id; END',
+    f'CREATE TRIGGER IF NOT EXISTS show_booking_au '
+    f'AFTER UPDATE OF {_BOOKED_COLUMNS} ON "Show" '
+    f'BEGIN DELETE FROM "Booking" WHERE show_id = old.id; '
+    f'INSERT INTO "Booking" ({_BOOKING_COLUMNS}) '
+    f'VALUES ({_BOOKING_VALUES}); END',
+):
+  event.listen(Show.__table__, 'after_create',
+               DDL(statement).execute_if(dialect='sqlite'))
 
+for column in ('venue_id', 'artist_id'):
+  constraint = 'Booking_' + column.split('_')[0] + '_excl'
+  # the message of Postgres, with the constraint name
+  event.listen(Booking.__table__, 'after_create', DDL(
+      f'CREATE TRIGGER IF NOT EXISTS "{constraint}" BEFORE INSERT '
+      f'ON "Booking" WHEN EXISTS (SELECT 1 FROM "Booking" '
+      f'WHERE {column} = new.{column} AND end_time > new.start_time '
+      f'AND start_time < new.end_time) BEGIN SELECT RAISE(ABORT, '
+      f"'conflicting key value violates exclusion constraint "
+      f'"{constraint}"\'); END').execute_if(dialect='sqlite'))
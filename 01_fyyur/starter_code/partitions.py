@@ -0,0 +1,157 @@
+import re
+from datetime import datetime
+
+from sqlalchemy import text
+
+from models import db, refresh_show_counters, stamp_deletions
+
+#----------------------------------------------------------------------------#
+# Show partitions.
+#----------------------------------------------------------------------------#
+
+# On Postgres the Show table is range partitioned by start_time, one
+# partition per calendar month named Show_pYYYY_MM, plus Show_default for
+# rows no monthly partition covers (see migration 6cf89d2c148d). Queries on
+# upcoming shows filter on start_time and only touch the partitions of the
+# coming months.
+#
+# create_partitions() adds the partitions of the coming months ahead of the
+# bookings; rows already in Show_default for such a month are moved into
+# it. archive_partitions() detaches the partitions of months older than the
+# retention: they are moved to the "archive" schema or dropped, and the
+# show counters of their venues and artists are recomputed, so pages count
+# and list the retained shows only. Their shows no longer book anything.
+
+PARTITION_NAME = re.compile(r'^Show_p(\d{4})_(\d{2})$')
+ARCHIVE_SCHEMA = 'archive'
+
+
+class PartitionError(Exception):
+    pass
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'Show_p{month:%Y_%m}'
+
+
+def _connection():
+    connection = db.session.connection()
+    if connection.dialect.name != 'postgresql':
+        raise PartitionError('Show is only partitioned on Postgres')
+    partitioned = connection.scalar(text(
+        "SELECT relkind = 'p' FROM pg_class "
+        "WHERE oid = to_regclass('public.\"Show\"')"))
+    if not partitioned:
+        raise PartitionError('Show is not partitioned, run `flask db upgrade`')
+    return connection
+
+
+def monthly_partitions(connection):
+    # {month: partition name}
+    names = connection.scalars(text(
+        'SELECT child.relname FROM pg_inherits '
+        'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+        "WHERE pg_inherits.inhparent = 'public.\"Show\"'::regclass"))
+    partitions = {}
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions[datetime(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+def _create_partition(connection, month):
+    # Created as a plain table and attached, so the rows of the month that
+    # Show_default holds can be moved in first: attaching checks that
+    # Show_default has none left. Indexes, foreign keys and triggers are
+    # added from the parent table by ATTACH, the CHECK constraints it
+    # requires are copied by LIKE.
+    name, end = partition_name(month), add_months(month, 1)
+    bounds = {'start': month, 'end': end}
+    connection.execute(text(
+        f'CREATE TABLE "{name}" '
+        f'(LIKE "Show" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+    connection.execute(text(
+        f'WITH moved AS (DELETE FROM "Show_default" '
+        f'WHERE start_time >= :start AND start_time < :end RETURNING *) '
+        f'INSERT INTO "{name}" SELECT * FROM moved'), bounds)
+    # the delete took their bookings away (Show_booking trigger), the
+    # insert into the table not attached yet did not add them back
+    connection.execute(text(
+        f'INSERT INTO "Booking" '
+        f'(show_id, venue_id, artist_id, start_time, end_time) '
+        f'SELECT id, venue_id, artist_id, start_time, end_time '
+        f'FROM "{name}"'))
+    # lets ATTACH skip the scan of the new partition
+    connection.execute(text(
+        f'ALTER TABLE "{name}" ADD CONSTRAINT "{name}_bounds" '
+        f"CHECK (start_time >= '{month:%Y-%m-%d}' "
+        f"AND start_time < '{end:%Y-%m-%d}')"))
+    connection.execute(text(
+        f'ALTER TABLE "Show" ATTACH PARTITION "{name}" '
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"))
+    connection.execute(text(
+        f'ALTER TABLE "{name}" DROP CONSTRAINT "{name}_bounds"'))
+    return name
+
+
+def create_partitions(months_ahead=3, now=None):
+    # returns the names of the partitions created, oldest first
+    connection = _connection()
+    existing = monthly_partitions(connection)
+    current = month_start(now or datetime.now())
+    return [_create_partition(connection, month)
+            for month in (add_months(current, n)
+                          for n in range(months_ahead + 1))
+            if month not in existing]
+
+
+def archive_partitions(retain_months, drop=False, now=None):
+    # Returns (partition names, venue ids, artist ids) of the partitions
+    # detached, the months before the current one and the `retain_months`
+    # before it.
+    connection = _connection()
+    oldest_kept = add_months(month_start(now or datetime.now()),
+                             -retain_months)
+    names = [name for month, name
+             in sorted(monthly_partitions(connection).items())
+             if month < oldest_kept]
+    venue_ids, artist_ids = set(), set()
+    if names and not drop:
+        connection.execute(text(
+            f'CREATE SCHEMA IF NOT EXISTS "{ARCHIVE_SCHEMA}"'))
+    for name in names:
+        for venue_id, artist_id in connection.execute(text(
+                f'SELECT DISTINCT venue_id, artist_id FROM "{name}"')):
+            venue_ids.add(venue_id)
+            artist_ids.add(artist_id)
+        connection.execute(text(f'ALTER TABLE "Show" DETACH PARTITION "{name}"'))
+        # detaching fires no trigger
+        connection.execute(text(
+            f'DELETE FROM "Booking" WHERE show_id IN (SELECT id FROM "{name}")'))
+        # archived shows must not stop an artist from being deleted
+        for constraint in connection.scalars(text(
+                "SELECT conname FROM pg_constraint WHERE contype = 'f' "
+                'AND conrelid = CAST(:table AS regclass)'),
+                {'table': f'public."{name}"'}):
+            connection.execute(text(
+                f'ALTER TABLE "{name}" DROP CONSTRAINT "{constraint}"'))
+        if drop:
+            connection.execute(text(f'DROP TABLE "{name}"'))
+        else:
+            connection.execute(text(
+                f'ALTER TABLE "{name}" SET SCHEMA "{ARCHIVE_SCHEMA}"'))
+    refresh_show_counters(venue_ids, artist_ids, connection=connection)
+    if names:
+        # the listings lost shows
+        stamp_deletions(['Show'], connection=connection)
+    return names, sorted(venue_ids), sorted(artist_ids)
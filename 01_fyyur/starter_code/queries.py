@@ -0,0 +1,691 @@
+import base64
+import heapq
+import json
+import math
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from flask import current_app, request
+from sqlalchemy import (
+    DateTime,
+    Float,
+    and_,
+    case,
+    column,
+    func,
+    or_,
+    select,
+    tuple_
+)
+from sqlalchemy.dialects import postgresql
+
+from forms import Genre
+from geo import bounding_box, cell_ranges, haversine_km
+from models import (
+    db,
+    Venue,
+    Artist,
+    Show,
+    VenueMatch,
+    ArtistMatch,
+    Deletion,
+    DELETION_TABLES,
+    GenreCount
+)
+
+#----------------------------------------------------------------------------#
+# Query helpers shared by the controllers.
+#----------------------------------------------------------------------------#
+
+
+def venue_areas_query(genre=None):
+    # venues with the number of their upcoming shows, sorted by area.
+    # The number is the counter kept on the venue row, Show is not read.
+    return filter_genre(db.session.query(
+        Venue.city,
+        Venue.state,
+        Venue.id,
+        Venue.name,
+        Venue.upcoming_shows_count.label("num_upcoming_shows")
+    ), Venue.genres, genre).order_by(Venue.city, Venue.state, Venue.id)
+
+
+def venue_areas(genre=None):
+    # Returns the venues grouped by city/state together with the number of
+    # upcoming shows of every venue, and the genre facets, using a single
+    # round trip.
+    rows = with_genre_facets(venue_areas_query(genre), Venue.genres,
+                             narrowed=genre is not None).all()
+    return group_areas(rows), genre_facets_result(rows)
+
+
+def group_areas(rows):
+    # rows are sorted by area, so grouping is a single linear pass
+    areas = []
+    for (city, state), venues in groupby(rows, key=lambda r: (r.city, r.state)):
+        areas.append({
+            "city": city,
+            "state": state,
+            "venues": [{
+                "id": venue.id,
+                "name": venue.name,
+                "num_upcoming_shows": venue.num_upcoming_shows,
+            } for venue in venues]
+        })
+    return areas
+
+
+#----------------------------------------------------------------------------#
+# Detail pages.
+#----------------------------------------------------------------------------#
+
+VENUE_FIELDS = ("id", "name", "genres", "city", "state", "phone", "address",
+                "website", "seeking_talent", "seeking_description",
+                "facebook_link", "image_link", "upcoming_shows_count",
+                "past_shows_count", "next_show_at", "latitude", "longitude")
+ARTIST_FIELDS = ("id", "name", "genres", "city", "state", "phone", "website",
+                 "seeking_venue", "seeking_description", "facebook_link",
+                 "image_link", "upcoming_shows_count", "past_shows_count",
+                 "next_show_at")
+
+
+def show_list_queries(show_fk, entity_id, other, prefix, now,
+                      past_limit, upcoming_limit):
+    # Returns the (upcoming, past) queries of a venue or artist page.
+    # The database splits, orders and limits both lists against the same
+    # `now` snapshot; the counts in the page header come from the entity row.
+    shows = db.session.query(
+        Show.start_time,
+        other.id.label(prefix + "_id"),
+        other.name.label(prefix + "_name"),
+        other.image_link.label(prefix + "_image_link")
+    ).join(other, getattr(Show, prefix + "_id") == other.id
+    ).filter(show_fk == entity_id)
+    upcoming = shows.filter(Show.start_time > now
+    ).order_by(Show.start_time, Show.id).limit(upcoming_limit)
+    past = shows.filter(Show.start_time <= now
+    ).order_by(Show.start_time.desc(), Show.id.desc()).limit(past_limit)
+    return upcoming, past
+
+
+def match_list_query(match, owner_id, entity_id, other, prefix, limit):
+    # the best matches of a venue or artist (see matches.py), best first
+    return db.session.query(
+        match.score,
+        other.id.label(prefix + "_id"),
+        other.name.label(prefix + "_name"),
+        other.image_link.label(prefix + "_image_link"),
+        other.city.label(prefix + "_city"),
+        other.state.label(prefix + "_state")
+    ).join(other, getattr(match, prefix + "_id") == other.id
+    ).filter(owner_id == entity_id
+    ).order_by(match.score.desc(), other.id).limit(limit)
+
+
+def venue_matches_query(venue_id, limit):
+    return match_list_query(VenueMatch, VenueMatch.venue_id, venue_id,
+                            Artist, "artist", limit)
+
+
+def artist_matches_query(artist_id, limit):
+    return match_list_query(ArtistMatch, ArtistMatch.artist_id, artist_id,
+                            Venue, "venue", limit)
+
+
+def detail_data(row, upcoming, past, matches):
+    # the data of a venue or artist page out of its row, show lists and
+    # matches
+    data = row._asdict()
+    data["upcoming_shows"] = [show._asdict() for show in upcoming]
+    data["past_shows"] = [show._asdict() for show in past]
+    data["matches"] = [match._asdict() for match in matches]
+    return data
+
+
+def venue_query(venue_id):
+    return db.session.query(*[getattr(Venue, field) for field in VENUE_FIELDS]
+    ).filter(Venue.id == venue_id)
+
+
+def artist_query(artist_id):
+    return db.session.query(*[getattr(Artist, field) for field in ARTIST_FIELDS]
+    ).filter(Artist.id == artist_id)
+
+
+def venue_detail(venue_id, past_limit=20, upcoming_limit=20, now=None,
+                 matches_limit=6):
+    # Returns the data of the venue page, or None if the venue does not exist.
+    venue = venue_query(venue_id).first()
+    if venue is None:
+        return None
+    return detail_data(venue, *show_list_queries(
+        Show.venue_id, venue_id, Artist, "artist", now or datetime.now(),
+        past_limit, upcoming_limit), venue_matches_query(venue_id,
+                                                         matches_limit))
+
+
+def artist_detail(artist_id, past_limit=20, upcoming_limit=20, now=None,
+                  matches_limit=6):
+    # Returns the data of the artist page, or None if the artist does not exist.
+    artist = artist_query(artist_id).first()
+    if artist is None:
+        return None
+    return detail_data(artist, *show_list_queries(
+        Show.artist_id, artist_id, Venue, "venue", now or datetime.now(),
+        past_limit, upcoming_limit), artist_matches_query(artist_id,
+                                                          matches_limit))
+
+
+def artist_ids_of_venue_query(venue_id):
+    # artists whose pages list the venue: with a show at the venue, or
+    # matched with it
+    return db.session.query(Show.artist_id).filter(
+        Show.venue_id == venue_id).union(
+        db.session.query(ArtistMatch.artist_id).filter(
+            ArtistMatch.venue_id == venue_id))
+
+
+def artist_ids_of_venue(venue_id):
+    return [row[0] for row in artist_ids_of_venue_query(venue_id)]
+
+
+def venue_ids_of_artist_query(artist_id):
+    # venues whose pages list the artist: with a show of the artist, or
+    # matched with it
+    return db.session.query(Show.venue_id).filter(
+        Show.artist_id == artist_id).union(
+        db.session.query(VenueMatch.venue_id).filter(
+            VenueMatch.artist_id == artist_id))
+
+
+def venue_ids_of_artist(artist_id):
+    return [row[0] for row in venue_ids_of_artist_query(artist_id)]
+
+
+#----------------------------------------------------------------------------#
+# Validators for conditional requests.
+#----------------------------------------------------------------------------#
+
+# Each function returns (values, last_modified) for a page, or None if the
+# entity does not exist. `values` changes whenever the rendered page would:
+# writes bump updated_at, deletes are stamped in Deletion, and the page
+# also changes when an upcoming show becomes a past one, which is covered
+# by the start time of the next upcoming show. last_modified is the latest
+# of those changes. Every value is read from the entity row or is a min()
+# or max() served by an index: the validators never count rows nor join
+# the history of a venue or artist.
+
+
+def _last_modified(*values):
+    return max((value for value in values if value is not None), default=None)
+
+
+# Every validator is split in the query and the function turning its row
+# into (values, last_modified), so the async pages (asgi.py) can run the
+# same query.
+
+
+def _detail_validators_query(model, entity_id, other, match_owner, now):
+    # Adding, changing or deleting a show of the entity updates its show
+    # counters, so its row covers its shows. The shows list the name and
+    # image of the other side: any change to one of those rows counts. A
+    # refresh of the matches rewrites the rows of the lists it changes.
+    return db.session.query(
+        model.updated_at,
+        model.upcoming_shows_count,
+        model.past_shows_count,
+        model.next_show_at,
+        # the next show has started: the page lists it with the past ones
+        case((model.next_show_at <= now, model.next_show_at)),
+        select(func.max(other.updated_at)).scalar_subquery(),
+        select(func.max(match_owner.class_.updated_at)).where(
+            match_owner == entity_id).scalar_subquery()
+    ).filter(model.id == entity_id)
+
+
+def detail_validators_result(row):
+    if row is None:
+        return None
+    return tuple(row), _last_modified(row[0], row[4], row[5], row[6])
+
+
+def venue_validators_query(venue_id, now=None):
+    return _detail_validators_query(Venue, venue_id, Artist,
+                                    VenueMatch.venue_id, now or datetime.now())
+
+
+def artist_validators_query(artist_id, now=None):
+    return _detail_validators_query(Artist, artist_id, Venue,
+                                    ArtistMatch.artist_id,
+                                    now or datetime.now())
+
+
+def venue_validators(venue_id, now=None):
+    return detail_validators_result(
+        venue_validators_query(venue_id, now).first())
+
+
+def artist_validators(artist_id, now=None):
+    return detail_validators_result(
+        artist_validators_query(artist_id, now).first())
+
+
+def _scalars_query(*queries):
+    # single value queries as subqueries of one SELECT.
+    # min()/max() with a WHERE (not a FILTER) are answered from the index.
+    return db.session.query(*[query.scalar_subquery() for query in queries])
+
+
+def _deleted_at_query(*tables):
+    return db.session.query(func.max(Deletion.deleted_at)).filter(
+        Deletion.table_name.in_(tables))
+
+
+def entity_list_validators_query(model):
+    # the venue area listing reads the show counters of the venue rows,
+    # every change to them bumps updated_at
+    return _scalars_query(db.session.query(func.max(model.updated_at)),
+                          _deleted_at_query(model.__tablename__))
+
+
+def entity_list_validators_result(row):
+    row = tuple(row)
+    return row, _last_modified(*row)
+
+
+def venues_validators():
+    return entity_list_validators_result(
+        entity_list_validators_query(Venue).one())
+
+
+def artists_validators():
+    return entity_list_validators_result(
+        entity_list_validators_query(Artist).one())
+
+
+def shows_validators_query(now=None):
+    # the listing changes when an upcoming show starts, as the detail pages
+    now = now or datetime.now()
+    return _scalars_query(
+        db.session.query(func.max(Show.updated_at)),
+        db.session.query(func.max(Artist.updated_at)),
+        db.session.query(func.max(Venue.updated_at)),
+        _deleted_at_query(*DELETION_TABLES),
+        db.session.query(func.min(Show.start_time)).filter(
+            Show.start_time > now),
+        db.session.query(func.max(Show.start_time)).filter(
+            Show.start_time <= now))
+
+
+def shows_validators_result(row):
+    row = tuple(row)
+    return row, _last_modified(row[0], row[1], row[2], row[3], row[5])
+
+
+def shows_validators(now=None):
+    return shows_validators_result(shows_validators_query(now).one())
+
+
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#----------------------------------------------------------------------------#
+
+# A page is requested with ?after=<cursor>&limit=<n>. The cursor holds the
+# sort key of the last row of the previous page, so the next page is a
+# "WHERE key > cursor ORDER BY key LIMIT n" served by an index, no matter
+# how deep the client has paged.
+
+
+def page_args():
+    # ?after=<cursor>&limit=<n>, also read from the form of the POST searches
+    after = request.values.get('after') or None
+    limit = request.values.get('limit', current_app.config['PAGE_SIZE'],
+                               type=int)
+    return after, max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+
+
+def encode_cursor(values):
+    payload = json.dumps([
+        value.isoformat() if isinstance(value, datetime) else value
+        for value in values
+    ], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def decode_cursor(cursor, keys):
+    # raises InvalidCursor for cursors that were not produced by encode_cursor
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError(cursor)
+        return [
+            datetime.fromisoformat(value) if isinstance(key.type, DateTime)
+            else value
+            for key, value in zip(keys, values)
+        ]
+    except (TypeError, ValueError) as e:
+        raise InvalidCursor('invalid cursor') from e
+
+
+def keyset_query(query, keys, after=None, limit=50):
+    # keys: ascending sort key expressions, the last one must be unique.
+    # Fetches one row more than asked to know whether there is a next page.
+    if after:
+        query = query.filter(
+            tuple_(*keys) > tuple_(*decode_cursor(after, keys)))
+    return query.add_columns(*[
+        key.label(f"_key{i}") for i, key in enumerate(keys)
+    ]).order_by(*keys).limit(limit + 1)
+
+
+def keyset_page(query, keys, after=None, limit=50):
+    # Returns (rows, cursor of the next page or None).
+    rows = keyset_query(query, keys, after, limit).all()
+    return keyset_rows(rows, len(keys), limit)
+
+
+def keyset_rows(rows, key_count, limit):
+    # the page and the next cursor out of the rows of a keyset_query()
+    labels = [f"_key{i}" for i in range(key_count)]
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_after = encode_cursor([getattr(last, label) for label in labels])
+    return rows, next_after
+
+
+def venues_page_query(columns=None):
+    # columns default to what the listing pages show
+    return db.session.query(*(columns or (Venue.id, Venue.name))), [Venue.id]
+
+
+def artists_page_query(columns=None, genre=None):
+    query = db.session.query(*(columns or (Artist.id, Artist.name)))
+    return filter_genre(query, Artist.genres, genre), [Artist.id]
+
+
+def artists_page(after=None, limit=50, genre=None):
+    # (rows, cursor of the next page, genre facets)
+    query, keys = artists_page_query(genre=genre)
+    rows, next_after = keyset_page(
+        with_genre_facets(query, Artist.genres, narrowed=genre is not None),
+        keys, after, limit)
+    return rows, next_after, genre_facets_result(rows)
+
+
+def shows_page_query(filters=None, now=None):
+    # filters as returned by show_filters(); None lists every show
+    query = db.session.query(
+        Show.id,
+        Show.start_time,
+        Artist.name.label("artist_name"),
+        Artist.image_link.label("artist_image_link"),
+        Artist.id.label("artist_id"),
+        Venue.id.label("venue_id"),
+        Venue.name.label("venue_name")
+    ).join(Artist, Show.artist_id == Artist.id
+    ).join(Venue, Show.venue_id == Venue.id)
+    if filters is not None:
+        query = filter_shows(query, filters, now or datetime.now())
+    return query, [Show.start_time, Show.id]
+
+
+def shows_page(filters=None, after=None, limit=50):
+    return keyset_page(*shows_page_query(filters), after, limit)
+
+
+#----------------------------------------------------------------------------#
+# Show filters.
+#----------------------------------------------------------------------------#
+
+# /shows lists the upcoming shows unless ?from= says otherwise. ?from= and
+# ?to= are dates (YYYY-MM-DD, ?to= included) or dates and times;
+# ?venue_id=, ?artist_id=, ?city= and ?state= (of the venue) and ?genre=
+# (of the artist) narrow the list down. Every filter goes through an index:
+# start_time through ix_Show_start_time_id, the venue and the artist
+# through the (venue_id/artist_id, start_time) indexes, city and state
+# through ix_Venue_city_state and the genre through the GIN index on
+# Artist.genres.
+
+SHOW_FILTERS = ('from', 'to', 'venue_id', 'artist_id', 'city', 'state',
+                'genre')
+
+
+class InvalidFilter(ValueError):
+    pass
+
+
+def _filter_time(value, name):
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError as e:
+        raise InvalidFilter(f'Invalid {name}: {value}') from e
+    if name == 'to' and len(value) == 10:
+        # up to the end of that day
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def show_filters(args):
+    # the filters given in the request arguments `args`, parsed;
+    # raises InvalidFilter
+    filters = {}
+    for name in SHOW_FILTERS:
+        value = (args.get(name) or '').strip()
+        if not value:
+            continue
+        if name in ('from', 'to'):
+            filters[name] = _filter_time(value, name)
+        elif name in ('venue_id', 'artist_id'):
+            if not value.isdigit():
+                raise InvalidFilter(f'Invalid {name}: {value}')
+            filters[name] = int(value)
+        else:
+            filters[name] = value
+    return filters
+
+
+def filter_shows(query, filters, now):
+    if 'from' in filters:
+        query = query.filter(Show.start_time >= filters['from'])
+    else:
+        query = query.filter(Show.start_time > now)
+    if 'to' in filters:
+        query = query.filter(Show.start_time < filters['to'])
+    if 'venue_id' in filters:
+        query = query.filter(Show.venue_id == filters['venue_id'])
+    if 'artist_id' in filters:
+        query = query.filter(Show.artist_id == filters['artist_id'])
+    if 'city' in filters:
+        query = query.filter(Venue.city == filters['city'])
+    if 'state' in filters:
+        query = query.filter(Venue.state == filters['state'])
+    if 'genre' in filters:
+        query = query.filter(genre_filter(Artist.genres, filters['genre']))
+    return query
+
+
+#----------------------------------------------------------------------------#
+# Genres.
+#----------------------------------------------------------------------------#
+
+# /venues, /artists and the searches take ?genre= (a form field of the
+# searches) and list how many of their results have each Genre. Filters are
+# array containments (genres @> ARRAY[...]) answered by the GIN indexes on
+# Venue.genres and Artist.genres.
+#
+# The counts are columns of the page query, the same on every row, so a
+# listing stays one query. Unfiltered listings read the counts kept in
+# GenreCount (see "Genre counts" in models.py): a popular genre would
+# otherwise read most of the table, GIN has no index-only scans. Only a
+# narrowed result set (a genre or a search term) is counted live, with
+# containments ANDed with the other indexes of the query.
+
+GENRES = [genre.value for genre in Genre]
+
+
+def genre_arg():
+    # ?genre= or the genre field of a form, None when not given
+    genre = (request.values.get('genre') or '').strip()
+    if genre and genre not in GENRES:
+        raise InvalidFilter(f'Invalid genre: {genre}')
+    return genre or None
+
+
+def genre_filter(genres, genre):
+    # genres: a Genres column. On Postgres an array containment (@>), which
+    # the GIN index on the column answers; SQLite stores a JSON array.
+    if db.session.get_bind().dialect.name == 'sqlite':
+        values = func.json_each(genres).table_valued('value')
+        return select(values.c.value).where(values.c.value == genre).exists()
+    return genres.op('@>', is_comparison=True)(postgresql.array([genre]))
+
+
+def filter_genre(query, genres, genre):
+    return query.filter(genre_filter(genres, genre)) if genre else query
+
+
+def with_genre_facets(query, genres, narrowed=True):
+    # `query` with the number of its rows having each genre as the columns
+    # _genre0, _genre1... of every row, in the order of Genre; the kept
+    # counts of the whole table unless `narrowed`
+    if narrowed:
+        counts = [select(func.count()).select_from(
+                      query.filter(genre_filter(genres, genre)).order_by(None)
+                      .subquery())
+                  for genre in GENRES]
+    else:
+        counts = [select(GenreCount.total).where(
+                      GenreCount.table_name == genres.class_.__tablename__,
+                      GenreCount.genre == genre)
+                  for genre in GENRES]
+    return query.add_columns(*[count.scalar_subquery().label(f'_genre{i}')
+                               for i, count in enumerate(counts)])
+
+
+def genre_facets_result(rows):
+    # [(genre, count)] of the genres found, in the order of Genre, out of
+    # the rows of a with_genre_facets() query; none without rows
+    if not rows:
+        return []
+    counts = [getattr(rows[0], f'_genre{i}') for i in range(len(GENRES))]
+    return [(genre, count) for genre, count in zip(GENRES, counts) if count]
+
+
+#----------------------------------------------------------------------------#
+# Nearby venues.
+#----------------------------------------------------------------------------#
+
+# /venues/nearby?lat=&lon=&radius= lists the venues within `radius` km of a
+# point, nearest first, a page at a time. The database returns the id and
+# coordinates of the venues in the bounding box of a circle, an index only
+# scan of a few ranges of ix_Venue_cell (see geo.py); the exact distances
+# are computed here. The circle starts NEARBY_REACH_KM past the last venue
+# shown and widens NEARBY_REACH_GROWTH times until it holds more venues
+# than a page, so a wide radius over a dense catalog reads the venues near
+# the point, not every venue within the radius. Pages are keyset paginated
+# on (distance, id); only the nearest venues are read from the table.
+
+NEARBY_REACH_KM = 10.0
+NEARBY_REACH_GROWTH = 8
+NEARBY_KEYS = [column('distance_km', Float), Venue.id]
+
+
+def _coordinate(name, low, high, default=None):
+    value = (request.args.get(name) or '').strip()
+    if not value:
+        return default
+    try:
+        number = float(value)
+    except ValueError as e:
+        raise InvalidFilter(f'Invalid {name}: {value}') from e
+    if not low <= number <= high:
+        raise InvalidFilter(f'Invalid {name}: {value}')
+    return number
+
+
+def nearby_args():
+    # (lat, lon, radius) of the request, lat and lon None when not given;
+    # raises InvalidFilter
+    latitude = _coordinate('lat', -90.0, 90.0)
+    longitude = _coordinate('lon', -180.0, 180.0)
+    if (latitude is None) != (longitude is None):
+        raise InvalidFilter('lat and lon go together')
+    radius = _coordinate('radius', 0.0,
+                         current_app.config['NEARBY_MAX_RADIUS_KM'],
+                         current_app.config['NEARBY_RADIUS_KM'])
+    return latitude, longitude, radius
+
+
+def nearby_venues_query(latitude, longitude, radius_km):
+    # the venues in the box, read from the index alone: the ranges of
+    # cells covering the box, then the box itself
+    south, north, longitudes = bounding_box(latitude, longitude, radius_km)
+    return db.session.query(
+        Venue.id, Venue.latitude, Venue.longitude
+    ).filter(or_(*[Venue.cell.between(first, last)
+                   for first, last in cell_ranges(south, north, longitudes)]),
+             Venue.latitude.between(south, north), or_(*[
+                 Venue.longitude.between(west, east)
+                 for west, east in longitudes]))
+
+
+def nearest(latitude, longitude, radius_km, limit, after=None):
+    # [(distance in km, id)] of the limit + 1 nearest venues within the
+    # radius past the (distance, id) `after`, nearest first. No venue out of
+    # a reach holding more than `limit` of them can be nearer than those.
+    after = tuple(after) if after else (-1.0, 0)
+    reach = max(after[0], 0.0) + NEARBY_REACH_KM
+    while True:
+        reach = min(reach, radius_km)
+        distances = []
+        for id, row_latitude, row_longitude in nearby_venues_query(
+                latitude, longitude, reach):
+            distance = haversine_km(latitude, longitude, row_latitude,
+                                    row_longitude)
+            if distance <= reach and (distance, id) > after:
+                distances.append((distance, id))
+        if len(distances) > limit or reach >= radius_km:
+            return heapq.nsmallest(limit + 1, distances)
+        reach *= NEARBY_REACH_GROWTH
+
+
+def nearby_venues_details_query(ids):
+    return db.session.query(
+        Venue.id,
+        Venue.name,
+        Venue.city,
+        Venue.state,
+        Venue.address,
+        Venue.upcoming_shows_count.label("num_upcoming_shows")
+    ).filter(Venue.id.in_(ids))
+
+
+def nearby_venues_result(rows, distances):
+    # the rows of nearby_venues_details_query() with their distance_km,
+    # nearest first
+    return sorted((dict(row._asdict(), distance_km=distances[row.id])
+                   for row in rows),
+                  key=lambda venue: (venue['distance_km'], venue['id']))
+
+
+def nearby_venues(latitude, longitude, radius_km, after=None, limit=50):
+    # Returns (venues, cursor of the next page or None).
+    after = decode_cursor(after, NEARBY_KEYS) if after else None
+    if after and not all(isinstance(value, (int, float))
+                         and math.isfinite(value) for value in after):
+        raise InvalidCursor('invalid cursor')
+    found = nearest(latitude, longitude, radius_km, limit, after)
+    next_after = encode_cursor(found[limit - 1]) if len(found) > limit \
+        else None
+    distances = {id: distance for distance, id in found[:limit]}
+    if not distances:
+        return [], None
+    return nearby_venues_result(nearby_venues_details_query(distances),
+                                distances), next_after
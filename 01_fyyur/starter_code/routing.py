@@ -0,0 +1,68 @@
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#----------------------------------------------------------------------------#
+
+# With DATABASE_REPLICA_URL set, the queries of GET and HEAD requests go to
+# the 'replica' bind and everything else to the primary. Flushes always go
+# to the primary. GET views that write are marked with @use_primary and POST
+# views that only read (the searches) with @read_only. A client that just
+# wrote keeps reading from the primary for DATABASE_REPLICA_LAG seconds so
+# it sees its own changes. g.read_primary sends the reads of one request to
+# the primary without pinning the client (the page cache sets it, see
+# cache.py).
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def _is_read():
+    return request.method in READ_METHODS or g.get('read_only', False)
+
+
+def reads_from_replica():
+    if not has_request_context() or not _is_read():
+        return False
+    if g.get('use_primary') or g.get('read_primary'):
+        return False
+    return session.get('_primary_until', 0) < time.time()
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and reads_from_replica():
+            replica = self._db.engines.get('replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper, clause, bind, **kwargs)
+
+
+def use_primary(view):
+    # for the GET views that write
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.use_primary = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def read_only(view):
+    # for the POST views that only read
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def pin_writers_to_primary(response):
+    # after_request hook: reads of a client that just wrote skip the replica
+    if current_app.config.get('DATABASE_REPLICA_URL') and (
+            not _is_read() or g.get('use_primary')):
+        session['_primary_until'] = \
+            time.time() + current_app.config['DATABASE_REPLICA_LAG']
+    return response
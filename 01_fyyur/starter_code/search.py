@@ -0,0 +1,110 @@
+import re
+
+from sqlalchemy import Float, Integer, and_, case, func, text
+
+from models import db, Venue, Artist
+from queries import (
+    filter_genre,
+    genre_facets_result,
+    keyset_page,
+    with_genre_facets
+)
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# Every word of the search term has to match somewhere in the entity's
+# search_text (name, city, state and genres), so "San Francisco, CA" finds
+# the venues of that city and "hop" still finds "The Musical Hop".
+# Results are ranked with the best name matches first. Every search query
+# comes with its ascending sort keys so results can be keyset paginated.
+
+
+def search_terms(search_term):
+    return re.findall(r"[^\s,]+", (search_term or '').lower())
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _search_postgres(model, terms, search_term, columns):
+    # search_text ILIKE '%term%' is served by the pg_trgm GIN index
+    query = db.session.query(*columns).filter(and_(*[
+        model.search_text.ilike(f"%{_escape_like(term)}%", escape='\\')
+        for term in terms
+    ]))
+    return query, [
+        -func.similarity(model.name, search_term),
+        -func.word_similarity(search_term, model.search_text),
+        model.id
+    ]
+
+
+def _search_sqlite(model, terms, search_term, columns):
+    # the trigram tokenizer needs at least three characters per term,
+    # shorter terms are matched with LIKE on the (already narrowed) rows.
+    fts = model.__tablename__.lower() + '_fts'
+    long_terms = [term for term in terms if len(term) >= 3]
+    short_terms = [term for term in terms if len(term) < 3]
+    query = db.session.query(*columns)
+    if long_terms:
+        match = ' AND '.join('"' + term.replace('"', '""') + '"'
+                             for term in long_terms)
+        ranked = text(
+            f"SELECT rowid AS id, bm25({fts}) AS rank FROM {fts} "
+            f"WHERE {fts} MATCH :match"
+        ).bindparams(match=match).columns(id=Integer, rank=Float).subquery()
+        query = query.join(ranked, ranked.c.id == model.id)
+        keys = [ranked.c.rank]
+    else:
+        keys = []
+    for term in short_terms:
+        query = query.filter(
+            model.search_text.like(f"%{_escape_like(term)}%", escape='\\'))
+    name_match = case((model.name.ilike(f"%{_escape_like(search_term)}%",
+                                        escape='\\'), 0), else_=1)
+    return query, [name_match, *keys, model.id]
+
+
+def search_query(model, search_term, columns=None, genre=None):
+    # columns default to what the search result pages show
+    columns = columns or (model.id, model.name)
+    terms = search_terms(search_term)
+    if not terms:
+        query, keys = db.session.query(*columns), [model.id]
+    elif db.session.get_bind().dialect.name == 'sqlite':
+        query, keys = _search_sqlite(model, terms, search_term.strip(),
+                                     columns)
+    else:
+        query, keys = _search_postgres(model, terms, search_term.strip(),
+                                       columns)
+    return filter_genre(query, model.genres, genre), keys
+
+
+def search_page(model, search_term, after=None, limit=50, columns=None,
+                genre=None, facets=False):
+    # Returns (rows, cursor of the next page, total number of matches),
+    # plus the genre facets of the matches when asked for: columns of the
+    # page query, counted live only when the term or the genre narrows it.
+    query, keys = search_query(model, search_term, columns, genre)
+    page_query = query
+    if facets:
+        narrowed = bool(search_terms(search_term)) or genre is not None
+        page_query = with_genre_facets(query, model.genres, narrowed)
+    rows, next_after = keyset_page(page_query, keys, after, limit)
+    page = rows, next_after, query.order_by(None).count()
+    if facets:
+        page += (genre_facets_result(rows),)
+    return page
+
+
+def search_venues(search_term, after=None, limit=50, genre=None):
+    return search_page(Venue, search_term, after, limit, genre=genre,
+                       facets=True)
+
+
+def search_artists(search_term, after=None, limit=50, genre=None):
+    return search_page(Artist, search_term, after, limit, genre=genre,
+                       facets=True)
@@ -0,0 +1,207 @@
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from forms import Genre, VenueForm
+from geo import cell_id, locate
+from models import (
+    db,
+    Venue,
+    Artist,
+    Show,
+    Booking,
+    SHOW_DURATION,
+    build_search_text,
+    queue_match_rebuild,
+    refresh_all_show_counters,
+    refresh_genre_counts
+)
+
+#----------------------------------------------------------------------------#
+# Synthetic data.
+#----------------------------------------------------------------------------#
+
+# Generates venues, artists and shows to size a deployment and to run the
+# benchmarks against realistic volumes. Values pass the validation of the
+# forms: genres come from Genre and states from VenueForm.state_choices.
+# Rows are inserted with one executemany and one commit per batch; the show
+# counters and the genre counts are filled in at the end with one statement
+# per table. Shows start a year either side of now and no show double-books
+# its venue or artist, those are refused by the database: each venue and
+# artist keeps a bitmap of the half hours it is booked for in that window,
+# so memory grows with the venues and artists, not the shows. A show that
+# finds no free time after a few draws is left out.
+
+GENRES = [genre.value for genre in Genre]
+STATES = [state for state, _ in VenueForm.state_choices]
+CITIES = {
+    'CA': ['San Francisco', 'Los Angeles', 'Oakland', 'San Diego'],
+    'NY': ['New York', 'Brooklyn', 'Buffalo', 'Albany'],
+    'TX': ['Austin', 'Houston', 'Dallas', 'San Antonio'],
+    'IL': ['Chicago', 'Springfield'],
+    'WA': ['Seattle', 'Spokane', 'Tacoma'],
+    'TN': ['Nashville', 'Memphis'],
+    'LA': ['New Orleans', 'Baton Rouge'],
+    'GA': ['Atlanta', 'Savannah'],
+    'CO': ['Denver', 'Boulder'],
+    'MA': ['Boston', 'Cambridge'],
+}
+TOWNS = ['Riverside', 'Fairview', 'Franklin', 'Greenville', 'Madison',
+         'Georgetown', 'Clinton', 'Salem']
+ADJECTIVES = ['Musical', 'Velvet', 'Electric', 'Golden', 'Midnight', 'Rusty',
+              'Blue', 'Wild', 'Silent', 'Crimson', 'Lucky', 'Broken']
+VENUE_NOUNS = ['Hop', 'Lounge', 'Hall', 'Cellar', 'Theatre', 'Garage',
+               'Ballroom', 'Tavern', 'Club', 'Stage']
+ARTIST_NOUNS = ['Petals', 'Sax Band', 'Quartet', 'Collective', 'Orchestra',
+                'Rebels', 'Echoes', 'Drifters', 'Strings', 'Machines']
+STREETS = ['Valencia St', 'Delancey Street', 'Main St', 'Broadway',
+           'Sunset Blvd', 'Elm Street', 'Market St']
+# shows start on the half hour, from a year ago to a year from now; draws
+# of a venue, an artist and a time before a show is left out
+SINCE = timedelta(days=365)
+SLOT = timedelta(minutes=30)
+WINDOW_SLOTS = 2 * SINCE // SLOT
+SHOW_SLOTS = -(-SHOW_DURATION // SLOT)
+SHOW_TRIES = 16
+
+
+def _city_state(rng):
+    state = rng.choice(STATES)
+    return rng.choice(CITIES.get(state, TOWNS)), state
+
+
+def _phone(rng):
+    return f'{rng.randint(200, 999)}-{rng.randint(200, 999)}-' \
+           f'{rng.randint(0, 9999):04d}'
+
+
+def _common(rng, name, slug):
+    city, state = _city_state(rng)
+    genres = rng.sample(GENRES, rng.randint(1, 3))
+    return {
+        'name': name, 'city': city, 'state': state, 'phone': _phone(rng),
+        'genres': genres, 'image_link': f'https://example.com/{slug}.png',
+        'facebook_link': f'https://www.facebook.com/{slug}',
+        'website': f'https://www.{slug}.com',
+        'seeking_description': rng.choice([None, 'Looking for new talent']),
+        'search_text': build_search_text(name, city, state, genres),
+    }
+
+
+def venue_values(rng, number):
+    name = f'The {rng.choice(ADJECTIVES)} {rng.choice(VENUE_NOUNS)} {number}'
+    values = _common(rng, name, f'venue{number}')
+    # spread around the centroid of the city, about 5 km either way
+    latitude, longitude = locate(values['city'], values['state'])
+    values.update(address=f'{rng.randint(1, 2000)} {rng.choice(STREETS)}',
+                  seeking_talent=rng.random() < 0.5,
+                  latitude=latitude + rng.uniform(-0.05, 0.05),
+                  longitude=longitude + rng.uniform(-0.05, 0.05))
+    values['cell'] = cell_id(values['latitude'], values['longitude'])
+    return values
+
+
+def artist_values(rng, number):
+    name = f'{rng.choice(ADJECTIVES)} {rng.choice(ARTIST_NOUNS)} {number}'
+    values = _common(rng, name, f'artist{number}')
+    values.update(seeking_venue=rng.random() < 0.5)
+    return values
+
+
+def _slots(start, start_time, end_time):
+    # bits of the half hours of the window from start_time to end_time
+    first = max((start_time - start) // SLOT, 0)
+    last = min(-(-(end_time - start) // SLOT), WINDOW_SLOTS)
+    return ((1 << (last - first)) - 1) << first if last > first else 0
+
+
+def booked_slots(start):
+    # ({venue_id: bits}, {artist_id: bits}) of the shows already booked in
+    # the window starting at `start`
+    booked = defaultdict(int), defaultdict(int)
+    for venue_id, artist_id, start_time, end_time in db.session.execute(
+            db.select(Booking.venue_id, Booking.artist_id, Booking.start_time,
+                      Booking.end_time)
+            .where(Booking.end_time > start,
+                   Booking.start_time < start + WINDOW_SLOTS * SLOT)):
+        slots = _slots(start, start_time, end_time)
+        booked[0][venue_id] |= slots
+        booked[1][artist_id] |= slots
+    return booked
+
+
+def show_values(rng, venue_ids, artist_ids, start, booked):
+    # a show at a time its venue and its artist are both free (`booked`,
+    # updated), None after SHOW_TRIES draws without one
+    venue_slots, artist_slots = booked
+    show_mask = (1 << SHOW_SLOTS) - 1
+    for _ in range(SHOW_TRIES):
+        venue_id, artist_id = rng.choice(venue_ids), rng.choice(artist_ids)
+        slot = rng.randrange(WINDOW_SLOTS - SHOW_SLOTS + 1)
+        if (venue_slots[venue_id] | artist_slots[artist_id]) >> slot \
+                & show_mask:
+            continue
+        venue_slots[venue_id] |= show_mask << slot
+        artist_slots[artist_id] |= show_mask << slot
+        start_time = start + slot * SLOT
+        return {'venue_id': venue_id, 'artist_id': artist_id,
+                'start_time': start_time,
+                'end_time': start_time + SHOW_DURATION}
+    return None
+
+
+def _insert(model, rows, batch_size, on_batch):
+    # returns the number of rows inserted
+    inserted = 0
+    batch = []
+    for row in rows:
+        inserted += 1
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(insert(model), batch)
+            db.session.commit()
+            on_batch(model, len(batch))
+            batch = []
+    if batch:
+        db.session.execute(insert(model), batch)
+        db.session.commit()
+        on_batch(model, len(batch))
+    return inserted
+
+
+def _ids(model):
+    return list(db.session.scalars(db.select(model.id)))
+
+
+def seed(venues=0, artists=0, shows=0, batch_size=5000, random_seed=None,
+         on_batch=lambda model, count: None):
+    # on_batch(model, count) is called after every committed batch; returns
+    # the number of shows seeded, fewer than `shows` when the venues and
+    # artists have no free time left for some
+    rng = random.Random(random_seed)
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    first = db.session.scalar(db.select(db.func.count(Venue.id)))
+    _insert(Venue, (venue_values(rng, first + n) for n in range(venues)),
+            batch_size, on_batch)
+    first = db.session.scalar(db.select(db.func.count(Artist.id)))
+    _insert(Artist, (artist_values(rng, first + n) for n in range(artists)),
+            batch_size, on_batch)
+    if venues or artists:
+        queue_match_rebuild()
+        refresh_genre_counts()
+        db.session.commit()
+    if shows:
+        venue_ids, artist_ids = _ids(Venue), _ids(Artist)
+        if not venue_ids or not artist_ids:
+            raise ValueError('shows need at least one venue and one artist')
+        start = now - SINCE
+        booked = booked_slots(start)
+        rows = (show_values(rng, venue_ids, artist_ids, start, booked)
+                for _ in range(shows))
+        shows = _insert(Show, (row for row in rows if row is not None),
+                        batch_size, on_batch)
+        refresh_all_show_counters()
+        db.session.commit()
+    return shows
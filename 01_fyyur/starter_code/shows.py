@@ -0,0 +1,139 @@
+from flask import (
+    Blueprint,
+    render_template,
+    request,
+    flash,
+    redirect,
+    url_for
+)
+
+from forms import Genre, ShowForm, ShowBatchForm, VenueForm
+from models import db
+from queries import (
+    SHOW_FILTERS,
+    shows_page,
+    page_args,
+    show_filters,
+    shows_validators
+)
+from bookings import (
+    BookingError,
+    create_show,
+    create_shows as book_shows,
+    parse_show_lines
+)
+from cache import page_cache
+from conditional import conditional
+
+#----------------------------------------------------------------------------#
+# Show pages.
+#----------------------------------------------------------------------------#
+
+shows_bp = Blueprint('shows', __name__)
+
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@shows_bp.route('/shows')
+@conditional(shows_validators)
+def shows():
+    # displays list of shows at /shows
+    # TODO: replace with real venues data.
+  # num_shows should be aggregated based on
+  # number of upcoming shows per venue.
+  # one keyset page of the upcoming shows, or of the shows matching the
+  # filters, ordered by start_time
+  after, limit = page_args()
+  query, next_after = shows_page(show_filters(request.args), after, limit)
+  return render_template('pages/shows.html',
+                         **shows_template_context(query, next_after, limit))
+
+
+def shows_template_context(rows, next_after, limit):
+  # shared with the async /shows of asgi.py
+  data = []
+  for d in rows:
+      each_show_data = {
+          "Show.id": d.id,
+          "start_time": d.start_time,
+          "artist_id": d.artist_id,
+          "artist_name": d.artist_name,
+          "artist_image_link": d.artist_image_link,
+          "venue_id": d.venue_id,
+          "venue_name": d.venue_name,
+      }
+      data.append(each_show_data)
+  # as typed, for the filter form and the next page link
+  filters = {name: request.args[name] for name in SHOW_FILTERS
+             if request.args.get(name)}
+  return dict(shows=data, filters=filters, next_after=next_after,
+              limit=limit, states=VenueForm.state_choices,
+              genres=[genre.value for genre in Genre])
+
+
+@shows_bp.route('/shows/create')
+def create_shows():
+    # renders form. do not touch.
+    form = ShowForm()
+    return render_template('forms/new_show.html', form=form)
+
+
+@shows_bp.route('/shows/create', methods=['POST'])
+def create_show_submission():
+  # called to create new shows in the db,
+  # upon submitting new show listing form
+  # a single INSERT, the foreign keys of Show validate both IDs
+  form = ShowForm(request.form, meta={'csrf': False})
+  try:
+      artist_id = int(form.artist_id.data)
+  except (TypeError, ValueError):
+      flash('Artist ID not valid')
+      return render_template('forms/new_show.html', form=ShowForm())
+  try:
+      venue_id = int(form.venue_id.data)
+  except (TypeError, ValueError):
+      flash('Venue ID not valid')
+      return render_template('forms/new_show.html', form=ShowForm())
+  if form.start_time.data is None:
+      flash('An error occurred. Show could not be listed.')
+      return render_template('forms/new_show.html', form=ShowForm())
+  # a double booking is refused by the database, see bookings.py
+  try:
+      create_show(artist_id, venue_id, form.start_time.data,
+                  form.duration.data)
+  except BookingError as e:
+      flash(str(e))
+      return render_template('forms/new_show.html', form=ShowForm())
+  finally:
+      db.session.close()
+  page_cache.invalidate('venues', f'venue:{venue_id}', f'artist:{artist_id}')
+  # on successful db insert, flash success
+  flash('Show was successfully listed!')
+  return render_template('pages/home.html')
+
+
+@shows_bp.route('/venues/<int:venue_id>/shows/create', methods=['GET'])
+def create_shows_batch(venue_id):
+    form = ShowBatchForm()
+    return render_template('forms/new_shows_batch.html', form=form,
+                           venue_id=venue_id)
+
+
+@shows_bp.route('/venues/<int:venue_id>/shows/create', methods=['POST'])
+def create_shows_batch_submission(venue_id):
+    # a whole season at one venue, in one INSERT and one transaction
+    form = ShowBatchForm(request.form, meta={'csrf': False})
+    try:
+        shows = parse_show_lines(form.shows.data or '')
+        count = book_shows(venue_id, shows)
+    except BookingError as e:
+        flash(str(e))
+        return render_template('forms/new_shows_batch.html', form=form,
+                               venue_id=venue_id)
+    finally:
+        db.session.close()
+    page_cache.invalidate('venues', f'venue:{venue_id}',
+                          *[f'artist:{artist_id}' for artist_id, *_ in shows])
+    flash(f'{count} shows were successfully listed!')
+    return redirect(url_for('venues.show_venue', venue_id=venue_id))
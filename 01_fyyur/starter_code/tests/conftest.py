@@ -0,0 +1,162 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, text
+
+from app import create_app
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Fixtures.
+#----------------------------------------------------------------------------#
+
+# The suite runs against an in-memory SQLite database, or against Postgres
+# with TEST_DATABASE_URL=postgresql://... (the database is emptied).
+#
+# Every route has a query budget: the most SQL statements one request may
+# run. Budgets do not depend on the amount of data, so a loop issuing one
+# query per row (an N+1) fails the test of its route instead of slowing
+# down production. The page cache is off in the testing profile, budgets
+# are for uncached requests.
+
+QUERY_BUDGETS = {
+    'index': 0,
+    'metrics': 0,
+    'static': 0,
+    # conditional request validators + the page query, with the genre facets
+    'venues.venues': 2,
+    'artists.artists': 2,
+    # validators, row, upcoming and past shows, matches
+    'venues.show_venue': 5,
+    'artists.show_artist': 5,
+    'shows.shows': 2,
+    # validators, the venues in up to three widening boxes, the nearest ones
+    'venues.nearby_venues': 5,
+    # rows with the genre facets + total count
+    'venues.search_venues': 2,
+    'artists.search_artists': 2,
+    'venues.create_venue_form': 0,
+    'artists.create_artist_form': 0,
+    'shows.create_shows': 0,
+    'shows.create_shows_batch': 0,
+    # insert (+ match queue, genre counts), plus the show counters for shows
+    'venues.create_venue_submission': 3,
+    'artists.create_artist_submission': 3,
+    'shows.create_show_submission': 3,
+    'shows.create_shows_batch_submission': 3,
+    'venues.edit_venue': 1,
+    'artists.edit_artist': 1,
+    # load, update, match queue, genre counts, related ids for the page cache
+    'venues.edit_venue_submission': 5,
+    'artists.edit_artist_submission': 5,
+    # name, row, artists of its shows (twice: page cache and counters),
+    # delete, artist counters, match queue, deletion stamp, genre counts
+    'venues.delete_venue': 9,
+    'api.venues': 1,
+    'api.artists': 1,
+    'api.shows': 1,
+    'api.search_venues': 2,
+    'api.search_artists': 2,
+    'api.show_venue': 4,
+    'api.show_artist': 4,
+    'api.create_venue_shows': 3,
+    # one lookup in the gist indexes of Booking
+    'api.show_conflicts': 1,
+    'api.export_entity': 1,
+}
+
+
+def _venue(i, **values):
+    return Venue(**dict(
+        name=f'The Musical Hop {i}', city='San Francisco', state='CA',
+        address=f'{i} Valencia St', phone='123-123-1234',
+        genres=['Jazz', 'Reggae'], image_link='https://example.com/v.png',
+        facebook_link='https://www.facebook.com/TheMusicalHop',
+        website='https://www.themusicalhop.com', seeking_talent=True,
+        seeking_description='Looking for local artists'), **values)
+
+
+def _artist(i, **values):
+    return Artist(**dict(
+        name=f'Guns N Petals {i}', city='San Francisco', state='CA',
+        phone='326-123-5000', genres=['Rock n Roll'],
+        image_link='https://example.com/a.png',
+        facebook_link='https://www.facebook.com/GunsNPetals',
+        website='https://www.gunsnpetalsband.com', seeking_venue=True,
+        seeking_description='Looking for shows'), **values)
+
+
+def seed(venues=3, artists=3, shows_per_venue=4):
+    # every venue gets past and upcoming shows of every artist, three
+    # hours after those of the venue before so no artist is double-booked
+    now = datetime.now()
+    venue_rows = [_venue(i) for i in range(venues)]
+    artist_rows = [_artist(i) for i in range(artists)]
+    db.session.add_all(venue_rows + artist_rows)
+    db.session.flush()
+    for i, venue in enumerate(venue_rows):
+        for n in range(shows_per_venue):
+            artist = artist_rows[n % artists]
+            days = (n - shows_per_venue // 2) * 7 + 1
+            start_time = now + timedelta(days=days, hours=3 * i)
+            db.session.add(Show(venue_id=venue.id, artist_id=artist.id,
+                                start_time=start_time))
+    db.session.commit()
+    return venue_rows, artist_rows
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+            db.session.execute(text(
+                'CREATE EXTENSION IF NOT EXISTS btree_gist'))
+            db.session.commit()
+        db.drop_all()
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def data(app):
+    venues, artists = seed()
+    return {'venue_ids': [venue.id for venue in venues],
+            'artist_ids': [artist.id for artist in artists]}
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context,
+                 executemany):
+        self.statements.append(statement)
+
+    @contextmanager
+    def budget(self, endpoint):
+        # fails when the block runs more statements than the endpoint may
+        start = len(self.statements)
+        yield
+        used = self.statements[start:]
+        limit = QUERY_BUDGETS[endpoint]
+        if len(used) > limit:
+            pytest.fail(f'{endpoint} ran {len(used)} queries, its budget is '
+                        f'{limit}:\n' + '\n'.join(used), pytrace=False)
+
+
+@pytest.fixture
+def queries(app):
+    counter = QueryCounter()
+    event.listen(db.engine, 'before_cursor_execute', counter)
+    yield counter
+    event.remove(db.engine, 'before_cursor_execute', counter)
@@ -0,0 +1,116 @@
+import pytest
+
+from models import Show
+from conftest import seed
+
+
+@pytest.mark.parametrize('path, endpoint', [
+    ('/api/v1/venues', 'api.venues'),
+    ('/api/v1/artists', 'api.artists'),
+    ('/api/v1/shows', 'api.shows'),
+])
+@pytest.mark.parametrize('venues', [3, 30])
+def test_listings(client, queries, path, endpoint, venues):
+    seed(venues=venues)
+    with queries.budget(endpoint):
+        response = client.get(path + '?limit=10')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert len(body['data']) == 10 or body['next_after'] is None
+
+
+def test_listing_fields(client, data):
+    body = client.get('/api/v1/venues?fields=id,name').get_json()
+    assert set(body['data'][0]) == {'id', 'name'}
+    response = client.get('/api/v1/venues?fields=password')
+    assert response.status_code == 400
+    assert 'password' in response.get_json()['error']
+
+
+def test_listing_pages(client, data):
+    first = client.get('/api/v1/venues?limit=2').get_json()
+    second = client.get('/api/v1/venues?limit=2&after='
+                        + first['next_after']).get_json()
+    assert [venue['id'] for venue in first['data'] + second['data']] \
+        == data['venue_ids']
+    assert client.get('/api/v1/venues?after=xx').status_code == 400
+
+
+@pytest.mark.parametrize('path, endpoint', [
+    ('/api/v1/venues/search?search_term=hop', 'api.search_venues'),
+    ('/api/v1/artists/search?search_term=petals', 'api.search_artists'),
+])
+def test_search(client, queries, data, path, endpoint):
+    with queries.budget(endpoint):
+        body = client.get(path).get_json()
+    assert body['count'] == 3
+
+
+@pytest.mark.parametrize('entity, endpoint', [
+    ('venues', 'api.show_venue'),
+    ('artists', 'api.show_artist'),
+])
+def test_detail(client, queries, data, entity, endpoint):
+    entity_id = data[entity[:-1] + '_ids'][0]
+    with queries.budget(endpoint):
+        body = client.get(f'/api/v1/{entity}/{entity_id}').get_json()
+    assert body['id'] == entity_id
+    assert len(body['upcoming_shows']) == body['upcoming_shows_count']
+    assert client.get(f'/api/v1/{entity}/9999').status_code == 404
+
+
+def test_create_venue_shows(client, queries, data):
+    venue_id = data['venue_ids'][0]
+    shows = [{'artist_id': artist_id, 'start_time': f'2035-01-0{day}T20:00'}
+             for day, artist_id in enumerate(data['artist_ids'], 1)]
+    with queries.budget('api.create_venue_shows'):
+        response = client.post(f'/api/v1/venues/{venue_id}/shows', json=shows)
+    assert response.status_code == 201
+    assert response.get_json() == {'created': 3}
+    response = client.post('/api/v1/venues/9999/shows', json=shows)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Venue ID not valid'}
+    assert client.post(f'/api/v1/venues/{venue_id}/shows',
+                       json={'artist_id': 1}).status_code == 400
+    assert Show.query.count() == 15
+
+
+def test_show_conflicts(client, queries, data):
+    venue_id, artist_id = data['venue_ids'][0], data['artist_ids'][0]
+    client.post(f'/api/v1/venues/{venue_id}/shows', json=[
+        {'artist_id': artist_id, 'start_time': '2035-01-01T20:00',
+         'minutes': 90}])
+    with queries.budget('api.show_conflicts'):
+        body = client.get(f'/api/v1/shows/conflicts?venue_id={venue_id}'
+                          '&start_time=2035-01-01T21:00').get_json()
+    assert body['available'] is False
+    assert [(show['venue_id'], show['artist_id'], show['end_time'])
+            for show in body['conflicts']] \
+        == [(venue_id, artist_id, '2035-01-01T21:30:00')]
+    other_venue = data['venue_ids'][1]
+    body = client.get(f'/api/v1/shows/conflicts?venue_id={other_venue}'
+                      f'&artist_id={artist_id}&start_time=2035-01-01T18:00'
+                      '&end_time=2035-01-01T20:30').get_json()
+    assert len(body['conflicts']) == 1
+    body = client.get(f'/api/v1/shows/conflicts?venue_id={venue_id}'
+                      '&start_time=2035-01-01T21:30&minutes=60').get_json()
+    assert body == {'available': True, 'conflicts': []}
+
+
+@pytest.mark.parametrize('query', [
+    'start_time=2035-01-01T20:00', 'venue_id=1&start_time=tonight',
+    'venue_id=x&start_time=2035-01-01T20:00',
+    'venue_id=1&start_time=2035-01-01T20:00&end_time=2035-01-01T19:00',
+    'venue_id=1&start_time=2035-01-01T20:00&minutes=0'])
+def test_show_conflicts_invalid(client, data, query):
+    assert client.get('/api/v1/shows/conflicts?' + query).status_code == 400
+
+
+@pytest.mark.parametrize('format', ['csv', 'ndjson'])
+def test_export(client, queries, data, format):
+    with queries.budget('api.export_entity'):
+        response = client.get(f'/api/export/shows?format={format}')
+        body = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert len(body.strip().splitlines()) == 12 + (format == 'csv')
+    assert client.get('/api/export/users').status_code == 404
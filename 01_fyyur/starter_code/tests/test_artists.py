@@ -0,0 +1,93 @@
+import pytest
+
+from models import db, Artist
+from conftest import seed
+
+ARTIST_FORM = {
+    'name': 'The Wild Sax Band', 'city': 'San Francisco', 'state': 'CA',
+    'phone': '432-325-5432', 'genres': ['Jazz', 'Classical'],
+    'image_link': 'https://example.com/sax.png',
+    'facebook_link': 'https://www.facebook.com/wildsax',
+    'website': 'https://www.wildsaxband.com',
+    'seeking_venue': 'y', 'seeking_description': 'Gigs',
+}
+
+
+@pytest.mark.parametrize('artists', [3, 60])
+def test_artists_query_budget_does_not_grow(app, client, queries, artists):
+    seed(venues=2, artists=artists, shows_per_venue=artists)
+    with queries.budget('artists.artists'):
+        response = client.get('/artists?limit=50')
+    assert response.status_code == 200
+    assert response.data.count(b'Guns N Petals') == min(artists, 50)
+
+
+def test_artists_next_page(client, data):
+    first = client.get('/artists?limit=2').get_data(as_text=True)
+    assert 'Guns N Petals 1' in first and 'Guns N Petals 2' not in first
+    start = first.index('/artists?after=')
+    url = first[start:first.index('"', start)].replace('&amp;', '&')
+    second = client.get(url).get_data(as_text=True)
+    assert 'Guns N Petals 2' in second and 'Guns N Petals 0' not in second
+
+
+def test_invalid_cursor(client, data):
+    assert client.get('/artists?after=not-a-cursor').status_code == 400
+
+
+@pytest.mark.parametrize('shows_per_venue', [4, 40])
+def test_show_artist(client, queries, shows_per_venue):
+    venues, artists = seed(artists=1, shows_per_venue=shows_per_venue)
+    artist_id = artists[0].id
+    with queries.budget('artists.show_artist'):
+        response = client.get(f'/artists/{artist_id}')
+    assert response.status_code == 200
+    upcoming = len(venues) * (shows_per_venue - shows_per_venue // 2)
+    assert f'{upcoming} Upcoming Shows'.encode() in response.data
+
+
+def test_show_artist_missing(client, data):
+    assert client.get('/artists/9999').status_code == 404
+
+
+def test_search_artists(client, queries, data):
+    with queries.budget('artists.search_artists'):
+        response = client.post('/artists/search',
+                               data={'search_term': 'petals'})
+    assert response.status_code == 200
+    assert response.data.count(b'Guns N Petals') == 3
+
+
+def test_artists_genre_filter_and_facets(client, queries, data):
+    db.session.get(Artist, data['artist_ids'][0]).genres = ['Jazz']
+    db.session.commit()
+    with queries.budget('artists.artists'):
+        body = client.get('/artists?genre=Jazz').get_data(as_text=True)
+    assert body.count('Guns N Petals') == 1 and 'Jazz (1)' in body
+    body = client.get('/artists').get_data(as_text=True)
+    assert 'Jazz (1)' in body and 'Rock n Roll (2)' in body
+    with queries.budget('artists.search_artists'):
+        response = client.post('/artists/search', data={
+            'search_term': 'petals', 'genre': 'Rock n Roll'})
+    assert response.data.count(b'Guns N Petals') == 2
+
+
+def test_create_artist(client, queries, data):
+    assert client.get('/artists/create').status_code == 200
+    with queries.budget('artists.create_artist_submission'):
+        response = client.post('/artists/create', data=ARTIST_FORM)
+    assert response.status_code == 200
+    artist = Artist.query.filter_by(name='The Wild Sax Band').one()
+    assert artist.seeking_venue is True
+
+
+def test_edit_artist(client, queries, data):
+    artist_id = data['artist_ids'][0]
+    with queries.budget('artists.edit_artist'):
+        response = client.get(f'/artists/Edite_by_ID/{artist_id}')
+    assert response.status_code == 200
+    with queries.budget('artists.edit_artist_submission'):
+        response = client.post(f'/artists/Edite_by_ID/{artist_id}',
+                               data=dict(ARTIST_FORM, name='Renamed'))
+    assert response.status_code == 302
+    assert db.session.get(Artist, artist_id).name == 'Renamed'
@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+import config
+from app import _set_connect_args, create_app
+from sqlalchemy import event
+
+from models import db
+from conftest import seed
+
+pytest.importorskip('aiosqlite')
+
+from asgi import AsyncApp, create_engines  # noqa: E402
+
+
+@pytest.fixture
+def asgi_app(monkeypatch, tmp_path):
+    # the async engine needs a database file, it cannot share an in-memory
+    # database with the WSGI app
+    url = config.TestingConfig.SQLALCHEMY_DATABASE_URI
+    if url == 'sqlite://':
+        monkeypatch.setattr(config.TestingConfig, 'SQLALCHEMY_DATABASE_URI',
+                            f'sqlite:///{tmp_path}/fyyur.db')
+    app = create_app('testing')
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed()
+        db.session.remove()
+    yield AsyncApp(app)
+    with app.app_context():
+        db.drop_all()
+
+
+def request(asgi_app, method, url, body=b'', headers=()):
+    # Returns (status, headers, body) of one request to the ASGI app.
+    path, _, query = url.partition('?')
+    scope = {'type': 'http', 'method': method, 'path': path,
+             'query_string': query.encode(), 'http_version': '1.1',
+             'headers': [(b'host', b'localhost'), *headers]}
+    if body:
+        scope['headers'].append(
+            (b'content-type', b'application/x-www-form-urlencoded'))
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(asgi_app(scope, receive, send))
+    return (messages[0]['status'], dict(messages[0]['headers']),
+            messages[1]['body'])
+
+
+@pytest.mark.parametrize('method, url, form', [
+    ('GET', '/venues', None),
+    ('GET', '/venues/1', None),
+    ('GET', '/venues?genre=Jazz', None),
+    ('GET', '/artists?limit=2', None),
+    ('GET', '/artists/2', None),
+    ('GET', '/shows?city=San+Francisco', None),
+    ('POST', '/venues/search', 'search_term=hop'),
+    ('POST', '/artists/search', 'search_term=petals&genre=Rock+n+Roll'),
+    ('GET', '/', None),
+    ('GET', '/api/v1/shows', None),
+])
+def test_pages_match_the_wsgi_app(asgi_app, method, url, form):
+    status, _, body = request(asgi_app, method, url,
+                              (form or '').encode())
+    expected = asgi_app.flask_app.test_client().open(
+        url, method=method, data=form,
+        content_type='application/x-www-form-urlencoded')
+    assert status == expected.status_code == 200
+    assert body == expected.data
+
+
+def test_conditional_get(asgi_app):
+    status, headers, _ = request(asgi_app, 'GET', '/venues/1')
+    status, _, body = request(asgi_app, 'GET', '/venues/1', headers=[
+        (b'if-none-match', headers[b'etag'])])
+    assert (status, body) == (304, b'')
+
+
+@pytest.mark.parametrize('url, status', [
+    ('/venues/9999', 404),
+    ('/artists?after=not-a-cursor', 400),
+    ('/shows?from=tomorrow', 400),
+])
+def test_errors(asgi_app, url, status):
+    assert request(asgi_app, 'GET', url)[0] == status
+
+
+class Connected(Exception):
+    pass
+
+
+def _connect_params(engine, connect):
+    # the parameters the driver is called with, without reaching a server
+    params = {}
+
+    @event.listens_for(engine, 'do_connect')
+    def capture(dialect, connection_record, cargs, cparams):
+        params.update(cparams)
+        raise Connected()
+
+    with pytest.raises(Connected):
+        connect()
+    return params
+
+
+def test_each_driver_gets_its_own_timeouts(monkeypatch):
+    url = 'postgresql://fyyur@127.0.0.1:1/fyyur'
+    monkeypatch.setattr(config.TestingConfig, 'SQLALCHEMY_DATABASE_URI', url)
+    monkeypatch.setattr(config.TestingConfig, 'DATABASE_REPLICA_URL',
+                        url + '_replica', raising=False)
+    app = create_app('testing')
+    with app.app_context():
+        params = _connect_params(db.engine, db.engine.connect)
+    assert params['connect_timeout'] == app.config['DATABASE_CONNECT_TIMEOUT']
+    assert params['options'] == '-c statement_timeout=%d' % \
+        app.config['DATABASE_STATEMENT_TIMEOUT']
+    binds = dict(app.config, SQLALCHEMY_BINDS={'replica': {'url': url}})
+    _set_connect_args(binds)
+    assert binds['SQLALCHEMY_BINDS']['replica']['connect_args'] == \
+        app.config['SQLALCHEMY_ENGINE_OPTIONS']['connect_args']
+    for engine in create_engines(app.config).values():
+        async def connect():
+            async with engine.connect():
+                pass
+        params = _connect_params(engine.sync_engine,
+                                 lambda: asyncio.run(connect()))
+        assert 'connect_timeout' not in params and 'options' not in params
+        assert params['timeout'] == app.config['DATABASE_CONNECT_TIMEOUT']
+        assert params['server_settings'] == {'statement_timeout': str(
+            app.config['DATABASE_STATEMENT_TIMEOUT'])}
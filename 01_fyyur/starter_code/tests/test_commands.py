@@ -0,0 +1,138 @@
+from datetime import datetime, timedelta
+
+import commands
+import export
+import importer
+from models import db, Venue, Artist, Show, GenreCount, genre_count_drift
+
+
+def test_import_and_export(app, tmp_path, data):
+    path = tmp_path / 'shows.csv'
+    path.write_text('artist_id,venue_id,start_time\n'
+                    f"{data['artist_ids'][0]},{data['venue_ids'][0]},"
+                    '2035-01-01T20:00\n'
+                    f"9999,{data['venue_ids'][0]},2035-01-01T20:00\n")
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['import', 'shows', str(path)])
+    assert '1 shows imported, 1 records rejected' in result.output
+    assert db.session.get(Venue, data['venue_ids'][0]).upcoming_shows_count == 3
+
+    result = runner.invoke(args=['export', 'shows', '--format', 'ndjson'])
+    assert len(result.output.splitlines()) == 13
+
+
+def test_export_then_import_shows(app, tmp_path, data):
+    # times as the forms take them, to the second
+    for show in Show.query:
+        show.start_time = show.start_time.replace(microsecond=0)
+        show.end_time = show.start_time + timedelta(hours=2)
+    show.end_time = show.start_time + timedelta(minutes=45)
+    db.session.commit()
+    shows = {(show.artist_id, show.venue_id, show.start_time, show.end_time)
+             for show in Show.query}
+    runner = app.test_cli_runner()
+    path = tmp_path / 'shows.csv'
+    result = runner.invoke(args=['export', 'shows', '-o', str(path)])
+    assert result.exit_code == 0
+    Show.query.delete()
+    db.session.commit()
+    result = runner.invoke(args=['import', 'shows', str(path)])
+    assert f'{len(shows)} shows imported, 0 records rejected' in result.output
+    assert {(show.artist_id, show.venue_id, show.start_time, show.end_time)
+            for show in Show.query} == shows
+
+
+def test_import_json_reports_malformed_records(app, tmp_path, data):
+    artist_id, venue_id = data['artist_ids'][0], data['venue_ids'][0]
+    path = tmp_path / 'shows.json'
+    path.write_text(
+        f'[{{"artist_id": {artist_id}, "venue_id": {venue_id}, '
+        f'"start_time": "2035-01-01T20:00"}},\n'
+        f'{{"artist_id": {artist_id}, "venue_id": oops}},\n'
+        f'{{"artist_id": {artist_id}, "venue_id": {venue_id}, '
+        f'"start_time": "2035-01-02T20:00", "note": "a, b ] {{"}}]')
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['import', 'shows', str(path)])
+    assert result.exit_code == 0
+    assert '2 shows imported, 1 records rejected' in result.output
+    position = path.read_text().index('oops')
+    assert (f':2: invalid JSON at character {position}: Expecting value'
+            in result.output)
+
+    path.write_text('{"artist_id": 1}')
+    result = runner.invoke(args=['import', 'shows', str(path)])
+    assert result.exit_code == 1
+    assert 'expected a JSON array' in result.output
+    assert 'Traceback' not in result.output
+
+
+def test_rollover(app, data):
+    venue_id = data['venue_ids'][0]
+    show = Show.query.filter_by(venue_id=venue_id).filter(
+        Show.start_time > datetime.now()).order_by(Show.start_time).first()
+    # the next show of the venue starts
+    show.start_time = datetime.now() + timedelta(seconds=1)
+    db.session.commit()
+    db.session.execute(db.update(Show).where(Show.id == show.id).values(
+        start_time=datetime.now() - timedelta(seconds=1)))
+    db.session.execute(db.update(Venue).where(Venue.id == venue_id).values(
+        next_show_at=datetime.now() - timedelta(seconds=1)))
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['rollover'])
+    assert 'rolled over' in result.output
+    db.session.expire_all()
+    venue = db.session.get(Venue, venue_id)
+    assert (venue.upcoming_shows_count, venue.past_shows_count) == (1, 3)
+    assert venue.next_show_at > datetime.now()
+
+
+def test_recount(app, data):
+    db.session.execute(db.update(Artist).values(upcoming_shows_count=99))
+    db.session.execute(db.update(GenreCount).where(
+        GenreCount.table_name == 'Venue', GenreCount.genre == 'Jazz'
+    ).values(total=99))
+    db.session.commit()
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['recount', '--dry-run'])
+    assert '0 venues, 3 artists and 1 genre counts drifted' in result.output
+    assert 'Venue Jazz: genre count out of date' in result.output
+    result = runner.invoke(args=['recount'])
+    assert '0 venues, 3 artists and 1 genre counts repaired' in result.output
+    result = runner.invoke(args=['recount', '--dry-run'])
+    assert '0 venues, 0 artists and 0 genre counts drifted' in result.output
+
+
+def test_seed(app):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['seed', '--venues', '4', '--artists', '5',
+                                 '--shows', '30', '--seed', '1',
+                                 '--batch-size', '8'])
+    assert '4 venues, 5 artists and 30 shows seeded' in result.output
+    assert Show.query.count() == 30
+    # the counters are filled in after the bulk insert
+    assert sum(venue.upcoming_shows_count + venue.past_shows_count
+               for venue in Venue.query) == 30
+    result = runner.invoke(args=['recount', '--dry-run'])
+    assert '0 venues, 0 artists and 0 genre counts drifted' in result.output
+    # a year either side of now, around the shows already booked
+    result = runner.invoke(args=['seed', '--shows', '1000', '--seed', '1'])
+    assert result.exit_code == 0 and Show.query.count() > 1000
+    now = datetime.now()
+    times = [show.start_time for show in Show.query]
+    assert all(abs(start_time - now) < timedelta(days=366)
+               for start_time in times)
+    assert min(times) < now < max(times)
+
+
+def test_partitions_need_a_partitioned_show_table(app):
+    # the suite's tables come from create_all(), not from the migrations
+    result = app.test_cli_runner().invoke(args=['partitions'])
+    assert result.exit_code == 1
+    assert 'partitioned' in result.output
+
+
+def test_command_choices_follow_the_modules():
+    assert commands.ENTITIES == tuple(sorted(importer.ENTITIES)) \
+        == tuple(sorted(export.EXPORTS))
+    assert commands.FORMATS == tuple(sorted(export.FORMATS))
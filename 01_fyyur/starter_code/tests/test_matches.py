@@ -0,0 +1,160 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from matches import (
+    VENUES,
+    ARTISTS,
+    features,
+    rebuild_matches,
+    refresh_matches,
+    scores
+)
+from cache import page_cache
+from models import db, Venue, Artist, ArtistMatch, VenueMatch, MatchQueue
+from seed import seed as seed_random
+
+K = 6
+
+
+def _lists():
+    # {(side, owner): scores, best first}
+    lists = {}
+    for side in (VENUES, ARTISTS):
+        for owner, score in db.session.execute(
+                db.select(side.owner, side.match.score)
+                .order_by(side.owner, side.match.score.desc())):
+            lists.setdefault((side.name, owner), []).append(
+                round(score, 4))
+    return lists
+
+
+def test_scores_prefer_genre_and_proximity():
+    venue = features([(1, ['Jazz'], 37.77, -122.42)])
+    artists = features([(1, ['Jazz'], 37.80, -122.27),
+                        (2, ['Jazz'], 40.71, -74.01),
+                        (3, ['Folk'], 37.80, -122.27),
+                        (4, ['Folk'], 40.71, -74.01),
+                        (5, ['Jazz'], None, None)])
+    same, far, other_genre, nothing, unknown = scores(venue, artists)[0]
+    assert same > far > other_genre > nothing
+    assert nothing < 0.01
+    assert far == pytest.approx(unknown, abs=1e-6) == pytest.approx(0.7)
+
+
+def test_refresh_matches_as_rebuild(app):
+    seed_random(venues=60, artists=80, random_seed=3)
+    assert refresh_matches(K) is None
+    db.session.commit()
+    assert MatchQueue.query.count() == 0
+    assert _lists()
+
+    venues = Venue.query.filter_by(seeking_talent=True).order_by(
+        Venue.id).all()
+    artists = Artist.query.filter_by(seeking_venue=True).order_by(
+        Artist.id).all()
+    venues[0].genres = ['Folk', 'Blues']
+    venues[1].city, venues[1].state = 'Seattle', 'WA'
+    venues[2].seeking_talent = False
+    db.session.delete(venues[3])
+    artists[0].genres = ['Jazz']
+    artists[1].city, artists[1].state = 'Austin', 'TX'
+    db.session.delete(artists[2])
+    db.session.add(Artist(
+        name='New Band', city='San Francisco', state='CA', phone='1',
+        genres=['Jazz', 'Funk'], image_link='x', facebook_link='x',
+        website='x', seeking_venue=True))
+    db.session.commit()
+    assert MatchQueue.query.count() == 8
+
+    written = refresh_matches(K)
+    db.session.commit()
+    assert written[VENUES] and written[ARTISTS]
+    refreshed = _lists()
+    rebuild_matches(K)
+    db.session.commit()
+    assert refreshed == _lists()
+    assert all(len(scores) <= K for scores in refreshed.values())
+
+
+def test_only_matched_changes_are_queued(app, data):
+    venue = db.session.get(Venue, data['venue_ids'][0])
+    artist = db.session.get(Artist, data['artist_ids'][0])
+    MatchQueue.query.delete()
+    venue.phone, venue.image_link = '555-555-5555', 'https://example.com/v'
+    artist.seeking_description = 'Touring in the spring'
+    db.session.commit()
+    assert MatchQueue.query.count() == 0
+    venue.seeking_talent = not venue.seeking_talent
+    artist.genres = ['Jazz']
+    db.session.commit()
+    assert {(row.venue_id, row.artist_id) for row in MatchQueue.query} \
+        == {(venue.id, None), (None, artist.id)}
+
+
+def test_failed_flushes_are_not_queued(app, data):
+    artist = db.session.get(Artist, data['artist_ids'][0])
+    MatchQueue.query.delete()
+    db.session.commit()
+    # a venue without a city fails its flush
+    db.session.add(Venue(name='Nowhere', state='CA', address='1 Main St'))
+    with pytest.raises(IntegrityError):
+        db.session.flush()
+    db.session.rollback()
+    artist.genres = ['Jazz']
+    db.session.commit()
+    assert {(row.venue_id, row.artist_id) for row in MatchQueue.query} \
+        == {(None, artist.id)}
+
+
+def test_edits_expire_the_pages_matching_them(app, client, data, monkeypatch):
+    # matched, without a show at any of the venues
+    form = {'name': 'Lonely', 'city': 'San Francisco', 'state': 'CA',
+            'phone': '415-000-0000', 'genres': ['Jazz'],
+            'image_link': 'https://example.com/lonely.png',
+            'facebook_link': 'https://www.facebook.com/lonely',
+            'website': 'https://www.lonely.com', 'seeking_venue': 'y'}
+    client.post('/artists/create', data=form)
+    artist_id = Artist.query.filter_by(name='Lonely').one().id
+    app.test_cli_runner().invoke(args=['matches'])
+    venue_ids = {row.venue_id for row in
+                 VenueMatch.query.filter_by(artist_id=artist_id)}
+    assert venue_ids
+    invalidated = []
+    monkeypatch.setattr(page_cache, 'invalidate',
+                        lambda *namespaces: invalidated.extend(namespaces))
+    client.post(f'/artists/Edite_by_ID/{artist_id}',
+                data=dict(form, name='Renamed'))
+    assert {f'venue:{id}' for id in venue_ids} <= set(invalidated)
+    # and the other way round
+    venue = db.session.get(Venue, next(iter(venue_ids)))
+    form = {'name': 'Renamed', 'city': venue.city, 'state': venue.state,
+            'address': venue.address, 'phone': '415-000-0001',
+            'genres': venue.genres, 'image_link': venue.image_link,
+            'facebook_link': venue.facebook_link, 'website': venue.website,
+            'seeking_talent': 'y'}
+    artist_ids = {row.artist_id for row in
+                  ArtistMatch.query.filter_by(venue_id=venue.id)}
+    assert artist_id in artist_ids
+    invalidated.clear()
+    client.post(f'/venues/Edite_by_ID/{venue.id}', data=form)
+    assert {f'artist:{id}' for id in artist_ids} <= set(invalidated)
+
+
+def test_matches_on_pages(app, client, queries, data):
+    venue_id, artist_id = data['venue_ids'][0], data['artist_ids'][0]
+    result = app.test_cli_runner().invoke(args=['matches'])
+    assert '3 venues and 3 artists matched' in result.output
+    # the seeded venues and artists are in San Francisco, with other genres
+    with queries.budget('venues.show_venue'):
+        page = client.get(f'/venues/{venue_id}').get_data(as_text=True)
+    assert 'Artists to Book' in page and '30% match' in page
+
+    db.session.get(Artist, artist_id).genres = ['Jazz']
+    db.session.commit()
+    result = app.test_cli_runner().invoke(args=['matches'])
+    assert '3 venues and 1 artists matched' in result.output
+    page = client.get(f'/venues/{venue_id}').get_data(as_text=True)
+    assert '79% match' in page
+    with queries.budget('artists.show_artist'):
+        page = client.get(f'/artists/{artist_id}').get_data(as_text=True)
+    assert 'Venues to Play' in page and '79% match' in page
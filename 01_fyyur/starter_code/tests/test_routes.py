@@ -0,0 +1,170 @@
+import importlib
+import time
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+import config
+from cache import PageCache
+from conditional import _http_date
+from models import db, Venue, Artist, Show, Deletion
+from queries import venue_validators, venues_validators, shows_validators
+from conftest import QUERY_BUDGETS
+from routing import reads_from_replica
+
+
+def test_every_route_has_a_query_budget(app):
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules()}
+    assert endpoints - set(QUERY_BUDGETS) == set()
+    assert set(QUERY_BUDGETS) - endpoints == set()
+
+
+def test_index(client, queries):
+    with queries.budget('index'):
+        assert client.get('/').status_code == 200
+
+
+def test_not_found(client):
+    response = client.get('/no/such/page')
+    assert response.status_code == 404
+    assert b'Back' in response.data
+
+
+def test_conditional_get(client, queries, data):
+    response = client.get('/venues')
+    etag = response.headers['ETag']
+    with queries.budget('venues.venues'):
+        response = client.get('/venues', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+
+def test_validators_follow_show_changes_and_deletes(app, data):
+    venue_id = data['venue_ids'][0]
+    show = Show.query.filter_by(venue_id=venue_id).order_by(
+        Show.start_time).first()
+    before = venue_validators(venue_id), venues_validators(), \
+        shows_validators()
+    # a past show changes without changing any count
+    show.end_time = show.start_time + (show.end_time - show.start_time) / 2
+    db.session.commit()
+    changed = venue_validators(venue_id)
+    assert changed[0] != before[0][0] and changed[1] > before[0][1]
+    db.session.delete(show)
+    db.session.commit()
+    after = venue_validators(venue_id)
+    assert after[0] != changed[0] and after[1] > changed[1]
+    # a venue gone: no updated_at is left to bump, its deletion is stamped
+    venue = Venue.query.filter(Venue.id != venue_id).first()
+    db.session.delete(venue)
+    db.session.commit()
+    for before, after in zip(before[1:], (venues_validators(),
+                                          shows_validators())):
+        assert after[0] != before[0] and after[1] > before[1]
+
+
+def test_failed_deletes_are_not_stamped(app, data):
+    stamped = {row.table_name: row.deleted_at for row in Deletion.query}
+    # the show is deleted by a flush failing on a venue without a city
+    db.session.delete(Show.query.first())
+    db.session.add(Venue(name='Nowhere', state='CA', address='1 Main St'))
+    with pytest.raises(IntegrityError):
+        db.session.flush()
+    db.session.rollback()
+    db.session.get(Artist, data['artist_ids'][0]).name = 'Renamed'
+    db.session.commit()
+    assert {row.table_name: row.deleted_at for row in Deletion.query} \
+        == stamped
+
+
+def test_validators_follow_the_other_side(app, data):
+    venue_id = data['venue_ids'][0]
+    before = venue_validators(venue_id)
+    db.session.get(Artist, data['artist_ids'][0]).name = 'Renamed'
+    db.session.commit()
+    assert venue_validators(venue_id)[0] != before[0]
+
+
+def test_http_date_reads_naive_timestamps_as_server_local_time(monkeypatch):
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    try:
+        assert _http_date(datetime(2035, 1, 1, 12)) \
+            == datetime(2035, 1, 1, 17, tzinfo=timezone.utc)
+        assert _http_date(datetime(2035, 7, 1, 12)) \
+            == datetime(2035, 7, 1, 16, tzinfo=timezone.utc)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+    assert _http_date(None) is None
+
+
+def test_metrics(client, queries, data):
+    client.get('/venues')
+    with queries.budget('metrics'):
+        response = client.get('/metrics')
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert ('fyyur_request_db_queries_count{endpoint="venues.venues",'
+            'method="GET"} 1') in body
+
+
+def test_failed_query_leaves_no_timing_behind(app, caplog):
+    app.config['SLOW_QUERY_MS'] = 0
+    connection = db.session.connection()
+    with pytest.raises(OperationalError):
+        connection.execute(text('SELECT * FROM no_such_table'))
+    db.session.rollback()
+    connection = db.session.connection()
+    connection.execute(text('SELECT 1'))
+    assert not any(key.startswith('metrics') for key in connection.info)
+    assert 'SELECT 1' in caplog.text
+
+
+def test_navbar_search_on_listing_search_and_detail_pages(client, data):
+    venue_id, artist_id = data['venue_ids'][0], data['artist_ids'][0]
+    # the search box of the navbar
+    for form, pages in (
+            (b'placeholder="Find a venue"',
+             [client.get('/venues'), client.get(f'/venues/{venue_id}'),
+              client.post('/venues/search', data={'search_term': 'hop'})]),
+            (b'placeholder="Find an artist"',
+             [client.get('/artists'), client.get(f'/artists/{artist_id}'),
+              client.post('/artists/search', data={'search_term': 'gun'})])):
+        for response in pages:
+            assert response.status_code == 200
+            assert form in response.data, response.request.path
+
+
+def test_page_cache_renders_from_primary_after_invalidation(app):
+    app.config.update(CACHE_ENABLED=True, DATABASE_REPLICA_LAG=5,
+                      DATABASE_REPLICA_URL='postgresql://replica/fyyur')
+    cache = PageCache(app)
+    reads = []
+
+    @cache.cached('venues')
+    def view():
+        reads.append('replica' if reads_from_replica() else 'primary')
+        return 'page'
+
+    for invalidate in (False, True, False):
+        if invalidate:
+            cache.invalidate('venues')
+        with app.test_request_context('/venues'):
+            assert view() == 'page'
+    # the page rendered after the write is cached and served
+    assert reads == ['replica', 'primary']
+
+
+def test_replica_needs_a_secret_key(monkeypatch):
+    monkeypatch.setenv('DATABASE_REPLICA_URL', 'postgresql://replica/fyyur')
+    monkeypatch.delenv('SECRET_KEY', raising=False)
+    try:
+        with pytest.raises(RuntimeError, match='SECRET_KEY'):
+            importlib.reload(config)
+        monkeypatch.setenv('SECRET_KEY', 'shared')
+        assert importlib.reload(config).SECRET_KEY == 'shared'
+    finally:
+        monkeypatch.undo()
+        importlib.reload(config)
@@ -0,0 +1,230 @@
+import random
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from geo import bounding_box, cell_id, cell_ranges, haversine_km
+from models import db, Venue, Artist, Show, GenreCount, genre_count_drift
+from conftest import seed
+
+VENUE_FORM = {
+    'name': 'The Dueling Pianos Bar', 'city': 'New York', 'state': 'NY',
+    'address': '335 Delancey Street', 'phone': '914-003-1132',
+    'genres': ['Classical', 'R&B'],
+    'image_link': 'https://example.com/pianos.png',
+    'facebook_link': 'https://www.facebook.com/pianos',
+    'website': 'https://www.theduelingpianos.com',
+    'seeking_talent': 'y', 'seeking_description': 'Pianists',
+}
+
+
+@pytest.mark.parametrize('venues', [3, 40])
+def test_venues_query_budget_does_not_grow(app, client, queries, venues):
+    seed(venues=venues, shows_per_venue=3)
+    with queries.budget('venues.venues'):
+        response = client.get('/venues')
+    assert response.status_code == 200
+    assert response.data.count(b'The Musical Hop') == venues
+
+
+def test_venues_grouped_by_area(app, client, data):
+    db.session.add(_new_venue('Lakeside', city='Austin', state='TX'))
+    db.session.commit()
+    page = client.get('/venues').get_data(as_text=True)
+    assert page.index('Austin') < page.index('San Francisco')
+
+
+def test_show_venue(client, queries, data):
+    venue_id = data['venue_ids'][0]
+    with queries.budget('venues.show_venue'):
+        response = client.get(f'/venues/{venue_id}')
+    assert response.status_code == 200
+    assert b'2 Upcoming Shows' in response.data
+    assert b'2 Past Shows' in response.data
+
+
+def test_show_venue_missing(client, data):
+    assert client.get('/venues/9999').status_code == 404
+
+
+def test_search_venues(client, queries, data):
+    with queries.budget('venues.search_venues'):
+        response = client.post('/venues/search', data={'search_term': 'hop 1'})
+    assert response.status_code == 200
+    assert b'The Musical Hop 1' in response.data
+    assert b'The Musical Hop 2' not in response.data
+
+
+def test_venues_genre_filter_and_facets(client, queries, data):
+    db.session.get(Venue, data['venue_ids'][0]).genres = ['Folk']
+    db.session.commit()
+    with queries.budget('venues.venues'):
+        response = client.get('/venues')
+    body = response.get_data(as_text=True)
+    assert 'Folk (1)' in body and 'Jazz (2)' in body and 'Reggae (2)' in body
+    body = client.get('/venues?genre=Folk').get_data(as_text=True)
+    assert body.count('The Musical Hop') == 1
+    assert 'Jazz (' not in body
+    assert client.get('/venues?genre=Polka').status_code == 400
+
+
+def test_unfiltered_facets_read_the_kept_counts(client, data):
+    # a venue added, another one deleted, a third one changing its genres
+    client.post('/venues/create', data=VENUE_FORM)
+    client.get(f"/venues/Delete_by_ID/{data['venue_ids'][1]}")
+    db.session.get(Venue, data['venue_ids'][2]).genres = ['Folk', 'Jazz']
+    db.session.commit()
+    assert genre_count_drift() == []
+    db.session.execute(db.update(GenreCount).where(
+        GenreCount.table_name == 'Venue', GenreCount.genre == 'Jazz'
+    ).values(total=7))
+    db.session.commit()
+    assert 'Jazz (7)' in client.get('/venues').get_data(as_text=True)
+    # a narrowed listing is counted
+    body = client.get('/venues?genre=Folk').get_data(as_text=True)
+    assert 'Jazz (1)' in body
+
+
+def test_genre_counts_skip_failed_flushes(app, data):
+    # a venue without a city fails its flush: its genres are not counted
+    db.session.add(Venue(name='Nowhere', state='CA', address='1 Main St',
+                         genres=['Jazz', 'Reggae']))
+    with pytest.raises(IntegrityError):
+        db.session.flush()
+    db.session.rollback()
+    db.session.add(_new_venue('Lakeside', city='Oakland', state='CA'))
+    db.session.commit()
+    assert genre_count_drift() == []
+
+
+def test_search_venues_by_genre(client, queries, data):
+    db.session.get(Venue, data['venue_ids'][0]).genres = ['Folk']
+    db.session.commit()
+    with queries.budget('venues.search_venues'):
+        response = client.post('/venues/search',
+                               data={'search_term': 'hop', 'genre': 'Jazz'})
+    body = response.get_data(as_text=True)
+    assert body.count('The Musical Hop') == 2
+    assert 'Reggae (2)' in body and 'Folk (' not in body
+
+
+def test_create_venue(client, queries, data):
+    assert client.get('/venues/create').status_code == 200
+    with queries.budget('venues.create_venue_submission'):
+        response = client.post('/venues/create', data=VENUE_FORM)
+    assert response.status_code == 200
+    venue = Venue.query.filter_by(name='The Dueling Pianos Bar').one()
+    assert venue.genres == ['Classical', 'R&B']
+    assert venue.upcoming_shows_count == 0
+
+
+def test_edit_venue(client, queries, data):
+    venue_id = data['venue_ids'][0]
+    with queries.budget('venues.edit_venue'):
+        assert client.get(f'/venues/Edite_by_ID/{venue_id}').status_code == 200
+    with queries.budget('venues.edit_venue_submission'):
+        response = client.post(f'/venues/Edite_by_ID/{venue_id}',
+                               data=dict(VENUE_FORM, name='Renamed'))
+    assert response.status_code == 302
+    assert db.session.get(Venue, venue_id).name == 'Renamed'
+
+
+def test_delete_venue_updates_artist_counters(client, queries, data):
+    venue_id = data['venue_ids'][0]
+    artist_id = data['artist_ids'][0]
+    before = db.session.get(Artist, artist_id).past_shows_count
+    with queries.budget('venues.delete_venue'):
+        response = client.get(f'/venues/Delete_by_ID/{venue_id}')
+    assert response.status_code == 302
+    db.session.expire_all()
+    assert db.session.get(Venue, venue_id) is None
+    assert Show.query.filter_by(venue_id=venue_id).count() == 0
+    assert db.session.get(Artist, artist_id).past_shows_count == before - 1
+
+
+def test_venue_located_at_city_centroid(app, data):
+    venue = db.session.get(Venue, data['venue_ids'][0])
+    assert (venue.latitude, venue.longitude) == (37.7749, -122.4194)
+    venue.city, venue.state = 'st. louis', 'MO'
+    db.session.commit()
+    assert (venue.latitude, venue.longitude) == (38.6270, -90.1994)
+    # towns missing from the table fall back to the state
+    venue.city = 'Nowhere'
+    db.session.commit()
+    assert (venue.latitude, venue.longitude) == (38.3566, -92.4580)
+    venue.latitude, venue.longitude = 38.5, -92.5
+    db.session.commit()
+    assert (venue.latitude, venue.longitude) == (38.5, -92.5)
+
+
+def test_nearby_venues(client, queries, data):
+    db.session.add_all([_new_venue('Lakeside', city='Oakland', state='CA'),
+                        _new_venue('Far Away', city='Austin', state='TX')])
+    db.session.commit()
+    with queries.budget('venues.nearby_venues'):
+        response = client.get('/venues/nearby?lat=37.80&lon=-122.27&radius=20')
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert page.count('The Musical Hop') == 3
+    assert page.index('Lakeside') < page.index('The Musical Hop')
+    assert 'Far Away' not in page
+    page = client.get('/venues/nearby?lat=37.80&lon=-122.27&radius=5'
+                      ).get_data(as_text=True)
+    assert 'Lakeside' in page and 'The Musical Hop' not in page
+    assert '1 venue within 5' in page
+    assert client.get('/venues/nearby').status_code == 200
+
+
+def test_nearby_venues_pages_by_distance(client, queries, data):
+    db.session.add_all([_new_venue('Lakeside', city='Oakland', state='CA'),
+                        _new_venue('Far Away', city='Austin', state='TX')])
+    db.session.commit()
+    url = '/venues/nearby?lat=37.80&lon=-122.27&radius=500&limit=2'
+    with queries.budget('venues.nearby_venues'):
+        page = client.get(url).get_data(as_text=True)
+    assert 'The 2 nearest venues within 500' in page
+    assert 'Lakeside' in page and page.count('The Musical Hop') == 1
+    seen = 1
+    while 'Next page' in page:
+        after = page.split('after=')[1].split('&')[0].split('"')[0]
+        with queries.budget('venues.nearby_venues'):
+            page = client.get(f'{url}&after={after}').get_data(as_text=True)
+        assert 'Lakeside' not in page and 'Far Away' not in page
+        seen += page.count('The Musical Hop')
+    assert seen == 3
+    assert client.get(url + '&after=W05hTiwxXQ').status_code == 400
+
+
+@pytest.mark.parametrize('query', ['lat=91&lon=0', 'lat=1&lon=x',
+                                   'lat=1', 'lat=1&lon=1&radius=100000'])
+def test_nearby_venues_invalid(client, data, query):
+    assert client.get('/venues/nearby?' + query).status_code == 400
+
+
+def test_haversine_and_bounding_box():
+    assert round(haversine_km(37.7749, -122.4194, 34.0522, -118.2437)) == 559
+    south, north, longitudes = bounding_box(0, 179.9, 111.2)
+    assert round(south, 1) == -1.0 and round(north, 1) == 1.0
+    assert [(round(west, 1), round(east, 1)) for west, east in longitudes] \
+        == [(178.9, 180.0), (-180.0, -179.1)]
+    assert bounding_box(89.9, 0, 50)[2] == [(-180.0, 180.0)]
+
+
+def test_cell_ranges_cover_the_box():
+    rng = random.Random(7)
+    assert cell_id(None, 1.0) is None
+    for latitude, longitude, radius in [(37.8, -122.3, 25), (0, 179.9, 111),
+                                        (89.9, 0, 50), (40.7, -74.0, 500)]:
+        south, north, longitudes = bounding_box(latitude, longitude, radius)
+        ranges = cell_ranges(south, north, longitudes)
+        assert len(ranges) <= 16
+        for _ in range(200):
+            west, east = rng.choice(longitudes)
+            code = cell_id(rng.uniform(south, north), rng.uniform(west, east))
+            assert any(first <= code <= last for first, last in ranges)
+
+
+def _new_venue(name, **values):
+    values = dict({key: value for key, value in VENUE_FORM.items()
+                   if key != 'seeking_talent'}, name=name, **values)
+    return Venue(**values)
@@ -0,0 +1,203 @@
+from flask import (
+    Blueprint,
+    current_app,
+    render_template,
+    request,
+    flash,
+    redirect,
+    url_for,
+    abort
+)
+
+from forms import VenueForm
+from models import db, Venue
+from queries import (
+    genre_arg,
+    nearby_args,
+    nearby_venues as nearby_venues_query,
+    venue_areas,
+    venue_detail,
+    page_args,
+    artist_ids_of_venue,
+    venues_validators,
+    venue_validators
+)
+from search import search_venues as search_venues_query
+from cache import page_cache
+from conditional import conditional
+from routing import use_primary, read_only
+
+#----------------------------------------------------------------------------#
+# Venue pages.
+#----------------------------------------------------------------------------#
+
+venues_bp = Blueprint('venues', __name__)
+
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@venues_bp.route('/venues')
+@conditional(venues_validators)
+@page_cache.cached('venues')
+def venues():
+  # venues are grouped by city/state, num_upcoming_shows is the counter
+  # kept on the venue row.
+  genre = genre_arg()
+  areas, facets = venue_areas(genre)
+  return render_template('pages/venues.html', areas=areas, genre=genre,
+                         facets=facets)
+
+
+@venues_bp.route('/venues/nearby')
+@conditional(venues_validators)
+def nearby_venues():
+  # the venues within ?radius= km of ?lat=&lon=, nearest first; without a
+  # point the page only shows its form
+  latitude, longitude, radius = nearby_args()
+  after, limit = page_args()
+  venues = next_after = None
+  if latitude is not None:
+    venues, next_after = nearby_venues_query(latitude, longitude, radius,
+                                             after, limit)
+  return render_template('pages/nearby_venues.html', venues=venues,
+                         lat=latitude, lon=longitude, radius=radius,
+                         after=after, next_after=next_after, limit=limit)
+
+
+@venues_bp.route('/venues/search', methods=['POST'])
+@read_only
+def search_venues():
+    # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+    # seach for Hop should return "The Musical Hop".
+    # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
+    search_term = request.form.get("search_term", "")
+    after, limit = page_args()
+    genre = genre_arg()
+    response = {}
+    # matches name, city, state and genres, ranked by the database
+    response['data'], response['next_after'], response['count'], \
+        response['facets'] = search_venues_query(search_term, after, limit,
+                                                 genre)
+    return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''), limit=limit, genre=genre)
+
+
+@venues_bp.route('/venues/<int:venue_id>')
+@conditional(venue_validators)
+@page_cache.cached(lambda venue_id: f'venue:{venue_id}')
+def show_venue(venue_id):
+    # shows the venue page with the given venue_id
+    # past and upcoming shows come already split and limited from the database
+    data = venue_detail(venue_id,
+                        past_limit=current_app.config['PAST_SHOWS_LIMIT'],
+                        upcoming_limit=current_app.config['UPCOMING_SHOWS_LIMIT'],
+                        matches_limit=current_app.config['MATCHES_TOP_K'])
+    if data is None:
+        abort(404)
+    return render_template('pages/show_venue.html', venue=data)
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+
+@venues_bp.route('/venues/create', methods=['GET'])
+def create_venue_form():
+    form = VenueForm()
+    return render_template('forms/new_venue.html', form=form)
+
+
+@venues_bp.route('/venues/create', methods=['POST'])
+def create_venue_submission():
+    # TODO: insert form data as a new Venue record in the db, instead
+    # TODO: modify data to be the data object returned from db insertion
+
+    form = VenueForm(request.form, meta={'csrf': False})
+    try:
+        venue = Venue()
+        form.populate_obj(venue)
+        db.session.add(venue)
+        db.session.commit()
+        page_cache.invalidate('venues')
+        # on successful db insert, flash success
+        flash('Venue ' + form.name.data + ' was successfully listed!')
+    except ValueError as e:
+        print(e)
+        error = True
+        db.session.rollback()
+        # TODO: on unsuccessful db insert, flash an error instead.
+        flash('An error occurred. Venue ' +
+              form.name.data + ' could not be listed.')
+    finally:
+        db.session.close()
+    # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+    return render_template('pages/home.html')
+
+
+  # TODO: Complete this endpoint for taking a venue_id, and using
+  # SQLAlchemy ORM to delete a record.
+  # Handle cases where the session commit could fail.
+  # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page,
+  # have it so that clicking that button delete it
+  # from the db then redirect the user to the homepage
+  # return None
+@venues_bp.route("/venues/Delete_by_ID/<venue_id>")
+@use_primary
+def delete_venue(venue_id):
+    venue_name = Venue.query.get(venue_id).name
+    try:
+        venue = db.session.query(Venue).filter(Venue.id == venue_id).first()
+        # the shows of the venue are deleted with it
+        artist_ids = artist_ids_of_venue(venue_id)
+        db.session.delete(venue)
+        db.session.commit()
+        page_cache.invalidate('venues', f'venue:{venue_id}',
+                              *[f'artist:{id}' for id in artist_ids])
+        flash("Venue: " + venue_name + " was successfully deleted.")
+    except:
+        db.session.rollback()
+        flash('An error occured. Venue could not be deleted.')
+    finally:
+        db.session.close()
+        return redirect(url_for("index"))
+
+#  Update
+#  ----------------------------------------------------------------
+@venues_bp.route('/venues/Edite_by_ID/<int:venue_id>', methods=['GET'])
+def edit_venue(venue_id):
+  try:
+      venue = db.session.query(Venue).filter(Venue.id == venue_id).first()
+      form = VenueForm(obj=venue)
+      venue = {
+          'id': venue_id,
+          'name': venue.name
+      }
+  except:
+      db.session.rollback()
+      flash("Something went wrong. Please try again.")
+      return redirect(url_for("index"))
+  finally:
+      db.session.close()
+  # TODO: populate form with values from venue with ID <venue_id>
+  return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+
+@venues_bp.route('/venues/Edite_by_ID/<int:venue_id>', methods=['POST'])
+def edit_venue_submission(venue_id):
+  # TODO: take values from the form submitted, and update existing
+  # venue record with ID <venue_id> using the new attributes
+  try:
+      venue = db.session.query(Venue).filter(Venue.id == venue_id).first()
+      form = VenueForm(request.form, meta={'csrf': False})
+      form.populate_obj(venue)
+      db.session.add(venue)
+      db.session.commit()
+      page_cache.invalidate('venues', f'venue:{venue_id}',
+                            *[f'artist:{id}' for id in artist_ids_of_venue(venue_id)])
+      flash("The venue has been edited successfully")
+  except:
+      db.session.rollback()
+      flash("Something went wrong. Please try again.")
+      return redirect(url_for("index"))
+  finally:
+      db.session.close()
+      return redirect(url_for('.show_venue', venue_id=venue_id))